@@ -0,0 +1,123 @@
+import re
+
+import numpy as np
+
+# FNV-1a constants for the 32-bit n-gram hash
+_FNV_OFFSET = np.uint32(2166136261)
+_FNV_PRIME = np.uint32(16777619)
+
+
+class HashedNgramFeaturizer:
+    """
+    Fixed-dimension character n-gram featurizer with no fitting step.
+    Every n-gram is hashed (FNV-1a over its code points) into one of `dim` columns, so index vectors
+    and query vectors always live in the same space regardless of which passwords were seen.
+    """
+    name = 'hashed'
+
+    def __init__(self, dim=128, ngram_range=(1, 3), lowercase=True, alternate_sign=True):
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.alternate_sign = alternate_sign
+
+    def params(self):
+        return {"name": self.name, "dim": self.dim, "ngram_range": list(self.ngram_range),
+                "lowercase": self.lowercase, "alternate_sign": self.alternate_sign}
+
+    def transform(self, passwords):
+        """
+        Featurize a batch of passwords into an (n, dim) float32 matrix.
+        """
+        passwords = [pwd.lower() for pwd in passwords] if self.lowercase else list(passwords)
+        features = np.zeros(len(passwords) * self.dim, dtype=np.float32)
+        if not passwords:
+            return features.reshape(0, self.dim)
+
+        # Flatten all passwords into one code point array with a row id and in-row position per character
+        lengths = np.fromiter((len(pwd) for pwd in passwords), dtype=np.int64, count=len(passwords))
+        chars = np.frombuffer(''.join(passwords).encode('utf-32-le'), dtype=np.uint32)
+        rows = np.repeat(np.arange(len(passwords)), lengths)
+        positions = np.arange(len(chars)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            starts = np.nonzero(positions + n <= lengths[rows])[0]
+            if len(starts) == 0:
+                continue
+            # Seed with n so that e.g. 'a' and 'aa' do not share a hash stream
+            hashes = np.full(len(starts), _FNV_OFFSET ^ np.uint32(n), dtype=np.uint32)
+            for k in range(n):
+                hashes = (hashes ^ chars[starts + k]) * _FNV_PRIME
+            buckets = rows[starts] * self.dim + (hashes % np.uint32(self.dim)).astype(np.int64)
+            weights = None
+            if self.alternate_sign:
+                weights = np.where(hashes >> np.uint32(31), -1.0, 1.0)
+            features += np.bincount(buckets, weights=weights, minlength=len(features)).astype(np.float32)
+
+        return features.reshape(len(passwords), self.dim)
+
+    def transform_one(self, password):
+        return self.transform([password])[0]
+
+
+class TopNgramFeaturizer:
+    """
+    Legacy featurizer: counts of the password's own `dim` most frequent char n-grams, equivalent to fitting
+    CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=dim) on the single password.
+    Only kept to query hash files built before the hashed featurizer existed.
+    """
+    name = 'top'
+    _white_spaces = re.compile(r"\s\s+")
+
+    def __init__(self, dim=15, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+
+    def params(self):
+        return {"name": self.name, "dim": self.dim, "ngram_range": list(self.ngram_range)}
+
+    def transform(self, passwords):
+        matrix = np.zeros((len(passwords), self.dim), dtype=np.float32)
+        for row, pwd in enumerate(passwords):
+            matrix[row] = self.transform_one(pwd)
+        return matrix
+
+    def transform_one(self, password):
+        text = self._white_spaces.sub(" ", password.lower())
+        counts = {}
+        for n in range(self.ngram_range[0], min(self.ngram_range[1] + 1, len(text) + 1)):
+            for i in range(len(text) - n + 1):
+                ngram = text[i:i + n]
+                counts[ngram] = counts.get(ngram, 0) + 1
+
+        # Vocabulary is sorted alphabetically; keep the most frequent terms with the same tie-breaking as sklearn
+        tfs = np.array([counts[term] for term in sorted(counts)], dtype=np.int64)
+        if len(tfs) > self.dim:
+            tfs = tfs[np.sort((-tfs).argsort()[:self.dim])]
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        vector[:len(tfs)] = tfs
+        return vector
+
+
+_FEATURIZERS = {cls.name: cls for cls in (HashedNgramFeaturizer, TopNgramFeaturizer)}
+
+
+def make_featurizer(params=None):
+    """
+    Rebuild a featurizer from the dict returned by its params(); None gives the default hashed featurizer.
+    """
+    if params is None:
+        return HashedNgramFeaturizer()
+    params = dict(params)
+    name = params.pop("name")
+    if name not in _FEATURIZERS:
+        raise ValueError(f"Unknown featurizer: {name}")
+    return _FEATURIZERS[name](**params)
+
+
+# Example usage
+if __name__ == "__main__":
+    featurizer = HashedNgramFeaturizer(dim=16)
+    vectors = featurizer.transform(['password123', 'Password124', 'Gjl$2`Aq1'])
+    print(vectors)
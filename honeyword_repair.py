@@ -0,0 +1,250 @@
+import json
+import re
+import string
+
+import numpy as np
+
+from honeyword_stream import HoneywordStream
+from mutation_engine import Constraints, encode
+
+# A Markdown code block around the JSON, possibly never closed in a truncated reply
+_FENCED = re.compile(r"```[A-Za-z]*\s*(.*?)(?:```|\Z)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+
+# Edits (characters removed, added or replaced) a honeyword may need to count as nearly valid
+MAX_REPAIR_EDITS = 3
+
+# Fewer missing honeywords than this are not worth a follow-up round trip; local mutations fill them
+FOLLOW_UP_MIN_MISSING = 5
+
+# Characters drawn when a repair has to add a character of a class
+_CLASS_CHARACTERS = {'upper': string.ascii_uppercase, 'lower': string.ascii_lowercase, 'digit': string.digits,
+                     'symbol': "!@#$%&*._-"}
+
+
+def _character_class(c):
+    return ('upper' if 'A' <= c <= 'Z' else 'lower' if 'a' <= c <= 'z' else 'digit' if '0' <= c <= '9'
+            else 'symbol')
+
+
+def _close_truncated(text):
+    """
+    A reply cut off in the middle of a JSON value, ended after its last complete element: the text up to the
+    last comma, bracket or array string outside a string, followed by the brackets still open there.
+    """
+    stack, cut, cut_stack = [], None, []
+    in_string = escaped = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+                if stack and stack[-1] == "]":
+                    cut, cut_stack = i + 1, list(stack)
+        elif c == '"':
+            in_string = True
+        elif c in "[{":
+            stack.append("]" if c == "[" else "}")
+            cut, cut_stack = i + 1, list(stack)
+        elif c in "]}" and stack:
+            stack.pop()
+            cut, cut_stack = i + 1, list(stack)
+        elif c == ",":
+            cut, cut_stack = i, list(stack)
+    if cut is None:
+        return None
+    return text[:cut] + ''.join(reversed(cut_stack))
+
+
+def extract_json(reply):
+    """
+    The JSON value of an LLM reply, tolerating what models put around it or get wrong: a Markdown code block or
+    prose around the value (even prose with brackets, as in 'Sure [note]: {...}'), trailing commas, and a reply
+    cut off in the middle (kept up to its last complete element). None if nothing can be recovered.
+    """
+    if not reply:
+        return None
+    fenced = _FENCED.search(reply)
+    text = fenced.group(1) if fenced else reply
+
+    decoder = json.JSONDecoder()
+    # The value starts at the first bracket that begins valid JSON
+    for start in re.finditer(r"[{\[]", text):
+        value = text[start.start():]
+        without_commas = _TRAILING_COMMA.sub(r"\1", value)
+        for candidate in (value, without_commas, _close_truncated(without_commas)):
+            if candidate is None:
+                continue
+            try:
+                return decoder.raw_decode(candidate)[0]
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+def extract_honeywords(reply):
+    """
+    {'honeywords', 'explanation'} of a single-record honeyword reply, or None. Uses extract_json, and picks the
+    complete strings out of the 'honeywords' array (like HoneywordStream) when the JSON cannot be recovered.
+    """
+    parsed = extract_json(reply)
+    if isinstance(parsed, list):
+        parsed = {"honeywords": parsed}
+    if isinstance(parsed, dict) and isinstance(parsed.get("honeywords"), list) and parsed["honeywords"]:
+        explanation = parsed.get("explanation")
+        return {"honeywords": parsed["honeywords"], "explanation": explanation if isinstance(explanation, str) else ""}
+
+    stream = HoneywordStream(count=float('inf'))
+    stream.feed(reply or "")
+    return stream.result() if stream.honeywords else None
+
+
+def has_honeywords(reply):
+    """
+    Response cache validator of honeyword replies (see LLMClient.complete): the reply gives some honeywords.
+    """
+    return extract_honeywords(reply) is not None
+
+
+class HoneywordRepair:
+    """
+    Repair stage between an LLM reply and a generator's result, so a few bad honeywords in a reply cost neither
+    a fallback nor a full new generation:
+      - the honeywords are checked against the strategy's Constraints in one vectorized pass,
+      - nearly-valid ones (at most max_edits edits away) are repaired with minimal edits: symbols dropped,
+        a forbidden first character removed, the length cut or extended, a missing character class added,
+      - if at least min_missing are still missing, one follow-up request asks for the missing number only.
+    Each generator has its own instance; repaired and follow_ups count what it did.
+    """
+
+    def __init__(self, constraints, rng=None, max_edits=MAX_REPAIR_EDITS, min_missing=FOLLOW_UP_MIN_MISSING):
+        self.constraints = constraints
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.max_edits = max_edits
+        self.min_missing = min_missing
+        self.repaired = 0
+        self.follow_ups = 0
+
+    def _draw(self, name):
+        characters = _CLASS_CHARACTERS[name]
+        return characters[int(self.rng.integers(len(characters)))]
+
+    def repair(self, honeyword):
+        """
+        honeyword edited to meet the constraints, or None if that takes more than max_edits edits.
+        The result still has to be validated (one edit can undo another).
+        """
+        constraints = self.constraints
+        chars = list(honeyword)
+        edits = 0
+        if not constraints.allow_symbols:
+            kept = [c for c in chars if _character_class(c) != 'symbol']
+            edits += len(chars) - len(kept)
+            chars = kept
+        if chars and ord(chars[0]) in constraints.forbidden_first:
+            if len(chars) > constraints.min_length:
+                del chars[0]
+            else:
+                chars[0] = self._draw('lower')
+            edits += 1
+        if len(chars) > constraints.max_length:
+            edits += len(chars) - constraints.max_length
+            del chars[constraints.max_length:]
+
+        classes = [_character_class(c) for c in chars]
+        present = {name for name in constraints.classes if name in classes}
+        for name in constraints.classes:
+            if len(present) >= constraints.min_classes:
+                break
+            if name in present:
+                continue
+            # Change the case of a letter whose case occurs more than once, otherwise add or replace the last character
+            other = {'upper': 'lower', 'lower': 'upper'}.get(name)
+            if other and classes.count(other) > 1:
+                position = len(classes) - 1 - classes[::-1].index(other)
+                chars[position] = chars[position].swapcase()
+            elif len(chars) < constraints.max_length:
+                chars.append(self._draw(name))
+            elif len(chars) > 1:
+                chars[-1] = self._draw(name)
+            classes = [_character_class(c) for c in chars]
+            present.add(name)
+            edits += 1
+
+        filler = 'digit' if 'digit' in constraints.classes or not constraints.classes else constraints.classes[0]
+        while len(chars) < constraints.min_length and edits <= self.max_edits:
+            chars.append(self._draw(filler))
+            edits += 1
+        return ''.join(chars) if chars and edits <= self.max_edits else None
+
+    def select(self, candidates, count=20, exclude=()):
+        """
+        Up to count unique honeywords from candidates, in their order: valid ones as they are and invalid ones
+        where a repair makes them valid. Words in exclude are never returned.
+        """
+        candidates = [honeyword.strip() for honeyword in candidates if isinstance(honeyword, str)]
+        if not candidates:
+            return []
+        codes, lengths = encode(candidates)
+        valid = self.constraints.valid_mask(codes, lengths).tolist()
+
+        repairs = {}
+        for i in np.flatnonzero(~np.array(valid)).tolist():
+            repaired = self.repair(candidates[i])
+            if repaired:
+                repairs[i] = repaired
+        if repairs:
+            codes, lengths = encode(list(repairs.values()))
+            repairs = {i: repaired for (i, repaired), ok in
+                       zip(repairs.items(), self.constraints.valid_mask(codes, lengths).tolist()) if ok}
+
+        honeywords = []
+        seen = set(exclude)
+        for i, honeyword in enumerate(candidates):
+            honeyword = honeyword if valid[i] else repairs.get(i)
+            if honeyword is None or honeyword in seen or len(honeywords) >= count:
+                continue
+            seen.add(honeyword)
+            honeywords.append(honeyword)
+            self.repaired += not valid[i]
+        return honeywords
+
+    def follow_up_prompt(self, password, missing, honeywords):
+        kept = (f"Only {len(honeywords)} of the honeywords for the password '{password}' were usable: "
+                f"{json.dumps(honeywords, ensure_ascii=False)}. " if honeywords
+                else f"None of the honeywords for the password '{password}' were usable. ")
+        return (kept + f"Generate {missing} more different honeywords similar to the target password. "
+                f"Ensure that they meet the following conditions: {self.constraints.describe()} "
+                f"Present the result **directly** in JSON format, with two fields: 'honeywords' (list of generated passwords) and 'explanation'.")
+
+    def collect(self, result, password, send=None, count=20):
+        """
+        Honeywords of an extracted reply (see extract_honeywords; None if it had none) after validation and
+        repair. If at least min_missing of count are missing and send is given, send(prompt) makes one follow-up
+        request for the missing ones and returns its reply (or None).
+        """
+        honeywords = self.select(result["honeywords"] if result else [], count, exclude=(password,))
+        if count - len(honeywords) >= min(self.min_missing, count) and send is not None:
+            self.follow_ups += 1
+            extra = extract_honeywords(send(self.follow_up_prompt(password, count - len(honeywords), honeywords)))
+            if extra:
+                honeywords += self.select(extra["honeywords"], count - len(honeywords),
+                                          exclude=set(honeywords) | {password})
+        return honeywords
+
+
+# Example usage
+if __name__ == "__main__":
+    print(extract_json('Here you go:\n```json\n{"honeywords": ["abc124xyz", "abd123xyz",], "explanation": "ok"}\n```'))
+    print(extract_json('```json\n[{"id": 0, "honeywords": ["a1b2c3"]}, {"id": 1, "honeywords": ["x9y8z7", "x9y8'))
+    print(extract_honeywords('{"honeywords": ["judith146", "judith147"'))
+
+    weak = Constraints(min_length=6, max_length=18, min_classes=2, classes=('upper', 'lower', 'digit'),
+                       forbidden_first=string.digits, allow_symbols=False)
+    repair = HoneywordRepair(weak, np.random.default_rng(0))
+    print(repair.select(["abc123xyz", "1abc123xyz", "abc_123", "abcxyz", "abc12", "abcdefghijklmnopqrst1",
+                         "x", "abc123xyz"], exclude=("abc123xyz",)), repair.repaired)
+    print(repair.follow_up_prompt("abc123xyz", 12, ["abc124xyz", "Abc123xyz"]))
@@ -0,0 +1,116 @@
+import json
+import re
+
+# Opening of the honeyword array in a reply such as {"honeywords": ["...", ...], "explanation": "..."}
+_HONEYWORDS_START = re.compile(r"[\"']honeywords[\"']\s*:\s*\[")
+_EXPLANATION = re.compile(r"\"explanation\"\s*:\s*(\"(?:[^\"\\]|\\.)*\")", re.DOTALL)
+# Characters kept from a chunk without the array opening, in case it was split between two chunks
+_KEY_TAIL = 32
+
+
+class HoneywordStream:
+    """
+    Incremental parser of a streamed honeyword reply. feed() takes the reply piece by piece and picks every
+    honeyword out of the 'honeywords' array as soon as its closing quote arrives; honeywords that are not
+    unique or fail is_valid are dropped (those failing is_valid are kept in `invalid`, for repair).
+    feed() returns True once `count` honeywords are collected, which is the signal for LLMClient.astream to
+    stop the request. A truncated reply still yields the honeywords that were complete, so callers only
+    have to top up the missing ones.
+    """
+
+    def __init__(self, is_valid=None, count=20, exclude=()):
+        self.is_valid = is_valid
+        self.count = count
+        self.honeywords = []
+        self.rejected = 0
+        self.invalid = []
+        self._seen = set(exclude)
+        self._text = ""
+        self._position = 0
+        self._in_array = False
+        self._finished = False
+
+    @property
+    def complete(self):
+        return len(self.honeywords) >= self.count
+
+    def feed(self, text):
+        self._text += text
+        if not self._finished and not self.complete:
+            self._scan()
+        return self.complete
+
+    def _accept(self, honeyword):
+        if not isinstance(honeyword, str) or honeyword in self._seen:
+            self.rejected += 1
+            return
+        if self.is_valid and not self.is_valid(honeyword):
+            self.rejected += 1
+            self.invalid.append(honeyword)
+            return
+        self._seen.add(honeyword)
+        self.honeywords.append(honeyword)
+
+    def _scan(self):
+        text = self._text
+        if not self._in_array:
+            match = _HONEYWORDS_START.search(text, self._position)
+            if match is None:
+                self._position = max(self._position, len(text) - _KEY_TAIL)
+                return
+            self._in_array = True
+            self._position = match.end()
+
+        i = self._position
+        while i < len(text) and not self.complete:
+            c = text[i]
+            if c in " \t\r\n,":
+                i += 1
+            elif c == "]":
+                self._finished = True
+                i += 1
+                break
+            elif c == '"':
+                # Find the closing quote, skipping escaped characters; wait for more text if it has not arrived
+                j = i + 1
+                while j < len(text) and text[j] != '"':
+                    j += 2 if text[j] == "\\" else 1
+                if j >= len(text):
+                    break
+                try:
+                    self._accept(json.loads(text[i:j + 1]))
+                except json.JSONDecodeError:
+                    self.rejected += 1
+                i = j + 1
+            else:
+                # Numbers, null or other non-string items are skipped up to the next separator
+                end = min((k for k in (text.find(",", i), text.find("]", i)) if k != -1), default=-1)
+                if end == -1:
+                    break
+                self.rejected += 1
+                i = end
+        self._position = i
+
+    def explanation(self):
+        """
+        The 'explanation' field, if it arrived complete.
+        """
+        match = _EXPLANATION.search(self._text)
+        if match:
+            try:
+                return json.loads(match.group(1))
+            except json.JSONDecodeError:
+                pass
+        return ""
+
+    def result(self):
+        return {"honeywords": list(self.honeywords), "explanation": self.explanation()}
+
+
+# Example usage
+if __name__ == "__main__":
+    reply = '```json\n{"honeywords": ["abc124xyz", "Abc123xyz", "abc123", "abc125xy'
+    stream = HoneywordStream(is_valid=lambda hw: 6 <= len(hw) <= 18, count=20, exclude=("abc123xyz",))
+    for start in range(0, len(reply), 7):
+        stream.feed(reply[start:start + 7])
+    print(stream.result(), stream.rejected)
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from lsh_index import IndexWriter, LSHIndex
+from password_pre import LSH, MultiTableLSH
+
+# Incremental updates for a binary LSH index at path P:
+#   P                     base index, only rewritten by compact_index()
+#   P.segments/manifest.json   {"segments": [[id, file name], ...], "next_id": n}; ids are never reused, not even
+#                               after compaction, because open readers identify the segments they hold by id
+#   P.segments/seg-000001.idx  append-only segments, same hashing parameters as the base
+#   P.segments/tombstones.jsonl  {"password": ..., "segment": n} per deletion; hides the password in the base
+#                               (segment 0) and in every segment with id < n, so re-adding it later works
+# Appends, deletions and compaction assume a single writer per index; readers can run concurrently.
+SEGMENTS_SUFFIX = '.segments'
+
+
+def _segments_dir(index_path):
+    return index_path + SEGMENTS_SUFFIX
+
+
+def _read_manifest(index_path):
+    manifest_path = os.path.join(_segments_dir(index_path), 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return {"segments": [], "next_id": 1}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(index_path, manifest):
+    os.makedirs(_segments_dir(index_path), exist_ok=True)
+    manifest_path = os.path.join(_segments_dir(index_path), 'manifest.json')
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def _read_tombstones(index_path):
+    """Map every deleted password to the first segment id that may contain it again"""
+    tombstones = {}
+    tombstone_path = os.path.join(_segments_dir(index_path), 'tombstones.jsonl')
+    if os.path.exists(tombstone_path):
+        with open(tombstone_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn last line after a crash
+                tombstones[entry["password"]] = max(tombstones.get(entry["password"], 0), entry["segment"])
+    return tombstones
+
+
+class SegmentedIndex:
+    """
+    Base LSHIndex plus its append segments and tombstones (if any), queried as one index.
+    Exposes the attributes PasswordRecommender needs (featurizer, num_tables, num_hashes, seed).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.base = None
+        self.segments = []
+        self.refresh()
+
+    def refresh(self):
+        """Pick up segments and tombstones written since the index was opened, and a base replaced by compaction"""
+        stat = os.stat(self.path)
+        if self.base is None or (stat.st_ino, stat.st_mtime_ns) != self._base_stat:
+            self._base_stat = (stat.st_ino, stat.st_mtime_ns)
+            self.base = LSHIndex(self.path)
+            self.featurizer = self.base.featurizer
+            self.num_tables = self.base.num_tables
+            self.num_hashes = self.base.num_hashes
+            self.seed = self.base.seed
+
+        manifest = _read_manifest(self.path)
+        opened = dict(self.segments)
+        self.segments = [(segment_id, opened.get(segment_id) or LSHIndex(os.path.join(_segments_dir(self.path), name)))
+                         for segment_id, name in manifest["segments"]]
+        self.tombstones = _read_tombstones(self.path)
+
+    def has_updates(self):
+        return bool(self.segments or self.tombstones)
+
+    def __len__(self):
+        return len(self.base) + sum(len(index) for _, index in self.segments)
+
+    def sources(self):
+        """(segment id, index) pairs, base first"""
+        return [(0, self.base)] + self.segments
+
+    def is_deleted(self, password, segment_id):
+        return self.tombstones.get(password, 0) > segment_id
+
+    def candidate_passwords(self, target_codes, max_hamming_dist=2, max_candidates=None, mode='auto', workers=1):
+        """
+        Candidates of the base and of every segment, minus tombstoned passwords, deduplicated in that order.
+        """
+        if not self.has_updates():
+            return self.base.candidate_passwords(target_codes, max_hamming_dist, max_candidates, mode, workers)
+        merged = {}
+        for segment_id, index in self.sources():
+            for pwd in index.candidate_passwords(target_codes, max_hamming_dist, max_candidates, mode, workers):
+                if not self.is_deleted(pwd, segment_id):
+                    merged.setdefault(pwd, None)
+        return list(merged)[:max_candidates]
+
+
+# Add new passwords as an append-only segment
+def append_passwords(index_path, passwords):
+    """
+    Hash passwords with the base index's parameters and write them as a new segment.
+    Cost depends only on the number of new passwords, not on the size of the index.
+    """
+    base = LSHIndex(index_path)
+    passwords = [str(pwd).strip() for pwd in passwords]
+    passwords = [pwd for pwd in passwords if len(pwd) > 0]
+    if not passwords:
+        return None
+
+    if base.num_tables == 1:
+        lsh = LSH(base.num_hashes, input_dim=base.featurizer.dim, seed=base.seed)
+    else:
+        lsh = MultiTableLSH(base.num_tables, base.num_hashes, input_dim=base.featurizer.dim, seed=base.seed)
+    bits = lsh.hash_batch(base.featurizer.transform(passwords))
+
+    manifest = _read_manifest(index_path)
+    segment_id = manifest["next_id"]
+    name = f"seg-{segment_id:06d}.idx"
+    os.makedirs(_segments_dir(index_path), exist_ok=True)
+    writer = IndexWriter(os.path.join(_segments_dir(index_path), name), base.num_hashes, base.seed,
+                         base.header["featurizer"], base.num_tables)
+    writer.add(passwords, bits)
+    writer.close()
+
+    # The segment only becomes visible once the manifest lists it
+    manifest["segments"].append([segment_id, name])
+    manifest["next_id"] = segment_id + 1
+    _write_manifest(index_path, manifest)
+    print(f"Appended {len(passwords)} passwords to {index_path} as segment {segment_id}")
+    return segment_id
+
+
+# Hide deleted accounts' passwords from queries until the next compaction removes them
+def delete_passwords(index_path, passwords):
+    manifest = _read_manifest(index_path)
+    if not os.path.exists(os.path.join(_segments_dir(index_path), 'manifest.json')):
+        _write_manifest(index_path, manifest)
+    tombstone_path = os.path.join(_segments_dir(index_path), 'tombstones.jsonl')
+    with open(tombstone_path, 'a', encoding='utf-8') as f:
+        for pwd in passwords:
+            f.write(json.dumps({"password": str(pwd).strip(), "segment": manifest["next_id"]}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    print(f"Deleted {len(passwords)} passwords from {index_path}")
+
+
+# Merge segments and tombstones into one sorted base index
+def compact_index(index_path, chunk_rows=1000000):
+    """
+    Rewrite the base index with every visible password of the base and its segments, reusing the stored
+    codes instead of hashing again, then drop the segments and tombstones.
+    Readers that still have the old files open keep working on them until they refresh.
+    """
+    index = SegmentedIndex(index_path)
+    if not index.has_updates():
+        print(f"{index_path} has no segments or tombstones to compact")
+        return
+
+    compacted_path = index_path + '.compacted'
+    writer = IndexWriter(compacted_path, index.num_hashes, index.seed, index.base.header["featurizer"],
+                         index.num_tables)
+    for segment_id, source in index.sources():
+        for start in range(0, len(source), chunk_rows):
+            rows = np.arange(start, min(start + chunk_rows, len(source)))
+            passwords = source.passwords(rows)
+            visible = np.array([not index.is_deleted(pwd, segment_id) for pwd in passwords], dtype=bool)
+            codes = np.stack([source.codes_by_row(t, rows[visible]) for t in range(index.num_tables)], axis=1)
+            writer.add_codes([pwd for pwd, keep in zip(passwords, visible) if keep], codes)
+    writer.close()
+
+    # Swap in the new base before clearing the manifest; a crash in between only leaves duplicate rows
+    os.replace(compacted_path, index_path)
+    old_segments = [os.path.basename(segment.path) for _, segment in index.segments]
+    _write_manifest(index_path, {"segments": [], "next_id": _read_manifest(index_path)["next_id"]})
+    tombstone_path = os.path.join(_segments_dir(index_path), 'tombstones.jsonl')
+    if os.path.exists(tombstone_path):
+        os.remove(tombstone_path)
+    for name in old_segments:
+        os.remove(os.path.join(_segments_dir(index_path), name))
+    print(f"Compacted {index_path}: {writer.count} passwords in the base index")
+
+
+# Command line usage:
+#   python index_segments.py append "sample dataset_hash.idx" new_accounts.csv
+#   python index_segments.py delete "sample dataset_hash.idx" deleted_accounts.csv
+#   python index_segments.py compact "sample dataset_hash.idx"
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Incremental updates for a binary LSH index")
+    parser.add_argument("command", choices=["append", "delete", "compact"])
+    parser.add_argument("index_file")
+    parser.add_argument("csv_file", nargs="?", help="CSV with a 'Password' column (append and delete)")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        compact_index(args.index_file)
+    else:
+        if not args.csv_file:
+            parser.error(f"{args.command} needs a csv_file")
+        passwords = pd.read_csv(args.csv_file, usecols=['Password'])['Password'].tolist()
+        if args.command == "append":
+            append_passwords(args.index_file, passwords)
+        else:
+            delete_passwords(args.index_file, passwords)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+
+import aiohttp
+import openai
+
+# Backends turn one chat request into (reply text, usage dict) for LLMClient, which adds concurrency limits,
+# rate limiting, retries and caching on top. Every backend has:
+#   model                     name used in cache keys
+#   async open(max_in_flight) / async close()   called on the client's event loop
+#   async acomplete(messages, max_tokens, temperature, timeout) -> (text, usage)
+#   astream(messages, max_tokens, temperature, timeout)  async generator of (text piece, usage or None);
+#                             closing it early must stop the generation
+# Exceptions raised by acomplete and astream are retried when llm_client.is_retryable says so.
+DEFAULT_MODEL = "gpt-4o"
+
+
+class OpenAIBackend:
+    """
+    Any OpenAI-compatible chat completions endpoint (OpenAI, Azure-style gateways, vLLM, the local mock server).
+    Arguments left as None come from the environment: OPENAI_API_KEY, OPENAI_API_BASE and LLM_MODEL.
+    Requests share one pooled aiohttp session.
+    """
+
+    def __init__(self, api_key=None, api_base=None, model=None):
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.api_base = api_base or os.environ.get("OPENAI_API_BASE")
+        self.model = model or os.environ.get("LLM_MODEL", DEFAULT_MODEL)
+        self._session = None
+
+    async def open(self, max_in_flight):
+        connector = aiohttp.TCPConnector(limit=max_in_flight, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def _request_options(self):
+        # Unset values fall back to the openai module settings
+        options = {}
+        if self.api_key:
+            options["api_key"] = self.api_key
+        if self.api_base:
+            options["api_base"] = self.api_base
+        return options
+
+    async def acomplete(self, messages, max_tokens, temperature, timeout):
+        # The session is passed to openai through its context variable, which is private to the calling task
+        openai.aiosession.set(self._session)
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            request_timeout=timeout,
+            **self._request_options()
+        )
+        return response['choices'][0]['message']['content'], response.get("usage") or {}
+
+    async def astream(self, messages, max_tokens, temperature, timeout):
+        openai.aiosession.set(self._session)
+        chunks = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            request_timeout=timeout,
+            stream=True,
+            # The usage of a streamed request arrives in one last chunk without choices
+            stream_options={"include_usage": True},
+            **self._request_options()
+        )
+        try:
+            async for chunk in chunks:
+                choices = chunk.get("choices") or []
+                text = choices[0].get("delta", {}).get("content") if choices else None
+                usage = chunk.get("usage")
+                if text or usage:
+                    yield text or "", usage
+        finally:
+            # Releases the connection, which ends the generation when the caller stops reading early
+            await chunks.aclose()
+
+
+class LocalModelBackend:
+    """
+    A GGUF model run on the CPU with llama.cpp (pip install llama-cpp-python), e.g. a locally fine-tuned model.
+    The model handles one request at a time; requests wait for it in a worker thread so the event loop stays free.
+    """
+
+    def __init__(self, model_path, n_ctx=4096, n_threads=None):
+        try:
+            from llama_cpp import Llama
+        except ImportError:
+            raise ImportError("LocalModelBackend needs llama-cpp-python: pip install llama-cpp-python")
+        self.model = os.path.basename(model_path)
+        self._llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+        self._lock = threading.Lock()
+
+    async def open(self, max_in_flight):
+        pass
+
+    async def close(self):
+        pass
+
+    def _complete(self, messages, max_tokens, temperature):
+        with self._lock:
+            response = self._llm.create_chat_completion(messages=messages, max_tokens=max_tokens,
+                                                        temperature=temperature)
+        return response['choices'][0]['message']['content'], response.get("usage") or {}
+
+    async def acomplete(self, messages, max_tokens, temperature, timeout):
+        return await asyncio.get_running_loop().run_in_executor(None, self._complete, messages, max_tokens,
+                                                                temperature)
+
+    async def astream(self, messages, max_tokens, temperature, timeout):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._lock.acquire)
+        try:
+            chunks = self._llm.create_chat_completion(messages=messages, max_tokens=max_tokens,
+                                                      temperature=temperature, stream=True)
+            while True:
+                # Each token is computed in a worker thread; stopping here stops the model
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                text = chunk['choices'][0].get('delta', {}).get('content')
+                if text:
+                    yield text, None
+        finally:
+            self._lock.release()
+
+
+def default_backend():
+    """
+    LocalModelBackend if LLM_LOCAL_MODEL points to a model file, otherwise OpenAIBackend from the environment.
+    """
+    if os.environ.get("LLM_LOCAL_MODEL"):
+        return LocalModelBackend(os.environ["LLM_LOCAL_MODEL"])
+    return OpenAIBackend()
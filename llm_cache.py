@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Puts between two size checks
+EVICTION_CHECK_EVERY = 100
+
+
+def cache_key(model, messages, temperature, max_tokens):
+    """
+    Content address of a request: SHA-256 of everything that determines the reply.
+    """
+    payload = json.dumps({"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM replies in one SQLite file, shared by all threads and processes on the machine
+    (WAL mode, one connection per thread). Entries older than ttl seconds are ignored, and once the stored
+    replies exceed max_bytes the least recently used ones are evicted.
+    Cache errors never fail a request; they are reported and treated as misses.
+    """
+
+    def __init__(self, path='llm_responses.sqlite', ttl=30 * 24 * 3600, max_bytes=256 * 2 ** 20):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._stats = {}
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, site TEXT, reply TEXT, size INTEGER,"
+            " created REAL, accessed REAL)")
+        self._connect().execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, site, outcome):
+        with self._lock:
+            site_stats = self._stats.setdefault(site, {"hits": 0, "misses": 0})
+            site_stats[outcome] += 1
+
+    def get(self, key, site):
+        """
+        Cached reply for key, or None.
+        """
+        now = time.time()
+        try:
+            connection = self._connect()
+            row = connection.execute("SELECT reply, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and (self.ttl is None or now - row[1] <= self.ttl):
+                connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._count(site, "hits")
+                return row[0]
+            if row is not None:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Error reading the LLM response cache: {str(e)}")
+        self._count(site, "misses")
+        return None
+
+    def put(self, key, site, reply):
+        now = time.time()
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO responses (key, site, reply, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, site, reply, len(reply.encode('utf-8')), now, now))
+        except sqlite3.Error as e:
+            print(f"Error writing the LLM response cache: {str(e)}")
+            return
+        with self._lock:
+            self._puts += 1
+            check = self._puts % EVICTION_CHECK_EVERY == 1
+        if check:
+            self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries, then the least recently used ones until the cache is below 90% of max_bytes.
+        """
+        try:
+            connection = self._connect()
+            if self.ttl is not None:
+                connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self.max_bytes is None or total <= self.max_bytes:
+                return
+            excess = total - int(self.max_bytes * 0.9)
+            cutoff = None
+            for accessed, size in connection.execute("SELECT accessed, size FROM responses ORDER BY accessed"):
+                excess -= size
+                cutoff = accessed
+                if excess <= 0:
+                    break
+            connection.execute("DELETE FROM responses WHERE accessed <= ?", (cutoff,))
+        except sqlite3.Error as e:
+            print(f"Error evicting from the LLM response cache: {str(e)}")
+
+    def stats(self):
+        """
+        Hits, misses and hit rate per call site since this process opened the cache.
+        """
+        with self._lock:
+            return {site: {**counts, "hit_rate": round(counts["hits"] / max(1, counts["hits"] + counts["misses"]), 4)}
+                    for site, counts in self._stats.items()}
+
+    def size(self):
+        row = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": row[0], "bytes": row[1], "file_bytes": os.path.getsize(self.path)}
+
+
+# Example usage
+if __name__ == "__main__":
+    cache = ResponseCache()
+    print(cache.size())
@@ -0,0 +1,438 @@
+import asyncio
+import atexit
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import aiohttp
+import openai
+
+from llm_backends import default_backend
+from honeyword_repair import extract_json
+from llm_cache import ResponseCache, cache_key
+
+# Errors worth retrying: rate limits, overloaded or failing servers and dropped connections.
+# Anything else (bad request, authentication, ...) will fail again the same way and is returned at once.
+RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.ServiceUnavailableError, openai.error.APIConnectionError,
+                    openai.error.Timeout, openai.error.TryAgain)
+
+
+def is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def estimate_tokens(messages, max_tokens):
+    """
+    Rough upper bound of the tokens a request will use (about 4 characters per token plus the reply budget),
+    charged to the tokens-per-minute limiter before the real usage is known.
+    """
+    return sum(len(message["content"]) for message in messages) // 4 + 4 * len(messages) + max_tokens
+
+
+def parse_json_items(reply):
+    """
+    Items of a batched reply: a JSON array of objects with an 'id' field (optionally wrapped in a Markdown code
+    block or in an object holding the array; see honeyword_repair.extract_json for what else is tolerated, e.g. a
+    reply cut off after some items). Returns {id: item}; items without a usable id are skipped, and an
+    unparseable reply gives {} so that every item of the batch is retried.
+    """
+    parsed = extract_json(reply)
+    if isinstance(parsed, dict):
+        parsed = next((value for value in parsed.values() if isinstance(value, list)), [])
+    items = {}
+    for item in parsed if isinstance(parsed, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("id"), (int, str)):
+            try:
+                items[int(item["id"])] = item
+            except ValueError:
+                continue
+    return items
+
+
+# Usage totals of the track_usage() blocks open in each thread
+_tracked = threading.local()
+
+
+@contextmanager
+def track_usage():
+    """
+    Add up the calls and tokens of every LLM request the current thread makes inside the block, through any
+    generator or helper; yields the running totals. Cache hits are not counted.
+    """
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+    sinks = _tracked.__dict__.setdefault("sinks", [])
+    sinks.append(totals)
+    try:
+        yield totals
+    finally:
+        sinks.remove(totals)
+
+
+def _add_tracked_usage(usage):
+    for totals in getattr(_tracked, "sinks", ()):
+        totals["calls"] += 1
+        for name, tokens in usage.items():
+            totals[name] += tokens
+
+
+class RateLimiter:
+    """
+    Token bucket that refills `per_minute` units per minute and holds at most one minute of units.
+    Used once for requests and once for tokens.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.per_minute, self.available + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """
+        Wait until `amount` units are available and take them; returns the seconds spent waiting.
+        """
+        amount = min(amount, self.per_minute)  # A single oversized request must still go through eventually
+        waited = 0.0
+        async with self.lock:  # First come, first served
+            self._refill()
+            while self.available < amount:
+                delay = (amount - self.available) * 60.0 / self.per_minute
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.available -= amount
+        return waited
+
+    def adjust(self, amount):
+        """
+        Give back (amount < 0) or take (amount > 0) units once the real usage of a request is known.
+        """
+        self._refill()
+        self.available = min(self.per_minute, self.available - amount)
+
+
+class LLMClient:
+    """
+    Chat completion client shared by every generator of a process, on top of a backend from llm_backends
+    (default_backend() if none is given: an OpenAI-compatible endpoint configured through the environment).
+    Requests run on one background event loop over one pooled HTTP session, with at most `max_in_flight`
+    requests open at a time, requests- and tokens-per-minute limits, and exponential backoff with full jitter
+    for rate-limit and server errors. complete() can be called from any number of threads.
+    Replies of the call sites listed in cache_sites are kept in a persistent ResponseCache (cache_file=None
+    disables it); only deterministic classification is cached by default, generation sites have to be added.
+    Only replies the caller's validate callback accepts are stored, so a malformed reply is never replayed.
+    """
+
+    def __init__(self, backend=None, max_in_flight=16, requests_per_minute=500, tokens_per_minute=150000,
+                 max_retries=6, base_delay=1.0, max_delay=60.0, request_timeout=60, cache_file='llm_responses.sqlite',
+                 cache_sites=('classification',), cache_ttl=30 * 24 * 3600, cache_max_bytes=256 * 2 ** 20):
+        self.backend = backend or default_backend()
+        self.model = self.backend.model
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_timeout = request_timeout
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                      "cached_prompt_tokens": 0, "rate_limit_wait_s": 0.0, "early_stops": 0, "broken_streams": 0}
+        self.cache_sites = set(cache_sites)
+        self.cache = ResponseCache(cache_file, ttl=cache_ttl, max_bytes=cache_max_bytes) if cache_file else None
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        # Loop-bound objects must be created on the loop itself
+        self._run(self._setup(requests_per_minute, tokens_per_minute))
+
+    async def _setup(self, requests_per_minute, tokens_per_minute):
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._request_limiter = RateLimiter(requests_per_minute)
+        self._token_limiter = RateLimiter(tokens_per_minute)
+        await self.backend.open(self.max_in_flight)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def backoff_delay(self, attempt, error=None):
+        """
+        Full-jitter exponential backoff, never shorter than a Retry-After the server asked for.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = getattr(error, "headers", None) and error.headers.get("retry-after")
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    async def acomplete(self, messages, max_tokens=300, temperature=0.6, usage=None):
+        """
+        Send one chat completion and return the stripped reply text, or None once retries are exhausted.
+        If usage is a dict it receives the prompt, completion and provider-cached prompt tokens of the call.
+        Must run on this client's event loop; use complete() from ordinary code.
+        """
+        estimated = estimate_tokens(messages, max_tokens)
+
+        for attempt in range(self.max_retries + 1):
+            waited = await self._request_limiter.acquire()
+            waited += await self._token_limiter.acquire(estimated)
+            self.stats["rate_limit_wait_s"] += waited
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    text, reported = await self.backend.acomplete(messages, max_tokens, temperature,
+                                                                  self.request_timeout)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    print(f"Error calling GPT API: {str(e)}")
+                    return None
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff_delay(attempt, e))
+                continue
+
+            call_usage = {"prompt_tokens": reported.get("prompt_tokens", 0),
+                          "completion_tokens": reported.get("completion_tokens", 0),
+                          "cached_prompt_tokens": (reported.get("prompt_tokens_details") or {}).get("cached_tokens", 0)}
+            self._record_usage(call_usage, usage, estimated, reported.get("total_tokens", estimated))
+            return text.strip()
+
+    def _record_usage(self, call_usage, usage, estimated, total_tokens):
+        for name, tokens in call_usage.items():
+            self.stats[name] += tokens
+        if usage is not None:
+            usage.update(call_usage)
+        self._token_limiter.adjust(total_tokens - estimated)
+
+    async def astream(self, messages, on_text, max_tokens=300, temperature=0.6, usage=None):
+        """
+        Streaming version of acomplete(): every piece of the reply is passed to on_text(piece) as it arrives, and
+        the request is closed as soon as on_text returns True (nothing more is generated or paid for).
+        Returns all text received, which may be cut short by the early stop, by max_tokens or by a connection that
+        broke mid-reply; a request is only retried if it failed before any text arrived.
+        """
+        estimated = estimate_tokens(messages, max_tokens)
+
+        for attempt in range(self.max_retries + 1):
+            waited = await self._request_limiter.acquire()
+            waited += await self._token_limiter.acquire(estimated)
+            self.stats["rate_limit_wait_s"] += waited
+            pieces = []
+            reported = None
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    stream = self.backend.astream(messages, max_tokens, temperature, self.request_timeout)
+                    try:
+                        async for text, chunk_usage in stream:
+                            reported = chunk_usage or reported
+                            if text:
+                                pieces.append(text)
+                                if on_text(text):
+                                    self.stats["early_stops"] += 1
+                                    break
+                    finally:
+                        await stream.aclose()
+            except Exception as e:
+                if pieces:
+                    # Keep what arrived; the caller's parser decides whether it is enough
+                    self.stats["broken_streams"] += 1
+                    print(f"GPT API stream broke after {len(pieces)} chunks: {str(e)}")
+                elif not is_retryable(e) or attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    print(f"Error calling GPT API: {str(e)}")
+                    return None
+                else:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self.backoff_delay(attempt, e))
+                    continue
+
+            text = "".join(pieces)
+            if reported:
+                call_usage = {"prompt_tokens": reported.get("prompt_tokens", 0),
+                              "completion_tokens": reported.get("completion_tokens", 0),
+                              "cached_prompt_tokens": (reported.get("prompt_tokens_details") or {}).get("cached_tokens", 0)}
+            else:
+                # No usage chunk after an early stop or a broken stream; estimate what was sent and received
+                call_usage = {"prompt_tokens": estimate_tokens(messages, 0), "completion_tokens": len(text) // 4,
+                              "cached_prompt_tokens": 0}
+            self._record_usage(call_usage, usage, estimated,
+                               call_usage["prompt_tokens"] + call_usage["completion_tokens"])
+            return text.strip()
+
+    def _cached(self, messages, max_tokens, temperature, site, validate, refresh=False):
+        """
+        (cache key, cached reply) of a request; the key is None if site is not cached, the reply None on a miss.
+        A cached reply that validate rejects counts as a miss; refresh skips the lookup.
+        """
+        if self.cache is None or site not in self.cache_sites:
+            return None, None
+        key = cache_key(self.model, messages, temperature, max_tokens)
+        if refresh:
+            return key, None
+        reply = self.cache.get(key, site)
+        if reply is not None and validate is not None and not validate(reply):
+            reply = None
+        return key, reply
+
+    def _store(self, key, site, reply, validate):
+        # Only replies the caller could use are kept; a malformed one would be replayed for the whole TTL
+        if key is not None and reply and validate is not None and validate(reply):
+            self.cache.put(key, site, reply)
+
+    def complete(self, messages, max_tokens=300, temperature=0.6, site=None, usage=None, validate=None,
+                 refresh=False):
+        """
+        Blocking version of acomplete(), safe to call from many threads at once.
+        site names the calling code ('classification', 'weak', 'pii', 'strong'); if it is one of cache_sites, its
+        replies are served from the response cache, and a new reply is stored there once validate(reply) accepts
+        it (without validate nothing is stored). A cache hit reports zero tokens in usage.
+        refresh always asks the backend, e.g. when retrying a request whose reply was not usable.
+        """
+        usage = {} if usage is None else usage
+        usage.update({"prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0})
+        key, reply = self._cached(messages, max_tokens, temperature, site, validate, refresh)
+        if reply is not None:
+            return reply
+
+        reply = self._run(self.acomplete(messages, max_tokens=max_tokens, temperature=temperature, usage=usage))
+        _add_tracked_usage(usage)
+        self._store(key, site, reply, validate)
+        return reply
+
+    def complete_stream(self, messages, on_text, max_tokens=300, temperature=0.6, site=None, usage=None,
+                        validate=None, refresh=False):
+        """
+        Blocking version of astream(), with the response cache of complete(). on_text runs on the client's event
+        loop thread, so it must be quick and must not call the client; a cached reply is passed to it in one piece.
+        """
+        usage = {} if usage is None else usage
+        usage.update({"prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0})
+        key, reply = self._cached(messages, max_tokens, temperature, site, validate, refresh)
+        if reply is not None:
+            on_text(reply)
+            return reply
+
+        reply = self._run(self.astream(messages, on_text, max_tokens=max_tokens, temperature=temperature, usage=usage))
+        _add_tracked_usage(usage)
+        self._store(key, site, reply, validate)
+        return reply
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self._run(self.backend.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class Conversation:
+    """
+    Chat session of a generator: a fixed prefix (system prompt and standing instructions) followed by the turns
+    of the current record only. The prefix is never modified, so every request starts with byte-identical
+    messages and provider-side prompt caching can reuse it; reset() drops the record's turns, so the size of
+    a request does not grow with the number of records a generator has processed.
+    """
+
+    def __init__(self, prefix, site=None, max_tokens=300, temperature=0.6, max_turns=8):
+        self.prefix = tuple(dict(message) for message in prefix)
+        self.site = site
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_turns = max_turns
+        self.turns = []
+        self.calls = []  # Token usage of every call since the last reset
+
+    @property
+    def messages(self):
+        return list(self.prefix) + self.turns
+
+    def reset(self):
+        self.turns = []
+        self.calls = []
+
+    def send(self, message, on_text=None, validate=None):
+        """
+        Send a user message in the context of the prefix and this record's earlier turns; returns the reply
+        (also kept as a turn) or None. With on_text the reply is streamed through it (see LLMClient.astream);
+        validate decides whether the reply may be cached (see LLMClient.complete).
+        A failed call leaves the turns unchanged, so the next message does not follow an unanswered one.
+        """
+        # Never let one record's turns grow without bound; drop the oldest exchanges
+        while len(self.turns) + 1 > self.max_turns:
+            del self.turns[:2]
+        messages = self.messages + [{"role": "user", "content": message}]
+
+        usage = {}
+        if on_text is not None:
+            reply = get_client().complete_stream(messages, on_text, max_tokens=self.max_tokens,
+                                                 temperature=self.temperature, site=self.site, usage=usage,
+                                                 validate=validate)
+        else:
+            reply = get_client().complete(messages, max_tokens=self.max_tokens, temperature=self.temperature,
+                                          site=self.site, usage=usage, validate=validate)
+        self.calls.append(usage)
+        if reply is None:
+            return None
+        self.turns += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        return reply
+
+    def record_usage(self):
+        """
+        Calls and tokens spent since the last reset, i.e. on the current record.
+        """
+        totals = {"calls": len(self.calls), "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+        for usage in self.calls:
+            for name, tokens in usage.items():
+                totals[name] += tokens
+        return totals
+
+
+# One client per process, so all generators share the same limits and connections
+_shared_client = None
+_shared_settings = {}
+_shared_lock = threading.Lock()
+
+
+def configure(**settings):
+    """
+    Set the LLMClient arguments (max_in_flight, requests_per_minute, tokens_per_minute, ...) of the shared client.
+    Replaces a client that was already created.
+    """
+    global _shared_client
+    with _shared_lock:
+        _shared_settings.clear()
+        _shared_settings.update(settings)
+        old_client, _shared_client = _shared_client, None
+    if old_client is not None:
+        old_client.close()
+
+
+def get_client():
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient(**_shared_settings)
+            atexit.register(_shared_client.close)
+        return _shared_client
+
+
+# Example usage
+if __name__ == "__main__":
+    client = get_client()
+    reply = client.complete([{"role": "system", "content": "You are a Cyberspace Security Expert."},
+                             {"role": "user", "content": "Is 'abc123xyz' a weak password? Answer in one sentence."}],
+                            max_tokens=50, temperature=0)
+    print(reply)
+    print(client.stats)
+    if client.cache is not None:
+        print(client.cache.stats())
@@ -0,0 +1,85 @@
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from lsh_index import LSHIndex
+from password_pre import preprocess_hashes
+from password_recommender import batch_similarity, calculate_final_similarity, recommend_similar_passwords_from_index
+
+WEIGHTS = (0.6, 0.2, 0.2)
+
+
+def exact_top_scores(target_password, corpus, k=5):
+    """
+    Brute force: weighted similarity of the target against every other corpus password, best k scores.
+    """
+    scores = batch_similarity(target_password, [pwd for pwd in corpus if pwd != target_password], WEIGHTS)
+    return sorted(scores.tolist(), reverse=True)[:k]
+
+
+def recall_at_k(target_password, recommended, exact_scores, k=5):
+    """
+    Fraction of the exact top-k reached by the recommendations. A recommendation counts when it scores at least
+    the k-th exact score, so ties at the cut-off are not penalised.
+    """
+    if not exact_scores:
+        return 1.0
+    threshold = exact_scores[-1] - 1e-12
+    hits = sum(1 for pwd in recommended[:k] if calculate_final_similarity(target_password, pwd, WEIGHTS) >= threshold)
+    return hits / min(k, len(exact_scores))
+
+
+def run_benchmark(csv_file, configs, num_queries=100, k=5, seed=0):
+    """
+    Measure recall@k of the final weighted-similarity ranking against an exhaustive scan, query latency
+    and index memory for every (num_tables, num_hashes, max_hamming_dist) configuration.
+    """
+    corpus = pd.read_csv(csv_file, usecols=['Password'])['Password'].astype(str).str.strip()
+    corpus = sorted(set(pwd for pwd in corpus if pwd))
+    queries = random.Random(seed).sample(corpus, min(num_queries, len(corpus)))
+
+    print(f"Computing exact top-{k} for {len(queries)} queries over {len(corpus)} passwords...")
+    exact = {query: exact_top_scores(query, corpus, k) for query in queries}
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_tables, num_hashes, max_hamming_dist in configs:
+            index_file = os.path.join(tmp_dir, f"L{num_tables}_b{num_hashes}.idx")
+            if not os.path.exists(index_file):
+                preprocess_hashes(csv_file, index_file, num_hashes=num_hashes, num_tables=num_tables, workers=1)
+            index = LSHIndex(index_file)
+
+            latencies, recalls = [], []
+            for query in queries:
+                start = time.perf_counter()
+                recommended = recommend_similar_passwords_from_index(query, index, num_recommendations=k,
+                                                                     max_hamming_dist=max_hamming_dist)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(recall_at_k(query, recommended, exact[query], k))
+
+            results.append({
+                "tables": num_tables,
+                "bits": num_hashes,
+                "radius": max_hamming_dist,
+                f"recall@{k}": round(float(np.mean(recalls)), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+                "index_mb": round(os.path.getsize(index_file) / 2 ** 20, 3),
+            })
+            del index
+
+    return pd.DataFrame(results)
+
+
+# Example usage
+if __name__ == "__main__":
+    configs = [(num_tables, num_hashes, radius)
+               for num_tables in (1, 2, 4)
+               for num_hashes in (10, 16)
+               for radius in (1, 2)]
+    report = run_benchmark('sample dataset.csv', configs, num_queries=100)
+    print(report.to_string(index=False))
@@ -0,0 +1,440 @@
+import json
+import os
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from featurizer import make_featurizer
+
+# Binary LSH index layout (all integers little-endian):
+#   8 bytes   magic b'SHLSHIDX'
+#   4 bytes   header length, followed by the JSON header padded to 8-byte alignment
+#   then for every hash table t (independent hyperplanes seeded with seeds[t]):
+#   codes_t   (count, words) uint64 sorted ascending, hash bit i stored in bit i % 64 of word i // 64
+#   rows_t    (count,) uint32/uint64, password row of each sorted code
+#   buckets_t (2 ** num_hashes + 1,) uint64 start of every bucket in codes_t, only when num_hashes <= MAX_TABLE_BITS
+#   offsets   (count + 1) uint64, start of each password in the blob
+#   blob      UTF-8 passwords back to back, in input order
+# Section positions are recorded in the header so readers can memory-map each one directly.
+INDEX_MAGIC = b'SHLSHIDX'
+INDEX_VERSION = 3
+
+# Largest code length that gets a dense bucket offsets table (2 ** 20 buckets = 8 MB); longer codes use binary search
+MAX_TABLE_BITS = 20
+
+# Largest Hamming ball that mode='auto' still enumerates bucket by bucket
+MAX_BALL_PROBES = 4096
+
+# Rows per block in hamming_scan: 32768 single-word codes is 256 KB, which stays in L2 cache
+SCAN_BLOCK_ROWS = 1 << 15
+
+
+def is_index_file(path):
+    """Check whether path is a binary LSH index rather than a legacy hash CSV"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+    except OSError:
+        return False
+
+
+def num_words(num_hashes):
+    return max(1, (num_hashes + 63) // 64)
+
+
+def pack_bits(bits):
+    """
+    Pack an (n, num_hashes) 0/1 matrix into (n, words) uint64 codes.
+    """
+    bits = np.asarray(bits, dtype=np.uint64)
+    if bits.ndim == 1:
+        bits = bits[None, :]
+    words = num_words(bits.shape[1])
+    codes = np.zeros((bits.shape[0], words), dtype=np.uint64)
+    for i in range(bits.shape[1]):
+        codes[:, i // 64] |= bits[:, i] << np.uint64(i % 64)
+    return codes
+
+
+def table_seeds(seed, num_tables):
+    """Seed of each hash table; table 0 keeps the base seed so single-table indexes are unchanged"""
+    return [seed + t for t in range(num_tables)]
+
+
+def hamming_ball_size(num_bits, radius):
+    return sum(comb(num_bits, dist) for dist in range(min(radius, num_bits) + 1))
+
+
+@lru_cache(maxsize=None)
+def hamming_ball_masks(num_bits, radius):
+    """
+    XOR masks of every code within `radius` bit flips, ordered by distance (the 0 mask first).
+    """
+    masks = []
+    for dist in range(min(radius, num_bits) + 1):
+        for positions in combinations(range(num_bits), dist):
+            masks.append(sum(1 << p for p in positions))
+    masks = np.array(masks, dtype=np.uint64)
+    masks.setflags(write=False)
+    return masks
+
+
+# Per-byte popcount table for NumPy versions without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Number of set bits in each element of a uint64 array.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    return _BYTE_POPCOUNT[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_scan(codes, target_code, k=None, max_hamming_dist=None, block_rows=SCAN_BLOCK_ROWS, workers=1):
+    """
+    Exact Hamming search over an (n, words) uint64 code array by XOR + popcount, one block of rows at a time.
+    Returns (positions, distances) of the k nearest codes, or of every code within max_hamming_dist,
+    or both constraints together; results are ordered by distance.
+    workers > 1 scans blocks on a thread pool (NumPy releases the GIL inside the ufuncs).
+    """
+    target_code = np.asarray(target_code, dtype=np.uint64).reshape(1, -1)
+    num_rows = len(codes)
+
+    def scan_block(start):
+        block = np.asarray(codes[start:start + block_rows])
+        distances = popcount(block ^ target_code).sum(axis=1, dtype=np.int64)
+        positions = np.arange(start, start + len(block))
+        if max_hamming_dist is not None:
+            within = distances <= max_hamming_dist
+            positions, distances = positions[within], distances[within]
+        if k is not None and len(distances) > k:
+            # Only the k best of a block can survive the final merge
+            best = np.argpartition(distances, k - 1)[:k]
+            positions, distances = positions[best], distances[best]
+        return positions, distances
+
+    starts = range(0, num_rows, block_rows)
+    if workers > 1 and num_rows > block_rows:
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(scan_block, starts))
+    else:
+        results = [scan_block(start) for start in starts]
+
+    if not results:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    positions = np.concatenate([r[0] for r in results])
+    distances = np.concatenate([r[1] for r in results])
+    if k is not None and len(distances) > k:
+        best = np.argpartition(distances, k - 1)[:k]
+        positions, distances = positions[best], distances[best]
+    order = np.argsort(distances, kind='stable')
+    return positions[order], distances[order]
+
+
+class BucketIndex:
+    """
+    Codes sorted ascending with the row each one came from, so that a bucket is one contiguous slice.
+    Queries enumerate the Hamming ball around the target code and slice the matching buckets,
+    which costs O(ball size * log n) instead of a scan over every stored code.
+    """
+
+    def __init__(self, codes, rows, num_hashes, buckets=None):
+        self.codes = codes
+        self.sorted_codes = codes[:, 0] if codes.ndim == 2 else codes
+        self.rows = rows
+        self.positions = None
+        self.num_hashes = num_hashes
+        self.buckets = buckets
+
+    @classmethod
+    def from_codes(cls, codes, num_hashes):
+        codes = np.asarray(codes, dtype=np.uint64).reshape(-1)
+        rows = np.argsort(codes, kind='stable')
+        return cls(codes[rows], rows, num_hashes)
+
+    def bucket_ranges(self, codes):
+        if self.buckets is not None:
+            codes = codes.astype(np.int64)
+            return self.buckets[codes].astype(np.int64), self.buckets[codes + 1].astype(np.int64)
+        return (np.searchsorted(self.sorted_codes, codes, side='left'),
+                np.searchsorted(self.sorted_codes, codes, side='right'))
+
+    def lookup(self, target_code, max_hamming_dist=2, max_candidates=None):
+        """
+        Rows of every stored code within max_hamming_dist of target_code, nearest buckets first.
+        At most max_candidates rows are returned; the bucket that crosses the cap is cut short.
+        """
+        if self.num_hashes > 64:
+            raise ValueError("Bucket lookup needs codes of at most 64 bits; use a scan for longer codes")
+        probes = np.uint64(target_code) ^ hamming_ball_masks(self.num_hashes, max_hamming_dist)
+        starts, ends = self.bucket_ranges(probes)
+        sizes = ends - starts
+        hit = np.nonzero(sizes)[0]
+        starts, sizes = starts[hit], sizes[hit]
+
+        if max_candidates is not None:
+            # Trim the bucket list so the total size stays within the cap
+            cumulative = np.cumsum(sizes)
+            keep = np.searchsorted(cumulative, max_candidates, side='left') + 1
+            starts, sizes = starts[:keep], sizes[:keep].copy()
+            if len(sizes) and cumulative[len(sizes) - 1] > max_candidates:
+                sizes[-1] -= cumulative[len(sizes) - 1] - max_candidates
+
+        if len(sizes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        # Gather all slices with one fancy index instead of a Python loop over buckets
+        positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(int(sizes.sum()))
+        return np.asarray(self.rows[positions], dtype=np.int64)
+
+
+class IndexWriter:
+    """
+    Stream (passwords, hash bits) chunks into a binary index file.
+    Sections are spooled to temporary files next to the output and assembled on close(),
+    so memory use does not depend on the number of passwords (apart from sorting one table's codes).
+    """
+
+    def __init__(self, path, num_hashes, seed, featurizer_params, num_tables=1):
+        self.path = path
+        self.num_hashes = num_hashes
+        self.seed = seed
+        self.featurizer_params = featurizer_params
+        self.num_tables = num_tables
+        self.count = 0
+        self._blob_size = 0
+        self._codes = [open(path + f'.codes_{t}.tmp', 'wb') for t in range(num_tables)]
+        self._offsets = open(path + '.offsets.tmp', 'wb')
+        self._blob = open(path + '.blob.tmp', 'wb')
+        self._offsets.write(struct.pack('<Q', 0))
+
+    def add(self, passwords, bits):
+        """
+        bits is (n, num_hashes) for a single table or (n, num_tables, num_hashes).
+        """
+        bits = np.asarray(bits).reshape(len(passwords), self.num_tables, self.num_hashes)
+        codes = np.stack([pack_bits(bits[:, t]) for t in range(self.num_tables)], axis=1)
+        self.add_codes(passwords, codes)
+
+    def add_codes(self, passwords, codes):
+        """
+        Same as add() with already packed codes of shape (n, num_tables, words).
+        """
+        encoded = [pwd.encode('utf-8') for pwd in passwords]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.uint64, count=len(encoded))
+        for t, codes_file in enumerate(self._codes):
+            codes_file.write(np.ascontiguousarray(codes[:, t], dtype='<u8').tobytes())
+        self._offsets.write((self._blob_size + np.cumsum(lengths, dtype=np.uint64)).astype('<u8').tobytes())
+        self._blob.write(b''.join(encoded))
+        self._blob_size += int(lengths.sum())
+        self.count += len(encoded)
+
+    def close(self):
+        for f in self._codes + [self._offsets, self._blob]:
+            f.close()
+
+        words = num_words(self.num_hashes)
+        row_dtype = np.dtype('<u4') if self.count < 2 ** 32 else np.dtype('<u8')
+        section_sizes = []
+        for t in range(self.num_tables):
+            section_sizes += self._sort_table(t, words, row_dtype)
+        section_sizes += [("offsets", (self.count + 1) * 8), ("blob", self._blob_size)]
+
+        header = {
+            "version": INDEX_VERSION,
+            "num_hashes": self.num_hashes,
+            "seed": self.seed,
+            "num_tables": self.num_tables,
+            "seeds": table_seeds(self.seed, self.num_tables),
+            "featurizer": self.featurizer_params,
+            "count": self.count,
+            "words": words,
+            "rows_dtype": row_dtype.str,
+        }
+        write_sectioned_file(self.path, INDEX_MAGIC, header,
+                             [(name, self.path + f'.{name}.tmp', size) for name, size in section_sizes])
+
+    def _sort_table(self, t, words, row_dtype):
+        """Sort one table's codes so every bucket is contiguous, keeping the password row of each code"""
+        codes = np.fromfile(self.path + f'.codes_{t}.tmp', dtype='<u8').reshape(self.count, words)
+        rows = np.lexsort(codes.T[::-1]) if self.count else np.zeros(0, dtype=np.int64)
+        codes = codes[rows]
+        codes.tofile(self.path + f'.codes_{t}.tmp')
+        rows.astype(row_dtype).tofile(self.path + f'.rows_{t}.tmp')
+
+        section_sizes = [(f"codes_{t}", self.count * words * 8), (f"rows_{t}", self.count * row_dtype.itemsize)]
+        if self.num_hashes <= MAX_TABLE_BITS:
+            buckets = np.searchsorted(codes[:, 0], np.arange(2 ** self.num_hashes + 1, dtype=np.uint64), side='left')
+            buckets.astype('<u8').tofile(self.path + f'.buckets_{t}.tmp')
+            section_sizes.append((f"buckets_{t}", (2 ** self.num_hashes + 1) * 8))
+        return section_sizes
+
+
+def _align(position, alignment=8):
+    return (position + alignment - 1) // alignment * alignment
+
+
+def write_sectioned_file(path, magic, header, sections):
+    """
+    Write magic, a length-prefixed JSON header and 8-byte aligned binary sections to path atomically.
+    sections is a list of (name, spool_file, size); each spool file is copied in and removed.
+    The header gets a "sections" entry mapping every name to its [offset, size].
+    """
+    # The header records section offsets, which depend on the header length; iterate until stable
+    header = dict(header)
+    header_bytes = b''
+    while True:
+        position = _align(len(magic) + 4 + len(header_bytes))
+        offsets = {}
+        for name, _, size in sections:
+            offsets[name] = [position, size]
+            position = _align(position + size)
+        header["sections"] = offsets
+        new_header_bytes = json.dumps(header).encode('utf-8')
+        if len(new_header_bytes) == len(header_bytes):
+            header_bytes = new_header_bytes
+            break
+        header_bytes = new_header_bytes
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(magic)
+        out.write(struct.pack('<I', len(header_bytes)))
+        out.write(header_bytes)
+        for name, spool_file, _ in sections:
+            out.write(b'\0' * (offsets[name][0] - out.tell()))
+            with open(spool_file, 'rb') as section:
+                shutil.copyfileobj(section, out, 1 << 20)
+            os.remove(spool_file)
+    os.replace(tmp_path, path)
+
+
+def read_sectioned_header(path, magic):
+    """Read the JSON header written by write_sectioned_file, checking the magic"""
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a {magic.decode()} file")
+        header_len, = struct.unpack('<I', f.read(4))
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def map_section(path, header, name, dtype, shape):
+    """Memory-map one section of a file written by write_sectioned_file"""
+    offset, size = header["sections"][name]
+    if size == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+class LSHIndex:
+    """
+    Read-only view of a binary LSH index with one or more hash tables.
+    All sections are memory-mapped, so opening is cheap and pages are shared between processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_sectioned_header(path, INDEX_MAGIC)
+        if self.header["version"] != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {self.header['version']}, rebuild it with password_pre.preprocess_hashes")
+
+        self.num_hashes = self.header["num_hashes"]
+        self.seed = self.header["seed"]
+        self.num_tables = self.header["num_tables"]
+        self.seeds = self.header["seeds"]
+        self.count = self.header["count"]
+        self.featurizer = make_featurizer(self.header["featurizer"])
+        self.offsets = self._map("offsets", np.dtype('<u8'), (self.count + 1,))
+        self.blob = self._map("blob", np.uint8, (self.header["sections"]["blob"][1],))
+
+        self.tables = []
+        rows_dtype = np.dtype(self.header["rows_dtype"])
+        for t in range(self.num_tables):
+            codes = self._map(f"codes_{t}", np.dtype('<u8'), (self.count, self.header["words"]))
+            rows = self._map(f"rows_{t}", rows_dtype, (self.count,))
+            buckets = None
+            if f"buckets_{t}" in self.header["sections"]:
+                buckets = self._map(f"buckets_{t}", np.dtype('<u8'), (2 ** self.num_hashes + 1,))
+            self.tables.append(BucketIndex(codes, rows, self.num_hashes, buckets))
+
+    def _map(self, name, dtype, shape):
+        return map_section(self.path, self.header, name, dtype, shape)
+
+    def __len__(self):
+        return self.count
+
+    def password(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.blob[start:end]).decode('utf-8')
+
+    def passwords(self, rows):
+        return [self.password(row) for row in rows]
+
+    def lookup(self, target_code, max_hamming_dist=2, max_candidates=None, table=0):
+        """
+        Password rows within max_hamming_dist of a packed code in one table, see BucketIndex.lookup.
+        """
+        return self.tables[table].lookup(target_code, max_hamming_dist, max_candidates)
+
+    def scan(self, target_code, k=None, max_hamming_dist=None, workers=1, table=0):
+        """
+        Password rows found by an exact XOR + popcount scan over every code of one table, nearest first.
+        Works for any code length, see hamming_scan.
+        """
+        bucket_index = self.tables[table]
+        positions, _ = hamming_scan(bucket_index.codes, target_code, k=k, max_hamming_dist=max_hamming_dist, workers=workers)
+        return np.asarray(bucket_index.rows[positions], dtype=np.int64)
+
+    def codes_by_row(self, table, rows):
+        """
+        Packed codes of the given password rows in one table, shape (len(rows), words).
+        Builds the inverse of the table's sort permutation on first use.
+        """
+        bucket_index = self.tables[table]
+        if bucket_index.positions is None:
+            bucket_index.positions = np.empty(self.count, dtype=np.int64)
+            bucket_index.positions[np.asarray(bucket_index.rows, dtype=np.int64)] = np.arange(self.count)
+        return np.asarray(bucket_index.codes[bucket_index.positions[rows]])
+
+    def candidates(self, target_codes, max_hamming_dist=2, max_candidates=None, mode='auto', workers=1):
+        """
+        Union of the candidate rows of every table for packed target codes of shape (num_tables, words).
+        mode='bucket' enumerates the Hamming ball and slices buckets; mode='scan' computes the exact
+        distance to every code with XOR + popcount, which stays practical for long codes where the ball explodes.
+        mode='auto' picks bucket lookup while the ball has at most MAX_BALL_PROBES codes.
+        Rows keep the order of the first table that found them; at most max_candidates are returned.
+        """
+        if mode == 'auto':
+            mode = 'bucket' if hamming_ball_size(self.num_hashes, max_hamming_dist) <= MAX_BALL_PROBES else 'scan'
+        if mode not in ('bucket', 'scan'):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+
+        found = []
+        for t in range(self.num_tables):
+            if mode == 'bucket':
+                found.append(self.lookup(target_codes[t][0], max_hamming_dist, max_candidates, table=t))
+            else:
+                found.append(self.scan(target_codes[t], k=max_candidates, max_hamming_dist=max_hamming_dist,
+                                       workers=workers, table=t))
+        rows = np.concatenate(found)
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)][:max_candidates]
+
+    def candidate_passwords(self, target_codes, max_hamming_dist=2, max_candidates=None, mode='auto', workers=1):
+        """
+        Passwords of the candidate rows returned by candidates().
+        """
+        return self.passwords(self.candidates(target_codes, max_hamming_dist, max_candidates, mode, workers))
+
+
+# Example usage
+if __name__ == "__main__":
+    index = LSHIndex('sample dataset_hash.idx')
+    print(f"{len(index)} passwords, {index.num_tables} x {index.num_hashes} hash bits, featurizer {index.header['featurizer']}")
+    print("Passwords in the lowest bucket:", index.passwords(index.lookup(index.tables[0].sorted_codes[0], max_hamming_dist=0)))
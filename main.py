@@ -1,17 +1,55 @@
 from weak_generator import WeakPasswordGenerator  # Import the generator for weak passwords
 from strong_generator import StrongPasswordGenerator
 from pii_generator import PIIGenerator
-from weakness_evaluation import evaluate_password_strength  # Import GPT API for weak password evaluation
+from pcfg_generator import PCFGGenerator, PCFGModel
+from password_recommender import PasswordRecommender
+from strength_classifier import StrengthClassifier
+from llm_client import get_client, track_usage
+from mutation_engine import LETTERS_DIGITS_PUNCTUATION, MutationEngine, spawn_seed
+from strategy_router import StrategyRouter
+from weakness_evaluation import evaluate_password_strength, evaluate_password_strength_batch  # Import GPT API for weak password evaluation
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import chain, islice
+import csv
+import io
+import os
+import threading
+import numpy as np
 import pandas as pd
 import json
 
+# Honeyword columns of a streamed output file: the true password followed by 20 honeywords (what shuffle.py reads)
+HONEYWORD_COLUMNS = 21
+
 
 class HoneywordsMain:
-    def __init__(self):
+    # Reason and strategy name of every label
+    LABELS = {
+        1: ("Password is weak, may follow common patterns", "Weak password-based"),
+        2: ("Password is strong, meets security standards", "Strong password-based"),
+        3: ("Record contains personal identifiable information (PII)", "PII-based"),
+    }
+    # Local strategies, used without any LLM call
+    PCFG_STRATEGY = "PCFG-based"
+    MUTATION_STRATEGY = "Mutation-based"
+    CLASSIFICATION = "Strength classification"
+
+    def __init__(self, recommender=None, classifier=None, single_shot=False, stream=False, seed=None,
+                 pcfg_model=None, pcfg_labels=(1,), router=None):
+        # Local rules settle clear-cut passwords; only ambiguous ones are sent to the LLM
+        self.classifier = classifier or StrengthClassifier()
+        # One local mutation engine (and random stream) per HoneywordsMain, i.e. per worker; seed is a SeedSequence
+        self.engine = MutationEngine(spawn_seed(seed))
         # Initialize the various generators
-        self.weak_password_generator = WeakPasswordGenerator("XYZ University")  # Initialize with a specific university name
-        self.strong_password_generator = StrongPasswordGenerator("XYZ University")  # Pass the university name
-        self.pii_generator = PIIGenerator("XYZ University")  # PII generation strategy
+        self.weak_password_generator = WeakPasswordGenerator("XYZ University", single_shot=single_shot, stream=stream, engine=self.engine)  # Initialize with a specific university name
+        self.strong_password_generator = StrongPasswordGenerator("XYZ University", recommender=recommender, stream=stream, engine=self.engine)  # Pass the university name
+        self.pii_generator = PIIGenerator("XYZ University", single_shot=single_shot, stream=stream, engine=self.engine)  # PII generation strategy
+        # Local PCFG strategy (no LLM call) for the records whose label is in pcfg_labels, if a model is given
+        self.pcfg_generator = PCFGGenerator(pcfg_model, engine=self.engine) if pcfg_model is not None else None
+        self.pcfg_labels = set(pcfg_labels) if self.pcfg_generator else set()
+        # Decides per record whether an LLM strategy may run (budgets, provider health); shared by all workers
+        self.router = router or StrategyRouter()
 
     def is_pii_record(self, record):
         """
@@ -22,9 +60,17 @@ class HoneywordsMain:
 
     def is_weak_password(self, password):
         """
-        Use GPT to evaluate if the password is weak.
+        Use GPT to evaluate if the password is weak, unless the local classifier is confident enough.
+        When the router keeps the record away from the LLM, the classifier's best guess decides.
         """
-        result = evaluate_password_strength(password)
+        result = self.classifier.classify(password)
+        if result is None:
+            ticket = self.router.acquire(self.CLASSIFICATION)
+            if ticket is None:
+                return self.classifier.score(password)[0] == 1
+            with track_usage() as usage:
+                result = evaluate_password_strength(password)
+            self.router.release(ticket, usage, errors=int(result is None))
         if result:
             return result["Tag"] == 1  # Tag 1 indicates a weak password
         return False  # If an error occurs, consider it a strong password by default
@@ -35,68 +81,363 @@ class HoneywordsMain:
         record: (password, username, birthday, name, email)
         """
         password, username, birthday, name, email = record
-        result = {
-            "reason": "",
-            "label": 0,
-            "honeywords": []
-        }
 
         # Check if the record contains PII information
         if self.is_pii_record(record):
-            result["reason"] = "Record contains personal identifiable information (PII)"
-            result["label"] = 3
-            honeywords_result = self.pii_generator.generate(password, username, birthday, name, email)
-            honeywords = honeywords_result.get('honeywords', []) if honeywords_result else []
-            print("Generation strategy used: PII-based")
+            label = 3
         elif self.is_weak_password(password):
-            result["reason"] = "Password is weak, may follow common patterns"
-            result["label"] = 1
-            weak_password_result = self.weak_password_generator.generate(password)
-            honeywords = weak_password_result.get('honeywords', []) if weak_password_result else []
-            print("Generation strategy used: Weak password-based")
+            label = 1
         else:
-            result["reason"] = "Password is strong, meets security standards"
-            result["label"] = 2
-            strong_password_result = self.strong_password_generator.generate(password)
-            honeywords = strong_password_result.get('honeywords', []) if strong_password_result else []
-            print("Generation strategy used: Strong password-based")
+            label = 2
 
-        # Include the original password and ensure there are returned values
-        result["honeywords"] = [password] + honeywords if honeywords else [password]
+        if label not in self.pcfg_labels:
+            if label == 3:
+                result = self.generate_with_llm(3, self.pii_generator,
+                                                lambda: self.pii_generator.generate(password, username, birthday, name, email))
+            elif label == 1:
+                result = self.generate_with_llm(1, self.weak_password_generator,
+                                                lambda: self.weak_password_generator.generate(password))
+            else:
+                result = self.generate_with_llm(2, self.strong_password_generator,
+                                                lambda: self.strong_password_generator.generate(password))
+            if result is not None:
+                return self.make_result(password, label, result)
+
+        # PCFG labels, and records the router moved off the LLM, use a local strategy
+        strategy, result = self.generate_locally(password)
+        return self.make_result(password, label, result, strategy)
+
+    def generate_with_llm(self, label, generator, generate):
+        """
+        Run generate() (an LLM-backed generator's call) if the router allows the label's strategy and measure it;
+        returns its result, or None if the record has to go to a local strategy.
+        """
+        ticket = self.router.acquire(self.LABELS[label][1])
+        if ticket is None:
+            return None
+        fallbacks = generator.fallbacks
+        with track_usage() as usage:
+            result = generate()
+        self.router.release(ticket, usage, errors=int(result is None or generator.fallbacks > fallbacks))
         return result
 
+    def generate_locally(self, password):
+        """
+        (strategy, result) of the local strategy: the PCFG model if there is one, otherwise tail mutations.
+        """
+        strategy = self.PCFG_STRATEGY if self.pcfg_generator else self.MUTATION_STRATEGY
+        ticket = self.router.acquire(strategy, local=True)
+        if self.pcfg_generator:
+            result = self.pcfg_generator.generate(password)
+        else:
+            result = {"honeywords": self.engine.mutate(password, count=20, alphabet=LETTERS_DIGITS_PUNCTUATION),
+                      "explanation": "These honeywords replace the last 1-3 characters of the password with random characters."}
+        self.router.release(ticket)
+        return strategy, result
+
+    def generate_honeywords_batch(self, records):
+        """
+        generate_honeywords for several records at once: the LLM strength evaluation and the weak-password
+        generation each pack all records that need them into batched requests; PII and strong-password records
+        are generated one by one as before. Results are in the order of records.
+        """
+        labels = [None] * len(records)
+        to_evaluate = []
+        for i, record in enumerate(records):
+            if self.is_pii_record(record):
+                labels[i] = 3
+            else:
+                local_result = self.classifier.classify(record[0])
+                if local_result:
+                    labels[i] = local_result["Tag"]
+                else:
+                    to_evaluate.append(i)
+
+        ticket = self.router.acquire(self.CLASSIFICATION, records=len(to_evaluate)) if to_evaluate else None
+        if ticket is not None:
+            with track_usage() as usage:
+                evaluations = evaluate_password_strength_batch([records[i][0] for i in to_evaluate])
+            self.router.release(ticket, usage, errors=sum(evaluation is None for evaluation in evaluations))
+            for i, evaluation in zip(to_evaluate, evaluations):
+                labels[i] = 1 if evaluation and evaluation["Tag"] == 1 else 2  # Strong by default on error
+        else:
+            for i in to_evaluate:
+                labels[i] = 1 if self.classifier.score(records[i][0])[0] == 1 else 2
+
+        weak = [i for i, label in enumerate(labels) if label == 1 and label not in self.pcfg_labels]
+        weak_results = {}
+        ticket = self.router.acquire(self.LABELS[1][1], records=len(weak)) if weak else None
+        if ticket is not None:
+            fallbacks = self.weak_password_generator.fallbacks
+            with track_usage() as usage:
+                weak_results = dict(zip(weak, self.weak_password_generator.generate_batch([records[i][0] for i in weak])))
+            self.router.release(ticket, usage, errors=self.weak_password_generator.fallbacks - fallbacks)
+
+        results = []
+        for i, (password, username, birthday, name, email) in enumerate(records):
+            generation_result = None
+            if labels[i] in self.pcfg_labels:
+                generation_result = None  # Local strategy below
+            elif labels[i] == 3:
+                generation_result = self.generate_with_llm(3, self.pii_generator,
+                                                           lambda: self.pii_generator.generate(password, username, birthday, name, email))
+            elif labels[i] == 1:
+                generation_result = weak_results.get(i)
+            else:
+                generation_result = self.generate_with_llm(2, self.strong_password_generator,
+                                                           lambda: self.strong_password_generator.generate(password))
+            if generation_result is not None:
+                results.append(self.make_result(password, labels[i], generation_result))
+            else:
+                strategy, generation_result = self.generate_locally(password)
+                results.append(self.make_result(password, labels[i], generation_result, strategy))
+        return results
+
+    def make_result(self, password, label, generation_result, strategy=None):
+        """
+        Final record result from a generator's {'honeywords', 'explanation'} output (or None).
+        strategy overrides the label's default strategy name when another generator was used.
+        """
+        reason, default_strategy = self.LABELS[label]
+        strategy = strategy or default_strategy
+        honeywords = generation_result.get('honeywords', []) if generation_result else []
+        print(f"Generation strategy used: {strategy}")
+
+        # Include the original password and ensure there are returned values
+        return {
+            "reason": reason,
+            "label": label,
+            "strategy": strategy,
+            "honeywords": [password] + honeywords if honeywords else [password]
+        }
+
+
+# Each worker thread keeps its own HoneywordsMain (generators hold per-record conversation state)
+_worker_state = threading.local()
+
+def _generate_unit(generator, records):
+    # A unit is one record, or a batch of records sharing batched LLM requests
+    if len(records) == 1:
+        return [generator.generate_honeywords(records[0])]
+    return generator.generate_honeywords_batch(records)
+
+def _generate_in_worker(generator_options, records):
+    generator = getattr(_worker_state, 'generator', None)
+    if generator is None:
+        generator = _worker_state.generator = HoneywordsMain(**generator_options)
+    return _generate_unit(generator, records)
+
+
+def _make_record(row):
+    # An empty or numeric Password cell is read as a float or an int; every strategy expects a string
+    return (str(row['Password']), row.get('Username', 'Nah'), row.get('Birthday', 'Nah'), row.get('Name', 'Nah'),
+            row.get('Email', 'Nah'))
+
+
+def _print_llm_statistics():
+    client = get_client()
+    print(f"LLM client statistics: {client.stats}")
+    if client.cache is not None:
+        print(f"LLM response cache statistics: {client.cache.stats()}")
+
+
+def _read_journal(journal_file):
+    """
+    Last checkpoint of a streaming run: records written and the output size after them.
+    """
+    checkpoint = {"records": 0, "offset": 0}
+    if os.path.exists(journal_file):
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    checkpoint = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Torn last line after a crash
+    return checkpoint
+
+
+def _stream_records(input_file, chunksize, skip):
+    # Read the input in chunks, skipping records that an earlier run already finished.
+    # Skipped records are counted after parsing, since a quoted field may span several lines
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        if skip >= len(chunk):
+            skip -= len(chunk)
+            continue
+        for row in chunk.iloc[skip:].to_dict('records'):
+            yield row
+        skip = 0
+
+
+def _process_csv_streaming(input_file, output_file, generator_options, workers, chunksize, unit_size):
+    """
+    Streaming mode of process_csv: records are read chunk by chunk and every finished record is appended to the
+    output at once, so memory stays flat. After each record the output is synced to disk and a checkpoint
+    {"records", "offset"} is appended to output_file + '.progress'; a rerun truncates the output to the last
+    checkpoint and continues with the next record.
+    """
+    journal_file = output_file + '.progress'
+    checkpoint = _read_journal(journal_file)
+    if not os.path.exists(output_file):
+        checkpoint = {"records": 0, "offset": 0}
+    if checkpoint.get("done"):
+        print(f"{output_file} is already complete ({checkpoint['records']} records)")
+        return
+    if checkpoint["records"]:
+        print(f"Resuming after {checkpoint['records']} records already saved in {output_file}")
+
+    columns = list(pd.read_csv(input_file, nrows=0).columns)
+    header = columns + [f'Honeyword_{i}' for i in range(1, HONEYWORD_COLUMNS + 1)] + ['Strategy']
+    records_done = checkpoint["records"]
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    generator = HoneywordsMain(**generator_options) if executor is None else None
+    try:
+        with open(output_file, 'ab' if records_done else 'wb') as out, \
+                open(journal_file, 'a' if records_done else 'w', encoding='utf-8') as journal:
+            # Drop rows written after the last checkpoint
+            out.truncate(checkpoint["offset"])
+            out.seek(checkpoint["offset"])
+            if not records_done:
+                out.write(b'\xef\xbb\xbf')  # UTF-8 BOM, like to_csv(encoding='utf-8-sig')
+
+            def write_row(values):
+                line = io.StringIO()
+                csv.writer(line).writerow(values)
+                out.write(line.getvalue().encode('utf-8'))
+
+            if not records_done:
+                write_row(header)
+
+            # Submit units of records ahead of the one being written, but never more than 2 * workers at once
+            pending = deque()
+            rows = _stream_records(input_file, chunksize, records_done)
+            while True:
+                while len(pending) < max(1, 2 * workers):
+                    unit_rows = list(islice(rows, unit_size))
+                    if not unit_rows:
+                        break
+                    records = [_make_record(row) for row in unit_rows]
+                    if executor is None:
+                        pending.append((unit_rows, records, _generate_unit(generator, records)))
+                    else:
+                        pending.append((unit_rows, records, executor.submit(_generate_in_worker, generator_options, records)))
+                if not pending:
+                    break
+
+                unit_rows, records, results = pending.popleft()
+                if executor is not None:
+                    results = results.result()
+                for row, record, result in zip(unit_rows, records, results):
+                    honeywords = result.get("honeywords", [])[:HONEYWORD_COLUMNS]
+                    write_row(['' if pd.isna(row[column]) else row[column] for column in columns]
+                              + honeywords + [''] * (HONEYWORD_COLUMNS - len(honeywords)) + [result.get("strategy", "")])
+
+                    # Make the row durable before recording it as done
+                    out.flush()
+                    os.fsync(out.fileno())
+                    records_done += 1
+                    journal.write(json.dumps({"records": records_done, "offset": out.tell()}) + '\n')
+                    journal.flush()
+                    os.fsync(journal.fileno())
+
+                    password, username, birthday, name, email = record
+                    print(
+                        f"Processed record {records_done}: Password: {password}, Username: {username}, Birthday: {birthday}, Name: {name}, Email: {email}")
+
+            journal.write(json.dumps({"records": records_done, "offset": out.tell(), "done": True}) + '\n')
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    print(f"Processing completed, results saved to {output_file}")
+
+
+def process_csv(input_file, output_file, index_file='sample dataset_hash.idx', neighbor_file=None, workers=1,
+                chunksize=None, frequent_file=None, classifier_threshold=0.85, batch_size=None, single_shot=False,
+                stream=False, seed=None, pcfg_file=None, pcfg_labels=(1,), token_budget=None, cost_budget=None,
+                max_record_latency=None):
+    """
+    Generate honeywords for every record of input_file.
+    workers > 1 keeps that many records in flight at once (bounded further by the shared LLM client's limits);
+    the output keeps the input order either way.
+    chunksize switches to the streaming mode: the input is read chunksize rows at a time, finished records are
+    appended to output_file as they complete (with HONEYWORD_COLUMNS honeyword columns), and an interrupted run
+    resumes where it stopped when started again with the same arguments.
+    frequent_file is a frequent password set built by strength_classifier.build_frequent_set; together with the
+    local rules it decides clear-cut passwords without an LLM call (classifier_threshold is the confidence needed).
+    batch_size groups that many records per unit of work, so their strength evaluations and weak-password
+    generations are sent as batched multi-record requests.
+    single_shot makes the weak-password and PII generators send one request per record instead of two.
+    stream makes the generators parse honeywords while the reply arrives, stop the request once 20 valid ones
+    are in, and keep the honeywords of a truncated reply (batched weak-password requests are not streamed).
+    seed makes the local mutations (fallbacks and top-ups) reproducible; every worker draws from its own stream.
+    pcfg_file is a model built by pcfg_generator.train_pcfg; records with a label in pcfg_labels (1 weak,
+    2 strong, 3 PII) then get honeywords from the local PCFG strategy instead of an LLM generator.
+    token_budget (LLM tokens), cost_budget (dollars) and max_record_latency (p99 seconds per record) bound the
+    LLM strategies: once a budget would be exceeded, or a strategy gets slow or keeps failing, records go to the
+    local strategy (PCFG if pcfg_file is given, tail mutations otherwise). The 'Strategy' column of the output
+    names the strategy every record got.
+    """
+    # Load the LSH index once (and the precomputed neighbor table, if any); every record's strong-password generator shares it
+    recommender = PasswordRecommender(index_file, neighbor_file=neighbor_file)
+    classifier = StrengthClassifier(frequent_file, threshold=classifier_threshold)
+    router = StrategyRouter(token_budget=token_budget, cost_budget=cost_budget, max_record_latency=max_record_latency)
+    generator_options = {"recommender": recommender, "classifier": classifier, "single_shot": single_shot,
+                         "stream": stream, "seed": np.random.SeedSequence(seed),
+                         "pcfg_model": PCFGModel(pcfg_file) if pcfg_file else None, "pcfg_labels": pcfg_labels,
+                         "router": router}
+
+    if chunksize:
+        _process_csv_streaming(input_file, output_file, generator_options, workers, chunksize, batch_size or 1)
+        print(f"Recommender cache statistics: {recommender.cache_stats()}")
+        print(f"Strength classification: {classifier.report()}")
+        print(f"Strategy router: {router.report()}")
+        _print_llm_statistics()
+        return
 
-def process_csv(input_file, output_file):
     # Read CSV file
     df = pd.read_csv(input_file)
 
-    # Iterate over each row to generate honeywords
-    for index, row in df.iterrows():
-        password = row['Password']
-        username = row.get('Username', 'Nah')
-        birthday = row.get('Birthday', 'Nah')
-        name = row.get('Name', 'Nah')
-        email = row.get('Email', 'Nah')
+    records = [_make_record(row) for _, row in df.iterrows()]
+    unit_size = batch_size or 1
+    units = [records[start:start + unit_size] for start in range(0, len(records), unit_size)]
 
-        # Reinitialize HoneywordsMain generator for each record
-        generator = HoneywordsMain()
-        # Generate honeywords
-        record = (password, username, birthday, name, email)
-        result = generator.generate_honeywords(record)
+    executor = None
+    if workers > 1:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        # map() yields results in input order while up to `workers` units are being generated
+        results = executor.map(_generate_in_worker, [generator_options] * len(units), units)
+    else:
+        generator = HoneywordsMain(**generator_options)
+        results = (_generate_unit(generator, unit) for unit in units)
+    results = chain.from_iterable(results)
+
+    # Collect the results in input order
+    strategies = []
+    for index, record, result in zip(df.index, records, results):
+        password, username, birthday, name, email = record
 
         # Extract honeywords and add to the columns starting from the 6th column
         honeywords = result.get("honeywords", [])
         for i, honeyword in enumerate(honeywords, start=1):
             col_name = f'Honeyword_{i}'
             df.at[index, col_name] = honeyword
+        strategies.append(result.get("strategy", ""))
 
         # Print log for the processed record
         print(
             f"Processed record {index + 1}: Password: {password}, Username: {username}, Birthday: {birthday}, Name: {name}, Email: {email}")
 
+    if executor is not None:
+        executor.shutdown()
+    df['Strategy'] = strategies
+
     # Save the result to a new CSV file
     df.to_csv(output_file, index=False, encoding='utf-8-sig')
     print(f"Processing completed, results saved to {output_file}")
+    print(f"Recommender cache statistics: {recommender.cache_stats()}")
+    print(f"Strength classification: {classifier.report()}")
+    print(f"Strategy router: {router.report()}")
+    _print_llm_statistics()
 
 
 # Example usage 1
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import string
+import time
+
+from aiohttp import web
+
+# Offline stand-in for an OpenAI-compatible chat completions endpoint, for development, CI and load tests.
+# Replies follow the formats the prompts of this repository ask for (classification tags, honeyword JSON,
+# batched JSON arrays with ids), with honeywords mutated from the target password found in the prompt.
+# Point the pipeline at it with OPENAI_API_BASE=http://127.0.0.1:8000/v1 (any OPENAI_API_KEY works).
+
+# Where the prompts put the target password
+_PASSWORD_PATTERNS = (
+    re.compile(r"original password '(.+?)' and"),
+    re.compile(r"input \[\((.+?), "),
+    re.compile(r"the password '(.+?)'"),
+)
+_BATCH_ITEMS = re.compile(r"\[\{\"id\".*?\}\]")
+# Follow-up requests ask for the missing honeywords only
+_MISSING_COUNT = re.compile(r"Generate (\d+) more")
+
+LEET = {'a': '@', 'e': '3', 'i': '1', 'o': '0', 's': '$', 't': '7'}
+
+
+def mutate_password(password, rng):
+    """
+    One honeyword close to password: case flips, leet substitutions, changed digits or a short suffix.
+    """
+    chars = list(password) or list("password")
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(chars))
+        c = chars[position]
+        operation = rng.random()
+        if c.isdigit():
+            chars[position] = rng.choice(string.digits)
+        elif c.isalpha() and operation < 0.4:
+            chars[position] = c.swapcase()
+        elif c.lower() in LEET and operation < 0.7:
+            chars[position] = LEET[c.lower()]
+        else:
+            chars.append(rng.choice(string.digits + string.ascii_lowercase))
+    honeyword = ''.join(chars)[:18]
+    if honeyword[0].isdigit() or not honeyword[0].isalnum():
+        honeyword = rng.choice(string.ascii_letters) + honeyword[1:]
+    if not any(c.isdigit() for c in honeyword):
+        honeyword = (honeyword + str(rng.randint(0, 99)))[:18]
+    return honeyword.ljust(6, rng.choice(string.digits))
+
+
+def make_honeywords(password, rng, count=20):
+    honeywords = []
+    attempts = 0
+    while len(honeywords) < count and attempts < count * 20:
+        attempts += 1
+        honeyword = mutate_password(password, rng)
+        if honeyword != password and honeyword not in honeywords:
+            honeywords.append(honeyword)
+    return honeywords
+
+
+def classify(password):
+    """
+    Tag of the classification prompt criteria: 1 weak, 2 strong.
+    """
+    if len(password) < 8 or password.isalpha():
+        return 1, "Fewer than 8 characters or only letters"
+    if (any(c.islower() for c in password) and any(c.isupper() for c in password)
+            and any(c.isdigit() for c in password) and any(not c.isalnum() for c in password)):
+        return 2, "Uppercase, lowercase, digits and special characters"
+    return (1, "Simple combination") if len(password) < 12 else (2, "Long and mixed")
+
+
+def find_password(messages):
+    """
+    Target password of a conversation, from its latest user turn that names one.
+    """
+    for message in reversed(messages):
+        if message.get("role") != "user":
+            continue
+        for pattern in _PASSWORD_PATTERNS:
+            match = pattern.search(message.get("content", ""))
+            if match:
+                return match.group(1)
+    return "password1"
+
+
+def make_reply(messages, rng):
+    """
+    Reply text for a chat request, in the format its last user turn asks for.
+    """
+    prompt = messages[-1].get("content", "")
+    batch = _BATCH_ITEMS.search(prompt)
+    if batch and "JSON array" in prompt:
+        items = json.loads(batch.group(0))
+        answers = []
+        for item in items:
+            if "'Tag'" in prompt:
+                tag, reason = classify(item["password"])
+                answers.append({"id": item["id"], "Brief Reason": reason, "Tag": tag})
+            else:
+                answers.append({"id": item["id"], "honeywords": make_honeywords(item["password"], rng),
+                                "explanation": "Mutations of the target password."})
+        return "```json\n" + json.dumps(answers, ensure_ascii=False) + "\n```"
+    if "'Tag'" in prompt:
+        tag, reason = classify(find_password(messages))
+        return json.dumps({"Brief Reason": reason, "Tag": tag})
+    if "'honeywords'" in prompt:
+        missing = _MISSING_COUNT.search(prompt)
+        result = {"honeywords": make_honeywords(find_password(messages), rng, int(missing.group(1)) if missing else 20),
+                  "explanation": "Mutations of the target password: case changes, substitutions and suffixes."}
+        return "```json\n" + json.dumps(result, ensure_ascii=False, indent=2) + "\n```"
+    # Intermediate strategy turns only need an acknowledgement
+    return "Understood. I will follow these patterns when generating the honeywords."
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class MockLLMServer:
+    """
+    Chat completions handler with configurable latency and failure injection:
+    error_rate of requests fail (two thirds with 429 and a Retry-After header, the rest with 500) and
+    malformed_rate of replies are truncated JSON or prose. Replies longer than max_tokens are cut off like a
+    real model's, and "stream": true requests get server-sent events, one piece of the reply every
+    token_latency seconds.
+    """
+
+    def __init__(self, latency=0.05, error_rate=0.0, malformed_rate=0.0, seed=None, token_latency=0.002):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.counts = {"requests": 0, "rate_limited": 0, "server_errors": 0, "malformed": 0, "truncated": 0,
+                       "streams_closed_early": 0}
+
+    async def chat_completions(self, request):
+        self.counts["requests"] += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency * (0.5 + self.rng.random()))
+
+        draw = self.rng.random()
+        if draw < self.error_rate * 2 / 3:
+            self.counts["rate_limited"] += 1
+            return web.json_response({"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                                     status=429, headers={"Retry-After": "0.2"})
+        if draw < self.error_rate:
+            self.counts["server_errors"] += 1
+            return web.json_response({"error": {"message": "The server had an error", "type": "server_error"}},
+                                     status=500)
+
+        messages = body.get("messages", [])
+        content = make_reply(messages, self.rng)
+        if self.rng.random() < self.malformed_rate:
+            self.counts["malformed"] += 1
+            content = content[:len(content) // 2] if self.rng.random() < 0.5 else "Sure! Here are some honeywords."
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            self.counts["truncated"] += 1
+            content = content[:max_tokens * 4]
+            finish_reason = "length"
+
+        prompt_tokens = sum(estimate_tokens(message.get("content", "")) for message in messages)
+        # Prompts that share the fixed two-message prefix are reported as prefix-cache hits, like the real API
+        cached_tokens = sum(estimate_tokens(message.get("content", "")) for message in messages[:2]) if len(messages) > 2 else 0
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(content),
+                 "total_tokens": prompt_tokens + estimate_tokens(content),
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        reply = {"id": f"chatcmpl-mock-{self.counts['requests']}", "created": int(time.time()),
+                 "model": body.get("model", "mock")}
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return await self.stream_reply(request, reply, content, finish_reason, usage if include_usage else None)
+        # A complete reply takes as long to generate as a streamed one
+        await asyncio.sleep(self.token_latency * estimate_tokens(content))
+        return web.json_response({
+            **reply,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    async def stream_reply(self, request, reply, content, finish_reason, usage):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        def event(choices, **fields):
+            return b"data: " + json.dumps({**reply, "object": "chat.completion.chunk", "choices": choices,
+                                           **fields}).encode('utf-8') + b"\n\n"
+
+        try:
+            await response.write(event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))
+            # About one token per event
+            for start in range(0, len(content), 4):
+                await asyncio.sleep(self.token_latency)
+                await response.write(event([{"index": 0, "delta": {"content": content[start:start + 4]}, "finish_reason": None}]))
+            await response.write(event([{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+            if usage is not None:
+                await response.write(event([], usage=usage))
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            # The client stopped reading, e.g. after collecting enough honeywords
+            self.counts["streams_closed_early"] += 1
+        return response
+
+    async def stats(self, request):
+        return web.json_response(self.counts)
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+# Example usage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible mock server for honeyword generation.")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.05, help="Mean reply latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Fraction of replies that are not valid JSON")
+    parser.add_argument('--token-latency', type=float, default=0.002, help="Seconds between streamed pieces")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.latency, args.error_rate, args.malformed_rate, args.seed, args.token_latency)
+    print(f"Mock LLM server on http://127.0.0.1:{args.port}/v1")
+    web.run_app(server.make_app(), port=args.port, print=None)
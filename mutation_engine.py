@@ -0,0 +1,218 @@
+import string
+import threading
+import time
+
+import numpy as np
+
+LETTERS_DIGITS = string.ascii_letters + string.digits
+LETTERS_DIGITS_PUNCTUATION = string.ascii_letters + string.digits + string.punctuation
+
+# Candidates drawn per missing honeyword in one round, and in total before giving up on a password
+OVERSAMPLE = 2
+CANDIDATE_BUDGET = 50
+
+_CLASS_NAMES = ('upper', 'lower', 'digit', 'symbol')
+# How the generators' prompts name the character classes
+_CLASS_WORDS = {'upper': 'uppercase letters', 'lower': 'lowercase letters', 'digit': 'numbers', 'symbol': 'special symbols'}
+_NUMBER_WORDS = ('no', 'one', 'two', 'three', 'four')
+
+
+def _class_masks(codes):
+    """
+    (upper, lower, digit, symbol) boolean masks of a matrix of code points; 0 is padding.
+    """
+    upper = (codes >= 65) & (codes <= 90)
+    lower = (codes >= 97) & (codes <= 122)
+    digit = (codes >= 48) & (codes <= 57)
+    symbol = (codes != 0) & ~(upper | lower | digit)
+    return upper, lower, digit, symbol
+
+
+def encode(words, width=None):
+    """
+    (len(words), width) uint32 matrix of code points, zero padded, and the length of every word.
+    """
+    words = np.asarray(words, dtype=np.str_)
+    width = max(width or 0, words.dtype.itemsize // 4, 1)
+    codes = np.ascontiguousarray(words.astype(f'<U{width}')).view('<u4').reshape(len(words), width)
+    return codes, np.char.str_len(words).astype(np.int64)
+
+
+def decode(codes):
+    """
+    Inverse of encode(): a 1-d array of strings (trailing zeros are dropped).
+    """
+    codes = np.ascontiguousarray(codes, dtype='<u4')
+    return codes.view(f'<U{codes.shape[1]}').ravel()
+
+
+class Constraints:
+    """
+    Declarative honeyword rules, checked on a whole batch of candidates at once:
+    length between min_length and max_length, at least min_classes of the character classes in `classes`
+    ('upper', 'lower', 'digit', 'symbol'), no first character from forbidden_first, and no symbols
+    (anything but ASCII letters and digits) unless allow_symbols.
+    """
+
+    def __init__(self, min_length=6, max_length=18, min_classes=2, classes=_CLASS_NAMES, forbidden_first='',
+                 allow_symbols=True):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.min_classes = min_classes
+        self.classes = tuple(classes)
+        self.forbidden_first = np.array(sorted(set(map(ord, forbidden_first))), dtype=np.uint32)
+        self.allow_symbols = allow_symbols
+
+    def valid_mask(self, codes, lengths):
+        masks = dict(zip(_CLASS_NAMES, _class_masks(codes)))
+        valid = (lengths >= self.min_length) & (lengths <= self.max_length)
+        valid &= sum(masks[name].any(axis=1).astype(np.int64) for name in self.classes) >= self.min_classes
+        if len(self.forbidden_first):
+            valid &= ~np.isin(codes[:, 0], self.forbidden_first)
+        if not self.allow_symbols:
+            valid &= ~masks['symbol'].any(axis=1)
+        return valid
+
+    def __call__(self, honeyword):
+        codes, lengths = encode([honeyword])
+        return bool(self.valid_mask(codes, lengths)[0])
+
+    def describe(self):
+        """
+        The constraints as numbered conditions in the wording of the generators' prompts, for follow-up requests.
+        """
+        conditions = [f"The length is between {self.min_length}-{self.max_length} characters"]
+        if self.min_classes:
+            words = [_CLASS_WORDS[name] for name in self.classes]
+            conditions.append(f"Contains at least {_NUMBER_WORDS[self.min_classes]} types of characters: "
+                              + (", ".join(words[:-1]) + " and " + words[-1] if len(words) > 1 else words[0]))
+        if len(self.forbidden_first):
+            forbidden = ''.join(map(chr, self.forbidden_first.tolist()))
+            conditions.append("The password cannot start with " + ("a number" if forbidden.isdigit() else
+                                                                   "a special symbol" if not any(c.isalnum() for c in forbidden)
+                                                                   else f"any of {forbidden}"))
+        if not self.allow_symbols:
+            conditions.append("Cannot contain special symbols other than letters and numbers")
+        return " ".join(f"{i}. {condition};" for i, condition in enumerate(conditions, start=1))
+
+
+class MutationEngine:
+    """
+    Local honeyword generator that builds, checks and deduplicates whole batches of tail mutations with NumPy:
+    a candidate is a base word with its last `cut` characters removed and `add` random characters from alphabet
+    appended (add defaults to the number cut). Every request is bounded by CANDIDATE_BUDGET candidates per
+    missing honeyword, so it always terminates, possibly with fewer honeywords than asked for.
+    Each engine owns its random stream; give every worker its own engine (see spawn_seed).
+    """
+
+    def __init__(self, seed=None, oversample=OVERSAMPLE, budget=CANDIDATE_BUDGET):
+        self.rng = np.random.default_rng(seed)
+        self.oversample = oversample
+        self.budget = budget
+
+    def _candidates(self, codes, lengths, base_rows, cut, add, alphabet):
+        """
+        One candidate per entry of base_rows (rows of codes): codes matrix and lengths of the candidates.
+        """
+        count = len(base_rows)
+        cuts = self.rng.integers(cut[0], cut[1] + 1, count)
+        adds = cuts if add is None else self.rng.integers(add[0], add[1] + 1, count)
+        keep = np.maximum(lengths[base_rows] - cuts, 0)
+        new_lengths = keep + adds
+        width = max(int(new_lengths.max(initial=0)), 1)
+
+        source = codes[base_rows]
+        if source.shape[1] < width:
+            source = np.pad(source, ((0, 0), (0, width - source.shape[1])))
+        source = source[:, :width]
+        random_chars = alphabet[self.rng.integers(0, len(alphabet), (count, width))]
+        positions = np.arange(width)
+        candidates = np.where(positions < keep[:, None], source,
+                              np.where(positions < new_lengths[:, None], random_chars, 0)).astype('<u4')
+        return candidates, new_lengths
+
+    def mutate_many(self, base_groups, count=20, cut=(1, 3), add=None, alphabet=LETTERS_DIGITS, constraints=None,
+                    strict=True, excludes=None):
+        """
+        count unique honeywords for every group of base words (a password, or a list of words to vary), in one
+        vectorized pass per round. Words in the matching entry of excludes (and the bases themselves) are never
+        returned. Candidates failing constraints are dropped if strict; otherwise they are only used once the
+        budget is spent without enough valid ones.
+        """
+        groups = [[bases] if isinstance(bases, str) else list(bases) for bases in base_groups]
+        excludes = excludes or [()] * len(groups)
+        results = [[] for _ in groups]
+        spares = [[] for _ in groups]
+        seen = [set(exclude) | set(bases) for exclude, bases in zip(excludes, groups)]
+        if not groups:
+            return results
+
+        flat = [word for bases in groups for word in bases]
+        sizes = np.array([len(bases) for bases in groups], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        codes, lengths = encode(flat) if flat else (np.zeros((0, 1), dtype='<u4'), np.zeros(0, dtype=np.int64))
+        alphabet = np.frombuffer(alphabet.encode('utf-32-le'), dtype='<u4')
+
+        need = np.where(sizes > 0, count, 0).astype(np.int64)
+        spent = np.zeros(len(groups), dtype=np.int64)
+        while True:
+            active = np.flatnonzero((need > 0) & (spent < self.budget * count))
+            if not len(active):
+                break
+            draws = need[active] * self.oversample
+            spent[active] += draws
+            group_rows = np.repeat(active, draws)
+            base_rows = starts[group_rows] + (self.rng.random(len(group_rows)) * sizes[group_rows]).astype(np.int64)
+
+            candidates, candidate_lengths = self._candidates(codes, lengths, base_rows, cut, add, alphabet)
+            valid = (constraints.valid_mask(candidates, candidate_lengths) if constraints is not None
+                     else np.ones(len(group_rows), dtype=bool))
+            for group, honeyword, is_valid in zip(group_rows.tolist(), decode(candidates).tolist(), valid.tolist()):
+                if need[group] == 0 or not honeyword or honeyword in seen[group]:
+                    continue
+                seen[group].add(honeyword)
+                if is_valid:
+                    results[group].append(honeyword)
+                    need[group] -= 1
+                elif not strict:
+                    spares[group].append(honeyword)
+
+        for group, missing in enumerate(need.tolist()):
+            if missing and not strict:
+                results[group] += spares[group][:missing]
+        return results
+
+    def mutate(self, bases, count=20, cut=(1, 3), add=None, alphabet=LETTERS_DIGITS, constraints=None, strict=True,
+               exclude=()):
+        """
+        mutate_many() for a single password (or list of words to vary).
+        """
+        return self.mutate_many([bases], count, cut, add, alphabet, constraints, strict, [exclude])[0]
+
+
+_spawn_lock = threading.Lock()
+
+
+def spawn_seed(seed_sequence):
+    """
+    Independent child of a numpy SeedSequence, for the engine of one worker; None stays None (fresh entropy).
+    """
+    if seed_sequence is None:
+        return None
+    with _spawn_lock:
+        return seed_sequence.spawn(1)[0]
+
+
+# Example usage
+if __name__ == "__main__":
+    engine = MutationEngine(seed=0)
+    strong = Constraints(min_length=6, max_length=18, min_classes=2, classes=('upper', 'lower', 'digit'),
+                         forbidden_first="!@#$%^&*()-_=+[{]}|;:'\",<.>/?")
+    print(engine.mutate("DavidLermajr.4894", alphabet=LETTERS_DIGITS_PUNCTUATION, constraints=strong))
+    print(engine.mutate("ab", constraints=strong))  # Cannot be satisfied; stops after the candidate budget
+
+    passwords = [f"password{i}" for i in range(50000)]
+    start = time.perf_counter()
+    honeywords = engine.mutate_many(passwords, count=20)
+    elapsed = time.perf_counter() - start
+    print(f"{sum(map(len, honeywords)) / elapsed:.0f} honeywords/sec")
@@ -0,0 +1,167 @@
+import hashlib
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from lsh_index import LSHIndex, map_section, pack_bits, read_sectioned_header, write_sectioned_file
+from password_pre import MultiTableLSH
+from password_recommender import batch_similarity, top_k_indices
+
+# Neighbor table layout, written with lsh_index.write_sectioned_file:
+#   keys       (count,) uint64 sorted, 8-byte BLAKE2b digest of each distinct password
+#   rows       (count,) int64, index row of the password behind each key (to rule out digest collisions)
+#   neighbors  (count, k) int64, index rows of the k most similar passwords, best first, -1 padded
+NEIGHBOR_MAGIC = b'SHNBRTBL'
+
+# Rows of table 0 handed to a worker at once; tasks are cut at bucket boundaries
+TASK_ROWS = 20000
+
+
+def password_key(password):
+    return int.from_bytes(hashlib.blake2b(password.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def index_fingerprint(index):
+    """Values that change whenever the index is rebuilt with different contents"""
+    return {"count": index.count, "blob_size": index.header["sections"]["blob"][1],
+            "num_hashes": index.num_hashes, "seeds": index.seeds}
+
+
+# Per-process state, set up by the pool initializer
+_worker_index = None
+_worker_lsh = None
+_worker_settings = None
+
+def _init_worker(index_file, settings):
+    global _worker_index, _worker_lsh, _worker_settings
+    _worker_index = index_file if isinstance(index_file, LSHIndex) else LSHIndex(index_file)
+    _worker_lsh = MultiTableLSH(_worker_index.num_tables, _worker_index.num_hashes,
+                                input_dim=_worker_index.featurizer.dim, seed=_worker_index.seed)
+    _worker_settings = settings
+
+def _neighbors_for_range(position_range):
+    """
+    Top-k neighbors for the passwords at table-0 sorted positions [start, end).
+    Passwords are hashed again exactly like an online query; those with identical codes in every table
+    share one candidate set, so candidates are gathered once per group and all members are scored against it.
+    """
+    index, settings = _worker_index, _worker_settings
+    start, end = position_range
+    k = settings["k"]
+    rows = np.asarray(index.tables[0].rows[start:end], dtype=np.int64)
+    passwords = index.passwords(rows)
+    bits = _worker_lsh.hash_batch(index.featurizer.transform(passwords))
+    codes = pack_bits(bits.reshape(-1, index.num_hashes)).reshape(len(rows), index.num_tables, -1)
+
+    groups = {}
+    for i in range(len(rows)):
+        groups.setdefault(codes[i].tobytes(), []).append(i)
+
+    keys = np.zeros(len(rows), dtype=np.uint64)
+    neighbors = np.full((len(rows), k), -1, dtype=np.int64)
+    for members in groups.values():
+        candidate_rows = index.candidates(codes[members[0]], max_hamming_dist=settings["max_hamming_dist"],
+                                          max_candidates=settings["max_candidates"], mode=settings["mode"])
+        # First row of every distinct candidate password
+        first_row = {}
+        for pwd, row in zip(index.passwords(candidate_rows), candidate_rows):
+            first_row.setdefault(pwd, row)
+
+        for i in members:
+            pwd = passwords[i]
+            keys[i] = password_key(pwd)
+            candidates = [candidate for candidate in first_row if candidate != pwd]
+            if candidates:
+                best = top_k_indices(batch_similarity(pwd, candidates, settings["weights"]), k)
+                neighbors[i, :len(best)] = [first_row[candidates[j]] for j in best]
+
+    return keys, rows, neighbors
+
+def _task_ranges(index, task_rows=TASK_ROWS):
+    """Split table-0 sorted positions into ranges of about task_rows that never cut a bucket in two"""
+    codes = index.tables[0].sorted_codes
+    start = 0
+    while start < index.count:
+        end = min(start + task_rows, index.count)
+        if end < index.count:
+            end = int(np.searchsorted(codes, codes[end - 1], side='right'))
+        yield start, end
+        start = end
+
+
+# Precompute the top-k similar passwords for every password in the index
+def precompute_neighbors(index_file, output_file, k=5, max_hamming_dist=2, max_candidates=5000, mode='auto',
+                         weights=(0.6, 0.2, 0.2), workers=None):
+    """
+    Run the same candidate retrieval and weighted-similarity ranking as PasswordRecommender for every
+    password of index_file, split across a process pool, and write a compact neighbor table to output_file.
+    """
+    index = LSHIndex(index_file)
+    settings = {"k": k, "max_hamming_dist": max_hamming_dist, "max_candidates": max_candidates, "mode": mode,
+                "weights": list(weights)}
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        _init_worker(index, settings)
+        results = [_neighbors_for_range(task) for task in _task_ranges(index)]
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(index_file, settings)) as pool:
+            results = list(pool.imap(_neighbors_for_range, _task_ranges(index)))
+
+    keys = np.concatenate([r[0] for r in results]) if results else np.zeros(0, dtype=np.uint64)
+    rows = np.concatenate([r[1] for r in results]) if results else np.zeros(0, dtype=np.int64)
+    neighbors = np.concatenate([r[2] for r in results]) if results else np.zeros((0, k), dtype=np.int64)
+
+    # Sort by key and keep one entry per distinct password
+    order = np.argsort(keys, kind='stable')
+    keys, rows, neighbors = keys[order], rows[order], neighbors[order]
+    distinct = np.ones(len(keys), dtype=bool)
+    distinct[1:] = keys[1:] != keys[:-1]
+    keys, rows, neighbors = keys[distinct], rows[distinct], neighbors[distinct]
+
+    sections = []
+    for name, array in (("keys", keys.astype('<u8')), ("rows", rows.astype('<i8')), ("neighbors", neighbors.astype('<i8'))):
+        array.tofile(output_file + f'.{name}.tmp')
+        sections.append((name, output_file + f'.{name}.tmp', array.nbytes))
+    header = {"k": k, "count": len(keys), "index": index_fingerprint(index), **settings}
+    write_sectioned_file(output_file, NEIGHBOR_MAGIC, header, sections)
+    print(f"Neighbors of {len(keys)} passwords have been saved to {output_file}")
+
+
+class NeighborTable:
+    """
+    Memory-mapped neighbor table built by precompute_neighbors for one specific index.
+    """
+
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        self.header = read_sectioned_header(path, NEIGHBOR_MAGIC)
+        if self.header["index"] != index_fingerprint(index):
+            raise ValueError(f"{path} was built for a different index, rerun precompute_neighbors")
+        self.k = self.header["k"]
+        count = self.header["count"]
+        self.keys = map_section(path, self.header, "keys", np.dtype('<u8'), (count,))
+        self.rows = map_section(path, self.header, "rows", np.dtype('<i8'), (count,))
+        self.neighbors = map_section(path, self.header, "neighbors", np.dtype('<i8'), (count, self.k))
+
+    def lookup(self, password, num_recommendations=None):
+        """
+        Precomputed recommendations for a password of the corpus, or None if it is not in the table.
+        """
+        key = np.uint64(password_key(password))
+        position = int(np.searchsorted(self.keys, key))
+        if position == len(self.keys) or self.keys[position] != key:
+            return None
+        if self.index.password(int(self.rows[position])) != password:
+            return None
+        found = [int(row) for row in self.neighbors[position][:num_recommendations or self.k] if row >= 0]
+        return self.index.passwords(found)
+
+
+# Example usage
+if __name__ == "__main__":
+    precompute_neighbors('sample dataset_hash.idx', 'sample dataset_neighbors.nbr')
+    table = NeighborTable('sample dataset_neighbors.nbr', LSHIndex('sample dataset_hash.idx'))
+    print("Precomputed neighbors of Kingulek_1995:", table.lookup('Kingulek_1995'))
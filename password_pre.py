@@ -1,57 +1,152 @@
+import os
+from multiprocessing import Pool
+
 import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
+
+from featurizer import HashedNgramFeaturizer, make_featurizer
+from lsh_index import IndexWriter, table_seeds
 
 # LSH hash function definition
 class LSH:
     def __init__(self, num_hashes, input_dim, seed=42):
         self.num_hashes = num_hashes
         self.input_dim = input_dim
-        np.random.seed(seed)
-        self.hash_funcs = [self._generate_random_hash(self.input_dim) for _ in range(num_hashes)]
-
-    def _generate_random_hash(self, input_dim):
-        return np.random.randn(input_dim)
+        # Draw every projection vector once; row i is the same vector the i-th per-password draw used to produce
+        rng = np.random.RandomState(seed)
+        self.hash_matrix = rng.randn(num_hashes, input_dim)
+        self.hash_funcs = list(self.hash_matrix)
 
     def hash_password(self, password):
-        return [1 if np.dot(self.hash_funcs[i], password) > 0 else 0 for i in range(self.num_hashes)]
+        return [int(bit) for bit in self.hash_batch(np.asarray(password)[None, :])[0]]
+
+    def hash_batch(self, vectors):
+        """
+        Hash a (n, input_dim) matrix of feature vectors with a single matrix multiply.
+        Returns an (n, num_hashes) uint8 matrix of hash bits.
+        """
+        return (np.asarray(vectors, dtype=np.float64) @ self.hash_matrix.T > 0).astype(np.uint8)
+
+# Multi-table LSH: num_tables independent LSH tables, each with its own seed (see lsh_index.table_seeds)
+class MultiTableLSH:
+    def __init__(self, num_tables, num_hashes, input_dim, seed=42):
+        self.num_tables = num_tables
+        self.num_hashes = num_hashes
+        self.input_dim = input_dim
+        self.tables = [LSH(num_hashes, input_dim, seed=table_seed) for table_seed in table_seeds(seed, num_tables)]
+        self.hash_matrix = np.vstack([table.hash_matrix for table in self.tables])
+
+    def hash_batch(self, vectors):
+        """
+        Hash a (n, input_dim) matrix for every table with one matrix multiply.
+        Returns an (n, num_tables, num_hashes) uint8 matrix of hash bits.
+        """
+        bits = (np.asarray(vectors, dtype=np.float64) @ self.hash_matrix.T > 0).astype(np.uint8)
+        return bits.reshape(len(bits), self.num_tables, self.num_hashes)
+
+    def hash_password(self, vector):
+        return self.hash_batch(np.asarray(vector)[None, :])[0]
+
+def format_hashes(bits):
+    """Render hash bit rows as the list literals stored in the 'Hash' column"""
+    num_hashes = bits.shape[1]
+    if num_hashes <= 16:
+        # Few enough distinct codes to render each one once and look them up
+        codes = bits.astype(np.int64) @ (1 << np.arange(num_hashes, dtype=np.int64))
+        table = np.array(['[' + ', '.join(str((code >> i) & 1) for i in range(num_hashes)) + ']'
+                          for code in range(1 << num_hashes)], dtype=object)
+        return table[codes]
+    return np.array(['[' + ', '.join(map(str, row)) + ']' for row in bits.tolist()], dtype=object)
+
+# Per-process featurizer and LSH, built once by the pool initializer instead of once per password
+_worker_featurizer = None
+_worker_lsh = None
+
+def _init_worker(num_hashes, seed, featurizer_params, num_tables=1):
+    global _worker_featurizer, _worker_lsh
+    _worker_featurizer = make_featurizer(featurizer_params)
+    if num_tables == 1:
+        _worker_lsh = LSH(num_hashes=num_hashes, input_dim=_worker_featurizer.dim, seed=seed)
+    else:
+        _worker_lsh = MultiTableLSH(num_tables, num_hashes, input_dim=_worker_featurizer.dim, seed=seed)
+
+def _hash_chunk(passwords):
+    """Featurize and hash one chunk of raw password values, skipping empty ones"""
+    passwords = [str(pwd).strip() for pwd in passwords]
+    passwords = [pwd for pwd in passwords if len(pwd) > 0]
+    bits = _worker_lsh.hash_batch(_worker_featurizer.transform(passwords))
+    return passwords, bits
 
 # Preprocess and store hash values
-def preprocess_hashes(csv_file, output_file, num_hashes=10, seed=42):
-    # Read the CSV file, extracting only the 'Password' column
+def preprocess_hashes(csv_file, output_file, num_hashes=10, seed=42, chunksize=100000, workers=None, featurizer=None,
+                      num_tables=1):
+    """
+    Hash every password in csv_file and write them to output_file.
+    Output files ending in '.idx' are written as a binary LSH index (see lsh_index.py),
+    anything else as the legacy CSV of (Password, Hash) rows.
+    The input is read in chunks of `chunksize` rows which are hashed across `workers` processes
+    (defaults to the number of CPUs); output rows keep the input order.
+    featurizer defaults to HashedNgramFeaturizer() and must match the one used at query time.
+    num_tables > 1 builds a multi-table index (binary output only) whose candidates are unioned at query time.
+    """
+    if num_tables > 1 and not output_file.endswith('.idx'):
+        raise ValueError("Multi-table hashing needs the binary '.idx' output format")
+    featurizer_params = (featurizer or HashedNgramFeaturizer()).params()
+
+    # Read the CSV file in chunks, extracting only the 'Password' column
     try:
-        df = pd.read_csv(csv_file, usecols=['Password'])
+        reader = pd.read_csv(csv_file, usecols=['Password'], chunksize=chunksize)
     except Exception as e:
         raise Exception(f"Error reading file: {str(e)}")
 
-    # Initialize the list to store hash results
-    hashed_results = []
+    chunks = (chunk['Password'].tolist() for chunk in reader)
+    workers = workers or os.cpu_count() or 1
+
+    if output_file.endswith('.idx'):
+        sink = IndexWriter(output_file, num_hashes, seed, featurizer_params, num_tables)
+    else:
+        sink = _CSVHashWriter(output_file)
+
+    if workers == 1:
+        _init_worker(num_hashes, seed, featurizer_params, num_tables)
+        for passwords, bits in map(_hash_chunk, chunks):
+            sink.add(passwords, bits)
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(num_hashes, seed, featurizer_params, num_tables)) as pool:
+            for passwords, bits in pool.imap(_hash_chunk, chunks):
+                sink.add(passwords, bits)
+    sink.close()
 
-    # Process each password
-    for pwd in df['Password']:
-        process_password(pwd, hashed_results, num_hashes, seed)
+    print(f"Hash results for {sink.count} passwords have been saved to {output_file}")
 
-    # Store hash results
-    pd.DataFrame(hashed_results, columns=['Password', 'Hash']).to_csv(output_file, index=False)
-    print(f"Hash results have been saved to {output_file}")
+class _CSVHashWriter:
+    """Append hashed chunks to a CSV whose 'Hash' column holds list literals"""
 
-def process_password(pwd, hashed_results, num_hashes, seed):
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        pd.DataFrame(columns=['Password', 'Hash']).to_csv(path, index=False)
+
+    def add(self, passwords, bits):
+        if not passwords:
+            return
+        hashed = pd.DataFrame({'Password': passwords, 'Hash': format_hashes(bits)})
+        hashed.to_csv(self.path, mode='a', header=False, index=False)
+        self.count += len(passwords)
+
+    def close(self):
+        pass
+
+def process_password(pwd, hashed_results, num_hashes, seed, featurizer=None, lsh=None):
     """Process each password and compute its hash"""
     pwd = str(pwd).strip()  # Ensure it's a string and remove extra whitespace
     if len(pwd) == 0:
         return  # Skip empty passwords
 
     try:
-        # Initialize CountVectorizer
-        vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15, stop_words=None)
-        lsh = LSH(num_hashes=num_hashes, input_dim=15, seed=seed)
-
-        vector = vectorizer.fit_transform([pwd]).toarray()[0]
-        if len(vector) < lsh.input_dim:
-            vector = np.pad(vector, (0, lsh.input_dim - len(vector)), 'constant')
-        elif len(vector) > lsh.input_dim:
-            vector = vector[:lsh.input_dim]
-
+        featurizer = featurizer or HashedNgramFeaturizer()
+        lsh = lsh or LSH(num_hashes=num_hashes, input_dim=featurizer.dim, seed=seed)
+        vector = featurizer.transform_one(pwd)
         hashed_password = lsh.hash_password(vector)
         hashed_results.append((pwd, hashed_password))
 
@@ -60,5 +155,6 @@ def process_password(pwd, hashed_results, num_hashes, seed):
 
 # Example usage
 if __name__ == "__main__":
-    #preprocess_hashes('cleaned_merged_passwords（for official experiment）.csv', 'hashed_passwords.csv')
-    preprocess_hashes('sample dataset.csv', 'sample dataset_hash.csv')
+    #preprocess_hashes('cleaned_merged_passwords（for official experiment）.csv', 'hashed_passwords.idx')
+    preprocess_hashes('sample dataset.csv', 'sample dataset_hash.idx')
+    #preprocess_hashes('sample dataset.csv', 'sample dataset_hash.csv')  # Legacy CSV format
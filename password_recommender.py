@@ -1,34 +1,33 @@
 import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
 from Levenshtein import distance as levenshtein_distance
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.process import cdist
 import ast
+import threading
+from collections import OrderedDict
 
-# LSH hash function definition
-class LSH:
-    def __init__(self, num_hashes, input_dim, seed=42):
-        self.num_hashes = num_hashes
-        self.input_dim = input_dim
-        np.random.seed(seed)
-        self.hash_funcs = [self._generate_random_hash(self.input_dim) for _ in range(num_hashes)]
-
-    def _generate_random_hash(self, input_dim):
-        return np.random.randn(input_dim)
-
-    def hash_password(self, password):
-        return [1 if np.dot(self.hash_funcs[i], password) > 0 else 0 for i in range(self.num_hashes)]
+import password_pre
+from featurizer import HashedNgramFeaturizer
+from index_segments import SegmentedIndex
+from lsh_index import BucketIndex, LSHIndex, pack_bits
 
+# LSH hash function definition; shares the projection vectors with the index builder in password_pre
+class LSH(password_pre.LSH):
     def hamming_distance(self, hash1, hash2):
         return sum(c1 != c2 for c1, c2 in zip(hash1, hash2))
 
-    def get_candidates_from_hashes(self, target_hash, hash_data, max_hamming_dist=2):
-        candidates = []
-        for index, row in hash_data.iterrows():
-            stored_hash = row['Hash']
-            hamming_dist = self.hamming_distance(stored_hash, target_hash)
-            if hamming_dist <= max_hamming_dist:
-                candidates.append(row['Password'])
-        return candidates
+    def get_candidates_from_hashes(self, target_hash, hash_data, max_hamming_dist=2, max_candidates=None):
+        """
+        Passwords in hash_data whose hash is within max_hamming_dist of target_hash.
+        Stored hashes are grouped into buckets once, then only the buckets of the Hamming ball are read.
+        """
+        if hash_data.empty:
+            return []
+        codes = pack_bits(np.array(hash_data['Hash'].tolist()))[:, 0]
+        buckets = BucketIndex.from_codes(codes, self.num_hashes)
+        rows = buckets.lookup(pack_bits(target_hash)[0, 0], max_hamming_dist, max_candidates)
+        return hash_data['Password'].to_numpy()[rows].tolist()
 
 # Calculate Levenshtein similarity (taking the inverse of the distance and normalizing to similarity)
 def levenshtein_similarity(password1, password2):
@@ -55,8 +54,79 @@ def calculate_final_similarity(target_password, candidate_password, weights):
     s3 = ngram_similarity(target_password, candidate_password)
     return weights[0] * s1 + weights[1] * s2 + weights[2] * s3
 
+# Pad value for code point matrices, above the largest Unicode code point
+_PAD = np.uint64(0x110000)
+
+def _codepoint_matrix(passwords, lengths):
+    """(n, max_len) uint64 code points, right-padded with _PAD"""
+    matrix = np.full((len(passwords), max(1, int(lengths.max(initial=0)))), _PAD, dtype=np.uint64)
+    chars = np.frombuffer(''.join(passwords).encode('utf-32-le'), dtype=np.uint32)
+    matrix[np.arange(matrix.shape[1]) < lengths[:, None]] = chars
+    return matrix
+
+def _set_sizes_and_overlap(items, target_items):
+    """
+    Treat each row of items (padded with _PAD) as a set: return the size of every set and the number of
+    its distinct elements that also occur in target_items.
+    """
+    items = np.sort(items, axis=1)
+    first = np.ones(items.shape, dtype=bool)
+    first[:, 1:] = items[:, 1:] != items[:, :-1]
+    first &= items != _PAD
+    sizes = first.sum(axis=1)
+    overlap = (first & np.isin(items, target_items)).sum(axis=1)
+    return sizes, overlap
+
+def _jaccard(sizes, overlap, target_size):
+    union = sizes + target_size - overlap
+    return np.divide(overlap, union, out=np.zeros(len(union)), where=union > 0)
+
+# Vectorized weighted similarity of one target against many candidates
+def batch_similarity(target_password, candidates, weights=(0.6, 0.2, 0.2), workers=1):
+    """
+    Same score as calculate_final_similarity for every candidate at once: one-to-many Levenshtein
+    distances come from rapidfuzz in C, and the character and bigram sets are compared as sorted
+    code point rows against the target's sets instead of building Python sets per candidate.
+    """
+    if len(candidates) == 0:
+        return np.zeros(0)
+
+    # Levenshtein similarity
+    distances = cdist([target_password], candidates, scorer=Levenshtein.distance, dtype=np.int32, workers=workers)[0]
+    lengths = np.array(list(map(len, candidates)), dtype=np.int64)
+    max_lengths = np.maximum(lengths, len(target_password))
+    s1 = np.where(max_lengths > 0, 1 - distances / np.maximum(max_lengths, 1), 0.0)
+
+    # Jaccard similarity of the character sets
+    chars = _codepoint_matrix(candidates, lengths)
+    target_chars = _codepoint_matrix([target_password], np.array([len(target_password)]))[0, :len(target_password)]
+    sizes, overlap = _set_sizes_and_overlap(chars, target_chars)
+    s2 = _jaccard(sizes, overlap, len(set(target_password)))
+
+    # Jaccard similarity of the bigram sets, with each bigram packed into one integer
+    bigrams = np.where(chars[:, 1:] != _PAD, chars[:, :-1] * (_PAD + np.uint64(1)) + chars[:, 1:], _PAD)
+    target_bigrams = target_chars[:-1] * (_PAD + np.uint64(1)) + target_chars[1:]
+    sizes, overlap = _set_sizes_and_overlap(bigrams, target_bigrams)
+    s3 = _jaccard(sizes, overlap, len(set(target_bigrams.tolist())))
+
+    return weights[0] * s1 + weights[1] * s2 + weights[2] * s3
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first, ties kept in input order (like a stable sort + slice),
+    selected with a partition instead of sorting every score.
+    """
+    if len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.nonzero(scores > kth)[0]
+        tied = np.nonzero(scores == kth)[0][:k - len(above)]
+        selected = np.concatenate([above, tied])
+    else:
+        selected = np.arange(len(scores))
+    return selected[np.lexsort((selected, -scores[selected]))]
+
 # Load stored hash results and query similar passwords
-def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommendations=5, num_hashes=10, seed=42, max_hamming_dist=2):
+def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommendations=5, num_hashes=10, seed=42, max_hamming_dist=2, featurizer=None, max_candidates=5000):
     try:
         hash_data = pd.read_csv(csv_file)
         hash_data['Hash'] = hash_data['Hash'].apply(lambda x: ast.literal_eval(x))
@@ -64,39 +134,160 @@ def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommen
         print(f"Error reading CSV file: {e}")
         return []
 
-    # Hash the target password
-    vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15)
-    lsh = LSH(num_hashes=num_hashes, input_dim=15, seed=seed)
+    # Hash the target password with the same featurizer the index was built with
+    featurizer = featurizer or HashedNgramFeaturizer()
+    lsh = LSH(num_hashes=num_hashes, input_dim=featurizer.dim, seed=seed)
 
-    target_vector = vectorizer.fit_transform([target_password]).toarray()[0]
-    target_vector = np.pad(target_vector, (0, max(0, lsh.input_dim - len(target_vector))), 'constant')[:lsh.input_dim]
+    target_vector = featurizer.transform_one(target_password)
     target_hash = lsh.hash_password(target_vector)
 
     # Get candidate passwords
-    candidates = lsh.get_candidates_from_hashes(target_hash, hash_data, max_hamming_dist=max_hamming_dist)
+    candidates = lsh.get_candidates_from_hashes(target_hash, hash_data, max_hamming_dist=max_hamming_dist, max_candidates=max_candidates)
+    return rank_candidates(target_password, candidates, num_recommendations)
+
+# Query similar passwords from a binary index built by password_pre.preprocess_hashes
+def recommend_similar_passwords_from_index(target_password, index_file, num_recommendations=5, max_hamming_dist=2, max_candidates=5000, mode='auto', workers=1):
+    """
+    mode selects bucket lookup or an exact Hamming scan, see LSHIndex.candidates.
+    Multi-table indexes hash the target once per table and union the candidates.
+    """
+    try:
+        index = index_file if isinstance(index_file, LSHIndex) else LSHIndex(index_file)
+    except Exception as e:
+        print(f"Error opening index file: {e}")
+        return []
+
+    # The index header records the hashing parameters, so the query always matches the stored codes
+    lsh = password_pre.MultiTableLSH(index.num_tables, index.num_hashes, input_dim=index.featurizer.dim, seed=index.seed)
+    target_codes = pack_bits(lsh.hash_password(index.featurizer.transform_one(target_password)))
+
+    rows = index.candidates(target_codes, max_hamming_dist=max_hamming_dist, max_candidates=max_candidates,
+                            mode=mode, workers=workers)
+    candidates = index.passwords(rows)
+    return rank_candidates(target_password, candidates, num_recommendations)
+
+# Rank candidate passwords by weighted similarity to the target
+def rank_candidates(target_password, candidates, num_recommendations=5, weights=(0.6, 0.2, 0.2)):
     if not candidates:
         print("No candidate passwords found")
         return []
 
-    weights = [0.6, 0.2, 0.2]
+    # Drop duplicates (keeping first occurrences) and the target itself
+    unique_candidates = list(dict.fromkeys(candidates))
+    unique_candidates = [pwd for pwd in unique_candidates if pwd != target_password]
+    if not unique_candidates:
+        return []
+
+    scores = batch_similarity(target_password, unique_candidates, weights)
+    return [unique_candidates[i] for i in top_k_indices(scores, num_recommendations)]
+
+# Long-lived recommender: opens the index once and answers many queries
+class PasswordRecommender:
+    """
+    Load the LSH index once and keep a bounded LRU cache of recent query results.
+    One instance is meant to be shared: it is thread-safe, and worker processes that open the same
+    index file share its memory-mapped pages through the page cache.
+    """
 
-    candidates_with_similarity = []
-    seen_candidates = set()
-    for candidate_pwd in candidates:
-        if candidate_pwd == target_password or candidate_pwd in seen_candidates:
-            continue
-        final_similarity = calculate_final_similarity(target_password, candidate_pwd, weights)
-        candidates_with_similarity.append((candidate_pwd, final_similarity))
-        seen_candidates.add(candidate_pwd)
+    def __init__(self, index_file, num_recommendations=5, max_hamming_dist=2, max_candidates=5000, mode='auto',
+                 weights=(0.6, 0.2, 0.2), cache_size=10000, neighbor_file=None):
+        # Append segments and tombstones written by index_segments are merged into every query
+        self.index = index_file if isinstance(index_file, (LSHIndex, SegmentedIndex)) else SegmentedIndex(index_file)
+        # Optional table of neighbors precomputed offline by neighbor_pre.precompute_neighbors
+        self.neighbor_table = None
+        if neighbor_file:
+            from neighbor_pre import NeighborTable  # neighbor_pre imports this module
+            base = self.index.base if isinstance(self.index, SegmentedIndex) else self.index
+            self.neighbor_table = NeighborTable(neighbor_file, base)
+        self.lsh = password_pre.MultiTableLSH(self.index.num_tables, self.index.num_hashes,
+                                              input_dim=self.index.featurizer.dim, seed=self.index.seed)
+        self.num_recommendations = num_recommendations
+        self.max_hamming_dist = max_hamming_dist
+        self.max_candidates = max_candidates
+        self.mode = mode
+        self.weights = weights
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.precomputed = 0
+        self._lock = threading.Lock()
 
-    candidates_with_similarity.sort(key=lambda x: x[1], reverse=True)
-    return [c[0] for c in candidates_with_similarity[:num_recommendations]]
+    def recommend(self, target_password, num_recommendations=None):
+        """
+        Return the most similar stored passwords: from the precomputed neighbor table when the password is in it,
+        otherwise from the cache when the same query was seen recently, otherwise by an LSH query.
+        """
+        num_recommendations = num_recommendations or self.num_recommendations
+        if self._use_neighbor_table() and num_recommendations <= self.neighbor_table.k:
+            recommendations = self.neighbor_table.lookup(target_password, num_recommendations)
+            if recommendations is not None:
+                with self._lock:
+                    self.precomputed += 1
+                return recommendations
+
+        key = (target_password, num_recommendations)
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return list(self.cache[key])
+            self.misses += 1
+
+        target_codes = pack_bits(self.lsh.hash_password(self.index.featurizer.transform_one(target_password)))
+        candidates = self.index.candidate_passwords(target_codes, max_hamming_dist=self.max_hamming_dist,
+                                                    max_candidates=self.max_candidates, mode=self.mode)
+        recommendations = rank_candidates(target_password, candidates, num_recommendations, self.weights)
+
+        with self._lock:
+            self.cache[key] = tuple(recommendations)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return recommendations
+
+    def _use_neighbor_table(self):
+        # Precomputed neighbors only cover the base index; once segments or tombstones exist they may be stale
+        if self.neighbor_table is None:
+            return False
+        return not (isinstance(self.index, SegmentedIndex) and self.index.has_updates())
+
+    def refresh(self):
+        """
+        Pick up index segments and tombstones written since the recommender was created, and drop cached results.
+        A neighbor table that does not match the base index any more after a compaction is no longer used.
+        """
+        if isinstance(self.index, SegmentedIndex):
+            self.index.refresh()
+            if self.neighbor_table is not None and self.neighbor_table.index is not self.index.base:
+                # Compaction replaced the base index; neighbors precomputed for the old one may name deleted passwords
+                from neighbor_pre import NeighborTable
+                try:
+                    self.neighbor_table = NeighborTable(self.neighbor_table.path, self.index.base)
+                except ValueError as e:
+                    print(f"Not using the precomputed neighbors any more: {e}")
+                    self.neighbor_table = None
+        with self._lock:
+            self.cache.clear()
+
+    def cache_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.cache),
+                    "hit_rate": self.hits / lookups if lookups else 0.0, "precomputed": self.precomputed}
 
 # Example usage
 if __name__ == "__main__":
     target_pwd = 'password123'
-    #csv_file = 'hashed_passwords.csv'
-    csv_file = 'sample dataset_hash.csv'
+    #index_file = 'hashed_passwords.idx'
+    index_file = 'sample dataset_hash.idx'
     K = 5
-    recommendations = recommend_similar_passwords_from_csv(target_pwd, csv_file, num_recommendations=K)
+    recommendations = recommend_similar_passwords_from_index(target_pwd, index_file, num_recommendations=K)
+    #recommendations = recommend_similar_passwords_from_csv(target_pwd, 'sample dataset_hash.csv', num_recommendations=K)
     print("Recommended passwords: ", recommendations)
+
+    # Reusing one recommender pays the index load once and serves repeated queries from the cache
+    recommender = PasswordRecommender(index_file, num_recommendations=K)
+    for pwd in [target_pwd, 'Kingulek_1995', target_pwd]:
+        recommender.recommend(pwd)
+    print("Cache statistics: ", recommender.cache_stats())
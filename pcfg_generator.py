@@ -0,0 +1,169 @@
+import os
+import time
+from collections import Counter, defaultdict
+from itertools import groupby
+
+import numpy as np
+import pandas as pd
+
+from lsh_index import map_section, read_sectioned_header, write_sectioned_file
+from mutation_engine import LETTERS_DIGITS_PUNCTUATION, MutationEngine, decode
+
+# PCFG model layout, written with lsh_index.write_sectioned_file. A password is parsed into segments of
+# letters (L), digits (D) and other characters (S); every (class, length) pair is a group with its terminals:
+#   group_keys   (groups,) uint32 sorted, class index << 16 | segment length
+#   group_starts (groups + 1,) uint64, first terminal of every group
+#   cumulative   (terminals,) uint64, running count of the terminals within their group
+#   chars        (terminals' characters,) uint32 code points; terminal i of group g is its segment length
+#                characters long and starts at (i - group_starts[g]) * length + group_chars[g]
+#   group_chars  (groups,) uint64, first character of every group's terminals
+PCFG_MAGIC = b'SHPCFGTB'
+CLASSES = "LDS"
+
+# Characters drawn for a segment whose (class, length) never occurred in the training passwords
+_CLASS_ALPHABETS = ("abcdefghijklmnopqrstuvwxyz", "0123456789", "!@#$%&*._-")
+
+# Probability that a segment of the password is kept in a honeyword instead of being resampled
+KEEP_PROBABILITY = 0.4
+
+
+def character_class(c):
+    return 0 if c.isalpha() else 1 if c in "0123456789" else 2
+
+
+def segments(password):
+    """
+    [(class index, text)] of the maximal runs of letters, digits and other characters, e.g.
+    'judith145!' -> [(0, 'judith'), (1, '145'), (2, '!')].
+    """
+    return [(cls, ''.join(run)) for cls, run in groupby(password, key=character_class)]
+
+
+def train_pcfg(source_file, output_file, top_k=20000, min_count=1, chunksize=100000):
+    """
+    Train the terminal tables on the 'Password' column of source_file (the CSV password_pre.py reads):
+    every segment is counted in its (class, length) group, and the top_k most frequent terminals of each group
+    seen at least min_count times are kept.
+    """
+    counts = defaultdict(Counter)
+    passwords = 0
+    for chunk in pd.read_csv(source_file, usecols=['Password'], chunksize=chunksize, dtype=str):
+        for password in chunk['Password'].dropna():
+            passwords += 1
+            for cls, text in segments(password):
+                counts[(cls << 16) | len(text)][text] += 1
+
+    group_keys, group_starts, group_chars, cumulative, chars = [], [0], [], [], []
+    char_position = 0
+    for key in sorted(counts):
+        terminals = [(text, count) for text, count in counts[key].most_common(top_k) if count >= min_count]
+        if not terminals:
+            continue
+        group_keys.append(key)
+        group_chars.append(char_position)
+        cumulative.extend(np.cumsum([count for _, count in terminals]).tolist())
+        group_starts.append(len(cumulative))
+        text = ''.join(text for text, _ in terminals)
+        chars.append(np.frombuffer(text.encode('utf-32-le'), dtype='<u4'))
+        char_position += len(text)
+
+    tables = [("group_keys", np.array(group_keys, dtype='<u4')), ("group_starts", np.array(group_starts, dtype='<u8')),
+              ("group_chars", np.array(group_chars, dtype='<u8')), ("cumulative", np.array(cumulative, dtype='<u8')),
+              ("chars", np.concatenate(chars).astype('<u4') if chars else np.zeros(0, dtype='<u4'))]
+    sections = []
+    for name, table in tables:
+        table.tofile(f"{output_file}.{name}.tmp")
+        sections.append((name, f"{output_file}.{name}.tmp", table.nbytes))
+    write_sectioned_file(output_file, PCFG_MAGIC, {"groups": len(group_keys), "terminals": len(cumulative),
+                                                   "chars": char_position, "passwords": passwords,
+                                                   "source": os.path.basename(source_file)}, sections)
+    print(f"PCFG tables with {len(group_keys)} groups and {len(cumulative)} terminals have been saved to {output_file}")
+
+
+class PCFGModel:
+    """
+    Memory-mapped terminal tables written by train_pcfg; opening is cheap and pages are shared between processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_sectioned_header(path, PCFG_MAGIC)
+        groups = self.header["groups"]
+        self.group_keys = map_section(path, self.header, "group_keys", np.dtype('<u4'), (groups,))
+        self.group_starts = map_section(path, self.header, "group_starts", np.dtype('<u8'), (groups + 1,))
+        self.group_chars = map_section(path, self.header, "group_chars", np.dtype('<u8'), (groups,))
+        self.cumulative = map_section(path, self.header, "cumulative", np.dtype('<u8'), (self.header["terminals"],))
+        self.chars = map_section(path, self.header, "chars", np.dtype('<u4'), (self.header["chars"],))
+
+    def sample(self, cls, length, count, rng):
+        """
+        (count, length) code points of terminals drawn from the (cls, length) group by frequency,
+        or random characters of the class if the group was never seen.
+        """
+        key = (cls << 16) | length
+        group = int(np.searchsorted(self.group_keys, key))
+        if group == len(self.group_keys) or self.group_keys[group] != key:
+            alphabet = np.frombuffer(_CLASS_ALPHABETS[cls].encode('utf-32-le'), dtype='<u4')
+            return alphabet[rng.integers(0, len(alphabet), (count, length))]
+        start, end = int(self.group_starts[group]), int(self.group_starts[group + 1])
+        cumulative = self.cumulative[start:end]
+        terminals = np.searchsorted(cumulative, rng.integers(0, int(cumulative[-1]), count), side='right')
+        first_chars = int(self.group_chars[group]) + terminals * length
+        return self.chars[first_chars[:, None] + np.arange(length)]
+
+
+class PCFGGenerator:
+    """
+    Local honeyword strategy: keeps the structure of the password (the class and length of every segment) and
+    resamples its segments from the trained terminal tables, e.g. 'judith145' -> 'monkey145', 'judith777',
+    'sunset123'. Each segment is kept with KEEP_PROBABILITY. No LLM call is made.
+    """
+
+    def __init__(self, model, engine=None):
+        self.model = model if isinstance(model, PCFGModel) else PCFGModel(model)
+        # The engine's random stream is used for sampling, and its mutations fill up passwords with few variants
+        self.engine = engine or MutationEngine()
+        self.rounds = 4
+
+    def generate(self, password, count=20):
+        """
+        Accept a password and generate honeywords with the same structure.
+        """
+        rng = self.engine.rng
+        parts = segments(password)
+        honeywords = []
+        seen = {password}
+        for _ in range(self.rounds):
+            if len(honeywords) >= count or not parts:
+                break
+            draws = 2 * (count - len(honeywords))
+            columns = []
+            for cls, text in parts:
+                sampled = self.model.sample(cls, len(text), draws, rng)
+                original = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+                keep = rng.random(draws) < KEEP_PROBABILITY
+                columns.append(np.where(keep[:, None], original, sampled))
+            for honeyword in decode(np.hstack(columns)).tolist():
+                if honeyword not in seen and len(honeywords) < count:
+                    seen.add(honeyword)
+                    honeywords.append(honeyword)
+
+        explanation = "These honeywords keep the segment structure of the password, with segments resampled from a PCFG trained on the password corpus."
+        if len(honeywords) < count:
+            honeywords += self.engine.mutate(password, count=count - len(honeywords),
+                                             alphabet=LETTERS_DIGITS_PUNCTUATION, exclude=seen)
+            explanation += " Passwords with few variants are filled up with tail mutations."
+        return {"honeywords": honeywords, "explanation": explanation}
+
+
+# Example usage
+if __name__ == "__main__":
+    train_pcfg('sample dataset.csv', 'sample dataset_pcfg.tbl')
+    generator = PCFGGenerator('sample dataset_pcfg.tbl', MutationEngine(seed=0))
+    for password in ("abc123xyz", "judith145", "Cyl6188872!"):
+        print(password, generator.generate(password)["honeywords"][:8])
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        generator.generate("judith145")
+    print(f"{(time.perf_counter() - start) * 1000:.0f} us per record")
@@ -1,16 +1,24 @@
-import openai
-import json
-import random
-import string
+from honeyword_repair import HoneywordRepair, extract_honeywords, has_honeywords
+from honeyword_stream import HoneywordStream
+from llm_client import Conversation
+from mutation_engine import LETTERS_DIGITS, LETTERS_DIGITS_PUNCTUATION, Constraints, MutationEngine
 
-# Set API Key and custom API endpoint
-openai.api_key = 'XXX'
-openai.api_base = "XXX"  #your API key
+# PII honeywords are kept at 6-12 characters, close to the length of the target password
+HONEYWORD_CONSTRAINTS = Constraints(min_length=6, max_length=12, min_classes=0)
 
 class PIIGenerator:
-    def __init__(self, test_mode=False):
-        # Save conversation context
-        self.messages = [
+    def __init__(self, test_mode=False, single_shot=False, stream=False, engine=None):
+        # single_shot folds the strategy and the constraints into one request instead of two turns
+        self.single_shot = single_shot
+        # stream parses the honeywords while the reply arrives and stops the request once 20 usable ones are in
+        self.stream = stream
+        self.fallbacks = 0  # Records that ended up in the fallback method
+        # Local mutations for the fallback method and for topping up short replies
+        self.engine = engine or MutationEngine()
+        # Repairs nearly-valid honeywords and asks a follow-up for missing ones before any local top-up
+        self.repair = HoneywordRepair(HONEYWORD_CONSTRAINTS, self.engine.rng)
+        # Fixed conversation prefix every record starts from; each record only adds its own turns
+        prefix = [
             {"role": "system", "content": f"Honeywords are decoy passwords used to detect unauthorized access. "
                                           f"Please generate honeywords similar to the target password to safeguard the database security."},
             {"role": "user",
@@ -19,39 +27,38 @@ class PIIGenerator:
                         f"Here are the recommended strategies: First, cut the password semantically and randomly select a substring. Then, randomly select one PII item (email only captures the part before @). Merge the substring and the selected PII in various orders. Lastly, add a random string of length 1-2 after honeywords with a very low probability."
              }
         ]
+        self.conversation = Conversation(prefix, site='pii', max_tokens=300, temperature=0.6)
 
-    def send_message_to_gpt(self, message):
+    @property
+    def messages(self):
+        return self.conversation.messages
+
+    def reset_conversation(self):
         """
-        Send a message to GPT and get a reply, while maintaining the conversation context.
+        Drop the turns of the previous record so one generator instance can be reused for many records.
         """
-        # Append the user's message to the conversation
-        self.messages.append({"role": "user", "content": message})
-
-        try:
-            # Call GPT API
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=self.messages,
-                max_tokens=300,  # Limit the maximum number of generated tokens
-                temperature=0.6
-            )
-
-            # Get the GPT reply
-            reply = response['choices'][0]['message']['content'].strip()
+        self.conversation.reset()
 
-            # Save GPT's reply to the context
-            self.messages.append({"role": "assistant", "content": reply})
-
-            return reply
+    def send_message_to_gpt(self, message, on_text=None, validate=has_honeywords):
+        """
+        Send a message to GPT and get a reply, while maintaining the conversation context of the current record.
+        validate decides whether the reply may be cached; by default it has to contain honeywords.
+        """
+        # Calls go through the shared client, which retries rate limits and server errors
+        return self.conversation.send(message, on_text=on_text, validate=validate)
 
-        except Exception as e:
-            print(f"Error calling GPT API: {str(e)}")
-            return None
+    def record_usage(self):
+        """
+        Calls and tokens spent on the last record.
+        """
+        return self.conversation.record_usage()
 
     def generate(self, password, username, birthday, name, email):
         """
         Accept a password and generate honeywords with a similar structure.
         """
+        self.reset_conversation()
+
         # Step 1: Send instruction to split the password and diversify PII information, with length limit
         init_instruction = (
             f"Now, I will give you a real instance. Please generate honeywords based on the input [({password}, {username}, {birthday}, {name}, {email})]."
@@ -60,7 +67,9 @@ class PIIGenerator:
             f" Then, combine these elements in diverse ways, for example by placing the PII before, after, or within the password segments."
             f" Limit each honeyword to a length of 6-12 characters to keep it similar to the target password in length. Finally, add a random 1-2 character suffix with low probability if it does not exceed the length limit. Make each honeyword unique and as indistinguishable from a real password as possible.")
 
-        self.send_message_to_gpt(init_instruction)
+        if not self.single_shot:
+            # Any reply to the strategy turn is usable context
+            self.send_message_to_gpt(init_instruction, validate=bool)
 
         # Step 2: Provide final instruction with constraints and request the result in JSON format
         final_instruction = (f"Ensure that the newly generated honeywords meet the following conditions: "
@@ -69,43 +78,48 @@ class PIIGenerator:
                              f"3. The new password cannot start with a special symbol or number; "
                              f"Generate 20 unique honeywords with diverse structures and length from the given content, ensuring they are similar to the target password. Present the result **directly** in JSON format, with two fields: 'honeywords' (list of generated passwords) and 'explanation'.")
 
-        # Pass the password and generate honeywords
-        honeywords_response = self.send_message_to_gpt(final_instruction)
-
-        # Clean up returned data, remove Markdown code block markers
-        if honeywords_response:
-            honeywords_response = honeywords_response.replace("```json", "").replace("```", "").strip()
-
-        # Parse the returned JSON data
-        try:
-            honeywords_result = json.loads(honeywords_response)
-            unique_honeywords = list(set([hw for hw in honeywords_result["honeywords"] if 6 <= len(hw) <= 12]))
-
-            # Add local variations to generate more honeywords
-            while len(unique_honeywords) < 20:
-                modified_honeyword = self.modify_honeyword(random.choice(unique_honeywords))
-                if modified_honeyword not in unique_honeywords:
-                    unique_honeywords.append(modified_honeyword)
-
-            return {"honeywords": unique_honeywords, "explanation": honeywords_result["explanation"]}
-
-        except json.JSONDecodeError:
-            print("Error parsing GPT's returned JSON, using fallback method to generate honeywords...")
+        # Pass the password and generate honeywords (in single-shot mode both instructions go in this one request)
+        if self.single_shot:
+            final_instruction = init_instruction + " " + final_instruction
+
+        if self.stream:
+            # Honeywords are taken from the reply as they arrive, so a truncated reply still keeps the complete ones
+            stream = HoneywordStream(HONEYWORD_CONSTRAINTS, count=20, exclude=(password,))
+            honeywords_response = self.send_message_to_gpt(final_instruction, on_text=stream.feed)
+            honeywords_result = stream.result()
+            honeywords_result["honeywords"] += stream.invalid
+            if not honeywords_result["honeywords"]:
+                honeywords_result = extract_honeywords(honeywords_response)
+        else:
+            honeywords_response = self.send_message_to_gpt(final_instruction)
+            # Tolerant parsing: code blocks, trailing commas and truncated replies still give their honeywords
+            honeywords_result = extract_honeywords(honeywords_response)
+
+        # Repair honeywords of the wrong length where a few edits suffice, and ask a follow-up for the missing ones
+        # (unless the call failed)
+        send = self.send_message_to_gpt if honeywords_response is not None else None
+        unique_honeywords = self.repair.collect(honeywords_result, password, send)
+
+        if not unique_honeywords:
+            # A failed call (no reply), a reply without 'honeywords' or no honeyword of usable length
+            print("No usable honeywords in GPT's reply, using fallback method to generate honeywords...")
+            self.fallbacks += 1
 
             # Fallback method: Replace 1-3 random characters at the end of the password with random characters
-            fallback_honeywords = []
-            for i in range(20):
-                honeyword = password[:-random.randint(1, 3)] + ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=random.randint(1, 3)))
-                if honeyword not in fallback_honeywords:
-                    fallback_honeywords.append(honeyword)
+            fallback_honeywords = self.engine.mutate(password, count=20, cut=(1, 3), add=(1, 3),
+                                                     alphabet=LETTERS_DIGITS_PUNCTUATION)
 
             return {"honeywords": fallback_honeywords, "explanation": "Fallback method used due to error in GPT response."}
 
-    def modify_honeyword(self, honeyword):
-        """
-        Modify a honeyword by appending a random character or altering it slightly.
-        """
-        return honeyword + random.choice(string.ascii_letters + string.digits)
+        # Add local variations to generate more honeywords: a random letter or digit appended to a returned one
+        if len(unique_honeywords) < 20:
+            unique_honeywords += self.engine.mutate(unique_honeywords, count=20 - len(unique_honeywords),
+                                                    cut=(0, 0), add=(1, 1), alphabet=LETTERS_DIGITS,
+                                                    constraints=HONEYWORD_CONSTRAINTS, strict=False,
+                                                    exclude=(password,))
+
+        return {"honeywords": unique_honeywords,
+                "explanation": honeywords_result["explanation"] if honeywords_result else ""}
 
 # Test the PIIGenerator class
 if __name__ == "__main__":
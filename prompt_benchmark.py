@@ -0,0 +1,91 @@
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from pii_generator import PIIGenerator
+from weak_generator import WeakPasswordGenerator, is_valid_honeyword as is_valid_weak_honeyword
+
+SYMBOLS = "!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~ "
+
+
+def is_valid_pii_honeyword(honeyword):
+    """
+    Constraints of the PII prompt: 6-18 characters, at least two of uppercase/lowercase/digits/symbols,
+    not starting with a symbol or a digit.
+    """
+    classes = (any(c.isupper() for c in honeyword) + any(c.islower() for c in honeyword)
+               + any(c.isdigit() for c in honeyword) + any(c in SYMBOLS for c in honeyword))
+    return 6 <= len(honeyword) <= 18 and classes >= 2 and not (honeyword[0] in SYMBOLS or honeyword[0].isdigit())
+
+
+def _measure(generator, generate, records, is_valid):
+    """
+    Run generate(record) for every record, one at a time with the same generator instance, and summarize
+    latency, per-record requests and tokens (from the generator's own accounting), repairs, follow-ups,
+    fallbacks and validity.
+    """
+    latencies, valid, unique, usages = [], [], [], []
+    for record in records:
+        start = time.perf_counter()
+        result = generate(record) or {}
+        latencies.append(time.perf_counter() - start)
+        usages.append(generator.record_usage())
+        honeywords = [hw for hw in result.get("honeywords", []) if isinstance(hw, str)]
+        valid.append(np.mean([is_valid(hw) for hw in honeywords]) if honeywords else 0.0)
+        unique.append(len(set(honeywords)) / 20)
+
+    count = max(len(records), 1)
+    prompt_tokens = [usage["prompt_tokens"] for usage in usages]
+    half = len(prompt_tokens) // 2
+    return {
+        "records": len(records),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else 0.0,
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1) if latencies else 0.0,
+        "requests_per_record": round(sum(usage["calls"] for usage in usages) / count, 2),
+        "prompt_tokens_per_record": round(sum(prompt_tokens) / count, 1),
+        "completion_tokens_per_record": round(sum(usage["completion_tokens"] for usage in usages) / count, 1),
+        "cached_prompt_share": round(sum(usage["cached_prompt_tokens"] for usage in usages) / max(sum(prompt_tokens), 1), 4),
+        # Prompt tokens of the later records over the earlier ones; 1.0 means the cost per record stays flat
+        "prompt_tokens_growth": round(float(np.mean(prompt_tokens[half:]) / max(np.mean(prompt_tokens[:half]), 1)), 3) if half else 1.0,
+        "repaired_per_record": round(generator.repair.repaired / count, 2),
+        "follow_up_rate": round(generator.repair.follow_ups / count, 4),
+        "fallback_rate": round(generator.fallbacks / count, 4),
+        "valid_fraction": round(float(np.mean(valid)), 4) if valid else 0.0,
+        "unique_of_20": round(float(np.mean(unique)), 4) if unique else 0.0,
+    }
+
+
+def run_benchmark(csv_file, num_records=20, seed=0, university="XYZ University", stream=False):
+    """
+    A/B comparison of the two-turn and single-shot prompt modes of WeakPasswordGenerator and PIIGenerator
+    on the same fixed sample of records (non-PII records for the weak generator, PII records for the PII one).
+    Records are generated one at a time so that latencies are not affected by concurrency.
+    stream runs both modes with streamed replies and early stopping.
+    """
+    df = pd.read_csv(csv_file).fillna('Nah')
+    rng = random.Random(seed)
+    pii_mask = ~((df['Username'] == 'Nah') & (df['Birthday'] == 'Nah') & (df['Name'] == 'Nah') & (df['Email'] == 'Nah'))
+    plain = df.loc[~pii_mask, 'Password'].astype(str).tolist()
+    pii = df.loc[pii_mask, ['Password', 'Username', 'Birthday', 'Name', 'Email']].astype(str).values.tolist()
+    plain = rng.sample(plain, min(num_records, len(plain)))
+    pii = rng.sample(pii, min(num_records, len(pii)))
+
+    results = []
+    for single_shot in (False, True):
+        mode = ("single-shot" if single_shot else "two-turn") + (" streamed" if stream else "")
+        weak_generator = WeakPasswordGenerator(university, single_shot=single_shot, stream=stream)
+        results.append({"generator": "weak", "mode": mode,
+                        **_measure(weak_generator, weak_generator.generate, plain, is_valid_weak_honeyword)})
+        pii_generator = PIIGenerator(single_shot=single_shot, stream=stream)
+        results.append({"generator": "pii", "mode": mode,
+                        **_measure(pii_generator, lambda record: pii_generator.generate(*record), pii, is_valid_pii_honeyword)})
+
+    return pd.DataFrame(results)
+
+
+# Example usage
+if __name__ == "__main__":
+    report = run_benchmark('sample dataset.csv', num_records=20)
+    print(report.to_string(index=False))
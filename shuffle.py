@@ -1,74 +1,187 @@
-import pandas as pd
-import numpy as np
-
-# Read the CSV file
-file_path = "sample honeywords.csv"
-df = pd.read_csv(file_path)
-
-# Initialize a new column to store the location of the true password
-df['index'] = np.nan  # Add a new column named 'index' in the DataFrame
-
-# Define a function to shuffle the true password and honeywords for each row
-def shuffle_honeywords(row):
-    # Get the honeywords and true password columns
-    honeywords = row.iloc[5:26].values.tolist()  # Use .iloc for position-based indexing
-    true_password = row.iloc[5]  # Use .iloc to get the true password
-
-    # Add the true password to the honeywords list
-    honeywords.append(true_password)
-
-    # Shuffle the list
-    np.random.shuffle(honeywords)
-
-    # Find the new position of the true password
-    true_password_index = honeywords.index(true_password)
-
-    # Write the shuffled honeywords back to the original DataFrame
-    row.iloc[5:26] = honeywords[:-1]
-
-    # Return the new position (index)
-    row['index'] = true_password_index + 1  # Use the column name 'index' instead of position
-    return row
+import math
+import os
+import re
+import secrets
+import tempfile
+import time
 
-# Apply the shuffle function
-df = df.apply(shuffle_honeywords, axis=1)
-
-# Save the modified file
-output_file_path = "shuffled_honeywords.csv"
-df.to_csv(output_file_path, index=False)
-
-print("Shuffling completed and saved to:", output_file_path)
-
-"""
-# Extract all true passwords and honeywords
-all_honeywords = []
-user_indices = []
-
-# Cleaning function: Remove all spaces and invisible characters to ensure no issues
-def clean_string(s):
-    # Remove all invisible characters (including extra spaces, newlines, etc.) and convert to lowercase
-    return ''.join(s.split()).strip().lower()
-
-# Iterate over each row, extracting the true password and 20 honeywords
-for i, row in df.iterrows():
-    honeywords = row.iloc[5:26].values.tolist()  # Get the 20 honeywords for each row
-    true_password = row.iloc[5]  # Get the true password
-    honeywords.append(true_password)  # Add the true password to the honeywords list
-    all_honeywords.extend(honeywords)  # Add the current user's honeywords to the global list
-    user_indices.append((i, true_password))  # Record the user index and the original true password
-
-# Shuffle all honeywords globally
-np.random.shuffle(all_honeywords)
-
-# Reassign the globally shuffled honeywords back to the original DataFrame
-honeywords_per_user = 21  # Each user has 21 items (1 true password + 20 honeywords)
-
-# Iterate and fill the new data
-for i, row in df.iterrows():
-    # Extract the user's new honeywords
-    shuffled_honeywords = all_honeywords[i * honeywords_per_user:(i + 1) * honeywords_per_user]
+import numpy as np
+import pandas as pd
 
-    # Clean the true password and honeywords: remove spaces, newlines and convert to lowercase
-    # (You can complete the cleaning process here if needed)
-    # Example: shuffled_honeywords = [clean_string(h) for h in shuffled_honeywords]
-"""
\ No newline at end of file
+# Sweetwords of a record: the true password (Honeyword_1, see main.HoneywordsMain.make_result) and its honeywords
+_SWEETWORD_COLUMN = re.compile(r"Honeyword_(\d+)$")
+
+# Bytes of input per bucket of the global shuffle; a bucket is the most that is held in memory at once
+# (about six times its size as Python strings)
+MAX_BUCKET_BYTES = 16 * 2 ** 20
+
+
+def make_rng(seed=None):
+    """
+    Random generator for the shuffles. Without a seed it is seeded with 128 bits from the operating system's
+    cryptographic random source, so the positions of the true passwords cannot be reproduced from the run;
+    a seed is for tests only.
+    """
+    return np.random.default_rng(secrets.randbits(128) if seed is None else seed)
+
+
+def sweetword_columns(columns):
+    """
+    The Honeyword_* columns in numeric order (other columns, e.g. Strategy, are left alone).
+    """
+    numbered = [(int(match.group(1)), column) for column in columns
+                for match in [_SWEETWORD_COLUMN.match(str(column))] if match]
+    return [column for _, column in sorted(numbered)]
+
+
+def _read_chunks(input_file, chunksize):
+    # Every cell as text, exactly as written; empty cells are ''
+    return pd.read_csv(input_file, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+
+def shuffle_rows(sweetwords, rng):
+    """
+    Shuffle every row of a (records, width) matrix of sweetwords at once, with the true password in column 0
+    and '' in empty cells. Each row gets its own random permutation (argsort of random keys); empty cells
+    keep their place at the end. Returns the shuffled matrix and the 1-based position of every true password.
+    """
+    keys = rng.random(sweetwords.shape)
+    keys[sweetwords == ''] = 2.0
+    permutation = np.argsort(keys, axis=1)
+    # The true password is wherever the permutation put the original column 0
+    return np.take_along_axis(sweetwords, permutation, axis=1), np.argmax(permutation == 0, axis=1) + 1
+
+
+def shuffle_traditional(input_file, output_file, chunksize=100000, seed=None):
+    """
+    Traditional mode: the sweetwords of every record are shuffled among themselves, and the new position of
+    the true password is saved in an 'index' column. The input is processed chunksize records at a time.
+    """
+    rng = make_rng(seed)
+    records = 0
+    with open(output_file, 'w', encoding='utf-8', newline='') as out:
+        for chunk in _read_chunks(input_file, chunksize):
+            columns = sweetword_columns(chunk.columns)
+            shuffled, index = shuffle_rows(chunk[columns].to_numpy(dtype=object), rng)
+            chunk[columns] = shuffled
+            chunk['index'] = index
+            chunk.to_csv(out, header=records == 0, index=False)
+            records += len(chunk)
+    print(f"Shuffling of {records} records completed and saved to: {output_file}")
+
+
+class _BucketReader:
+    """
+    Reads the buckets of the global shuffle in order, each shuffled in memory, and hands out their
+    (origins, sweetwords) in pieces of any size.
+    """
+
+    def __init__(self, bucket_files, rng):
+        self.bucket_files = list(bucket_files)
+        self.rng = rng
+        self.origins = np.zeros(0, dtype=np.int64)
+        self.words = np.zeros(0, dtype=object)
+
+    def _load(self):
+        path = self.bucket_files.pop(0)
+        if os.path.getsize(path):
+            bucket = pd.read_csv(path, names=['origin', 'word'], dtype={'origin': np.int64, 'word': str},
+                                 keep_default_na=False)
+            order = self.rng.permutation(len(bucket))
+            self.origins = np.concatenate((self.origins, bucket['origin'].to_numpy()[order]))
+            self.words = np.concatenate((self.words, bucket['word'].to_numpy(dtype=object)[order]))
+        os.remove(path)
+
+    def take(self, count):
+        while len(self.origins) < count and self.bucket_files:
+            self._load()
+        origins, self.origins = self.origins[:count], self.origins[count:]
+        words, self.words = self.words[:count], self.words[count:]
+        return origins, words
+
+
+def shuffle_global(input_file, output_file, index_file, chunksize=100000, max_bucket_bytes=MAX_BUCKET_BYTES,
+                   seed=None, temp_dir=None):
+    """
+    Global mode: the sweetwords of all records are shuffled together and dealt back out, every record keeping
+    its number of filled sweetword cells, so a record's candidates come from the whole file. index_file gets
+    one line per input record ('User', its 1-based record number) with the 'Row' and 'Index' (1-based) where
+    its true password ended up in output_file.
+    An external shuffle keeps memory bounded for any number of records: each sweetword is first written to a
+    random one of several bucket files (one bucket per max_bucket_bytes of input), then the buckets are
+    shuffled in memory one at a time and read out in order, which gives a uniform random permutation.
+    Temporary files go to temp_dir (default: next to output_file).
+    """
+    rng = make_rng(seed)
+    buckets = max(1, math.ceil(os.path.getsize(input_file) / max_bucket_bytes))
+    with tempfile.TemporaryDirectory(dir=temp_dir or os.path.dirname(os.path.abspath(output_file))) as work_dir:
+        bucket_files = [os.path.join(work_dir, f'bucket_{i}.csv') for i in range(buckets)]
+
+        # Pass 1: scatter (origin, sweetword) pairs to random buckets; origin = record * width + column
+        records = width = 0
+        handles = [open(path, 'w', encoding='utf-8', newline='') for path in bucket_files]
+        try:
+            for chunk in _read_chunks(input_file, chunksize):
+                sweetwords = chunk[sweetword_columns(chunk.columns)].to_numpy(dtype=object)
+                width = sweetwords.shape[1]
+                filled = sweetwords != ''
+                origins = ((records + np.arange(len(chunk)))[:, None] * width + np.arange(width))[filled]
+                targets = rng.integers(0, buckets, len(origins))
+                order = np.argsort(targets, kind='stable')
+                bounds = np.searchsorted(targets[order], np.arange(buckets + 1))
+                words = sweetwords[filled]
+                for bucket in range(buckets):
+                    part = order[bounds[bucket]:bounds[bucket + 1]]
+                    if len(part):
+                        pd.DataFrame({'origin': origins[part], 'word': words[part]}).to_csv(
+                            handles[bucket], header=False, index=False)
+                records += len(chunk)
+        finally:
+            for handle in handles:
+                handle.close()
+
+        # Where every record's true password lands, kept on disk: (output row, column) per record
+        positions = np.lib.format.open_memmap(os.path.join(work_dir, 'positions.npy'), mode='w+',
+                                              dtype=np.int64, shape=(records, 2))
+
+        # Pass 2: deal the shuffled sweetwords out to the records, in input order
+        reader = _BucketReader(bucket_files, rng)
+        row = 0
+        with open(output_file, 'w', encoding='utf-8', newline='') as out:
+            for chunk in _read_chunks(input_file, chunksize):
+                columns = sweetword_columns(chunk.columns)
+                counts = (chunk[columns].to_numpy(dtype=object) != '').sum(axis=1)
+                origins, words = reader.take(int(counts.sum()))
+                rows = np.repeat(np.arange(len(chunk)), counts)
+                cells = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+                dealt = np.full((len(chunk), len(columns)), '', dtype=object)
+                dealt[rows, cells] = words
+
+                true_passwords = origins % width == 0
+                positions[origins[true_passwords] // width] = np.column_stack(
+                    (row + rows[true_passwords] + 1, cells[true_passwords] + 1))
+                chunk[columns] = dealt
+                chunk.to_csv(out, header=row == 0, index=False)
+                row += len(chunk)
+
+        with open(index_file, 'w', encoding='utf-8', newline='') as out:
+            for start in range(0, records, chunksize):
+                part = np.asarray(positions[start:start + chunksize])
+                pd.DataFrame({'User': np.arange(start, start + len(part)) + 1, 'Row': part[:, 0],
+                              'Index': part[:, 1]}).to_csv(out, header=start == 0, index=False)
+        del positions
+    print(f"Global shuffling of {records} records completed and saved to: {output_file} (index: {index_file})")
+
+
+# Example usage
+if __name__ == "__main__":
+    mode = "traditional"  # or "global"
+    file_path = "sample honeywords.csv"
+    output_file_path = "shuffled_honeywords.csv"
+
+    start = time.perf_counter()
+    if mode == "traditional":
+        shuffle_traditional(file_path, output_file_path)
+    else:
+        shuffle_global(file_path, output_file_path, "shuffled_honeywords_index.csv")
+    print(f"{time.perf_counter() - start:.2f} s")
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Dollars per million tokens (gpt-4o list prices); pass your provider's prices to StrategyRouter
+DEFAULT_PRICES = {"prompt": 2.50, "cached_prompt": 1.25, "completion": 10.00}
+
+# Tokens assumed for one record of a strategy that has not been measured yet
+DEFAULT_RECORD_TOKENS = 1500
+
+
+class StrategyStats:
+    """
+    Totals of one strategy since the start of the run, plus a rolling window of recent records for latency
+    percentiles and the error rate. `recent` counts the records measured since the last successful probe.
+    """
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.records = 0
+        self.errors = 0
+        self.degraded = 0  # Records the router sent elsewhere
+        self.refused = 0  # Records over a health limit, probes included; sets the probe cadence
+        self.recent = 0
+        self.calls = 0
+        self.tokens = 0
+        self.cost = 0.0
+
+    def add(self, latency, error, calls, tokens, cost):
+        self.latencies.append(latency)
+        self.outcomes.append(error)
+        self.recent += 1
+        self.records += 1
+        self.errors += error
+        self.calls += calls
+        self.tokens += tokens
+        self.cost += cost
+
+    def percentile(self, q, last=None):
+        latencies = list(self.latencies)[-last:] if last else self.latencies
+        return float(np.percentile(latencies, q)) if latencies else 0.0
+
+    def error_rate(self, last=None):
+        outcomes = list(self.outcomes)[-last:] if last else self.outcomes
+        return sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    def summary(self):
+        return {"records": self.records, "p50_ms": round(self.percentile(50) * 1000, 1),
+                "p99_ms": round(self.percentile(99) * 1000, 1), "error_rate": round(self.error_rate(), 4),
+                "calls": self.calls, "tokens": self.tokens, "cost": round(self.cost, 4), "degraded": self.degraded}
+
+
+class StrategyRouter:
+    """
+    Decides per record whether an LLM-backed strategy may run, from what the run has measured so far.
+    acquire() refuses a strategy when
+      - the token_budget or cost_budget (dollars, at `prices` per million tokens) left, minus what records in
+        flight are expected to spend, cannot cover the strategy's average record, or
+      - the strategy is unhealthy over its last min_samples records: p99 latency above max_record_latency
+        seconds or an error rate above max_error_rate. Every probe_every-th refused record is still let through;
+        a probe within both limits means the provider recovered, and the strategy is admitted again until
+        min_samples new records were measured.
+    The caller then uses a local strategy instead. One router is shared by all workers of a run.
+    """
+
+    def __init__(self, token_budget=None, cost_budget=None, max_record_latency=None, max_error_rate=0.5,
+                 prices=None, min_samples=10, probe_every=20, window=200):
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self.max_record_latency = max_record_latency
+        self.max_error_rate = max_error_rate
+        self.prices = dict(DEFAULT_PRICES, **(prices or {}))
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self.window = window
+        self.stats = {}
+        self.spent_tokens = 0
+        self.spent_cost = 0.0
+        self._reserved_tokens = 0
+        self._reserved_cost = 0.0
+        self._lock = threading.Lock()
+
+    def cost(self, usage):
+        """
+        Dollars of the calls in usage ({'prompt_tokens', 'completion_tokens', 'cached_prompt_tokens'}).
+        """
+        cached = usage.get("cached_prompt_tokens", 0)
+        return (self.prices["prompt"] * (usage.get("prompt_tokens", 0) - cached) + self.prices["cached_prompt"] * cached
+                + self.prices["completion"] * usage.get("completion_tokens", 0)) / 1e6
+
+    def _stats(self, strategy):
+        if strategy not in self.stats:
+            self.stats[strategy] = StrategyStats(self.window)
+        return self.stats[strategy]
+
+    def _expected(self, stats, records):
+        """
+        (tokens, cost) that `records` more records of stats' strategy will probably spend.
+        """
+        if stats.records:
+            return records * stats.tokens / stats.records, records * stats.cost / stats.records
+        return records * DEFAULT_RECORD_TOKENS, records * self.cost({"prompt_tokens": DEFAULT_RECORD_TOKENS})
+
+    def _refusal(self, stats, records):
+        """
+        Why stats' strategy may not take `records` more records now, or None.
+        """
+        expected_tokens, expected_cost = self._expected(stats, records)
+        if self.token_budget is not None and self.spent_tokens + self._reserved_tokens + expected_tokens > self.token_budget:
+            return "token budget"
+        if self.cost_budget is not None and self.spent_cost + self._reserved_cost + expected_cost > self.cost_budget:
+            return "cost budget"
+        # Only the last records count, so a recovered provider is not held back by its slow past
+        if stats.recent >= self.min_samples:
+            p99 = stats.percentile(99, self.min_samples)
+            if self.max_record_latency is not None and p99 > self.max_record_latency:
+                return "latency"
+            if stats.error_rate(self.min_samples) > self.max_error_rate:
+                return "error rate"
+        return None
+
+    def _healthy(self, latency, records, errors):
+        return ((self.max_record_latency is None or latency <= self.max_record_latency)
+                and errors / records <= self.max_error_rate)
+
+    def acquire(self, strategy, records=1, local=False):
+        """
+        Ticket for running strategy on `records` records, to be handed back to release(), or None if the records
+        have to go to a local strategy. Local strategies are never refused; they are only measured.
+        """
+        with self._lock:
+            stats = self._stats(strategy)
+            expected_tokens = expected_cost = 0
+            probe = False
+            if not local:
+                reason = self._refusal(stats, records)
+                if reason is not None:
+                    # Budgets are hard limits; a slow or failing provider still gets the occasional probe
+                    budget = reason.endswith("budget")
+                    if not budget:
+                        stats.refused += records
+                    if budget or stats.refused % self.probe_every >= records:
+                        stats.degraded += records
+                        return None
+                    probe = True
+                expected_tokens, expected_cost = self._expected(stats, records)
+                self._reserved_tokens += expected_tokens
+                self._reserved_cost += expected_cost
+        return {"strategy": strategy, "records": records, "start": time.perf_counter(),
+                "tokens": expected_tokens, "cost": expected_cost, "probe": probe}
+
+    def release(self, ticket, usage=None, errors=0):
+        """
+        Record the outcome of an acquired ticket: its latency, the LLM usage of its records (see
+        llm_client.track_usage) and how many of them failed (e.g. ended in a generator's fallback).
+        """
+        latency = time.perf_counter() - ticket["start"]
+        usage = usage or {}
+        tokens = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        cost = self.cost(usage)
+        records = ticket["records"]
+        with self._lock:
+            self._reserved_tokens -= ticket["tokens"]
+            self._reserved_cost -= ticket["cost"]
+            self.spent_tokens += tokens
+            self.spent_cost += cost
+            stats = self._stats(ticket["strategy"])
+            # Every record of a batch waited for the whole batch; calls and tokens are shared out between them
+            for i in range(records):
+                stats.add(latency, i < errors, usage.get("calls", 0) if i == 0 else 0, tokens // records, cost / records)
+            if ticket.get("probe") and self._healthy(latency, records, errors):
+                # The provider recovered; judge it afresh on the records from now on
+                stats.recent = 0
+
+    def report(self):
+        with self._lock:
+            return {"spent_tokens": self.spent_tokens, "spent_cost": round(self.spent_cost, 4),
+                    "token_budget": self.token_budget, "cost_budget": self.cost_budget,
+                    "strategies": {strategy: stats.summary() for strategy, stats in self.stats.items()}}
+
+
+# Example usage
+if __name__ == "__main__":
+    router = StrategyRouter(token_budget=5000, max_record_latency=0.05)
+    for i in range(40):
+        ticket = router.acquire("Weak password-based")
+        if ticket is None:
+            ticket = router.acquire("PCFG-based", local=True)
+            router.release(ticket)
+            continue
+        time.sleep(0.001 if i < 15 else 0.06)  # The provider slows down after 15 records
+        router.release(ticket, {"calls": 2, "prompt_tokens": 200, "completion_tokens": 100})
+    print(router.report())
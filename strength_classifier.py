@@ -0,0 +1,214 @@
+import hashlib
+import math
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from lsh_index import map_section, read_sectioned_header, write_sectioned_file
+
+# Frequent password set layout, written with lsh_index.write_sectioned_file:
+#   keys  (count,) uint64 sorted, 8-byte BLAKE2b digest of each lowercased frequent password
+FREQUENT_MAGIC = b'SHFREQPW'
+
+SYMBOLS = "!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~ "
+KEYBOARD_ROWS = ("`1234567890-=", "qwertyuiop[]\\", "asdfghjkl;'", "zxcvbnm,./")
+
+# Position of every key on the keyboard, for detecting walks such as 'qwerty' or 'asdf'
+_KEY_POSITIONS = {key: (row, column) for row, keys in enumerate(KEYBOARD_ROWS) for column, key in enumerate(keys)}
+
+# Letters with digits appended or prepended, e.g. 'judith145' or '18pinkstars'
+_WORD_AND_DIGITS = re.compile(r"[A-Za-z]+[0-9]+|[0-9]+[A-Za-z]+")
+WORD_AND_DIGITS_MAX_LENGTH = 12
+
+# Estimated entropy above which a password without a dominant pattern is strong, and below which it is weak
+STRONG_MIN_BITS = 60.0
+WEAK_MAX_BITS = 30.0
+
+
+def frequent_key(password):
+    return int.from_bytes(hashlib.blake2b(password.lower().encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def character_classes(password):
+    """
+    (has lowercase, has uppercase, has digit, has symbol)
+    """
+    return (any(c.islower() for c in password), any(c.isupper() for c in password),
+            any(c.isdigit() for c in password), any(not c.isalnum() for c in password))
+
+
+def pool_size(password):
+    """
+    Size of the alphabet an attacker has to try, from the character classes the password uses.
+    """
+    has_lower, has_upper, has_digit, has_symbol = character_classes(password)
+    return 26 * has_lower + 26 * has_upper + 10 * has_digit + len(SYMBOLS) * has_symbol
+
+
+def _is_step(a, b):
+    """
+    True if b follows a in a run: repeated character, alphabetic or numeric sequence, or adjacent keyboard key.
+    """
+    a, b = a.lower(), b.lower()
+    if a == b:
+        return True
+    if a.isalnum() and b.isalnum() and a.isdigit() == b.isdigit() and abs(ord(a) - ord(b)) == 1:
+        return True
+    if a in _KEY_POSITIONS and b in _KEY_POSITIONS:
+        (row_a, column_a), (row_b, column_b) = _KEY_POSITIONS[a], _KEY_POSITIONS[b]
+        return row_a == row_b and abs(column_a - column_b) == 1
+    return False
+
+
+def pattern_coverage(password, min_run=3):
+    """
+    Fraction of characters that are part of a run of at least min_run repeats, sequences or keyboard walks.
+    """
+    if not password:
+        return 0.0
+    covered = 0
+    run = 1
+    for i in range(1, len(password) + 1):
+        if i < len(password) and _is_step(password[i - 1], password[i]):
+            run += 1
+            continue
+        if run >= min_run:
+            covered += run
+        run = 1
+    return covered / len(password)
+
+
+def estimated_bits(password):
+    """
+    Character-class entropy in bits, with characters inside patterns counted as one bit each.
+    """
+    if not password:
+        return 0.0
+    coverage = pattern_coverage(password)
+    return len(password) * ((1 - coverage) * math.log2(max(pool_size(password), 2)) + coverage)
+
+
+def build_frequent_set(source_file, output_file, top_n=1000000, min_count=2):
+    """
+    Build the frequent password set from a wordlist or a password CSV.
+    A .txt wordlist (such as rockyou, one password per line) is taken as ranked by frequency and its first
+    top_n lines are kept; for a CSV the 'Password' column is counted and the top_n passwords seen at least
+    min_count times are kept.
+    """
+    if source_file.endswith('.txt'):
+        passwords = []
+        with open(source_file, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                if len(passwords) >= top_n:
+                    break
+                pwd = line.rstrip('\r\n')
+                if pwd:
+                    passwords.append(pwd)
+    else:
+        counts = None
+        for chunk in pd.read_csv(source_file, usecols=['Password'], chunksize=100000):
+            chunk_counts = chunk['Password'].astype(str).str.strip().str.lower().value_counts()
+            counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+        if counts is None:
+            counts = pd.Series(dtype=np.int64)
+        passwords = counts[counts >= min_count].sort_values(ascending=False).head(top_n).index.tolist()
+
+    keys = np.unique(np.fromiter((frequent_key(pwd) for pwd in passwords), dtype=np.uint64, count=len(passwords)))
+    keys.astype('<u8').tofile(output_file + '.keys.tmp')
+    write_sectioned_file(output_file, FREQUENT_MAGIC, {"count": len(keys), "source": os.path.basename(source_file)},
+                         [("keys", output_file + '.keys.tmp', keys.nbytes)])
+    print(f"{len(keys)} frequent passwords have been saved to {output_file}")
+
+
+class FrequentPasswordSet:
+    """
+    Memory-mapped sorted array of frequent password digests; membership is one binary search.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_sectioned_header(path, FREQUENT_MAGIC)
+        self.keys = map_section(path, self.header, "keys", np.dtype('<u8'), (self.header["count"],))
+
+    def __contains__(self, password):
+        key = np.uint64(frequent_key(password))
+        position = int(np.searchsorted(self.keys, key))
+        return position < len(self.keys) and self.keys[position] == key
+
+
+class StrengthClassifier:
+    """
+    Local fast path of the weak/strong decision. classify() applies the rules of the LLM prompt
+    (fewer than 8 characters, letters only, all four character classes) plus frequent-password membership,
+    keyboard/sequence patterns and estimated entropy, and only returns a decision whose confidence reaches
+    the threshold; everything else is left to the LLM.
+    """
+
+    def __init__(self, frequent_file=None, threshold=0.85):
+        self.frequent = FrequentPasswordSet(frequent_file) if frequent_file else None
+        self.threshold = threshold
+        self.counts = {"local_weak": 0, "local_strong": 0, "llm": 0}
+        self._lock = threading.Lock()
+
+    def score(self, password):
+        """
+        (tag, confidence, reason): tag 1 for weak, 2 for strong, None if the rules cannot tell.
+        """
+        password = str(password)  # An empty CSV cell is read as NaN
+        if self.frequent is not None and password in self.frequent:
+            return 1, 0.99, "Frequent password"
+        if len(password) < 8:
+            return 1, 0.95, "Fewer than 8 characters"
+        if password.isalpha():
+            return 1, 0.95, "Only letters"
+        if password.isdigit():
+            return 1, 0.95, "Only digits"
+        coverage = pattern_coverage(password)
+        if coverage >= 0.7:
+            return 1, 0.9, "Mostly repeated characters, sequences or keyboard walks"
+        if len(password) <= WORD_AND_DIGITS_MAX_LENGTH and _WORD_AND_DIGITS.fullmatch(password):
+            return 1, 0.85, "Simple letter-number combination"
+
+        if all(character_classes(password)) and coverage < 0.5:
+            return 2, 0.9, "Uppercase, lowercase, digits and special characters"
+        bits = estimated_bits(password)
+        if bits >= STRONG_MIN_BITS and sum(character_classes(password)) >= 3 and coverage < 0.5:
+            return 2, 0.85, "Long, three character classes and high estimated entropy"
+        if bits < WEAK_MAX_BITS:
+            return 1, 0.85, "Low estimated entropy"
+        return None, 0.5, "Ambiguous"
+
+    def classify(self, password):
+        """
+        Evaluation result in the same format as weakness_evaluation.evaluate_password_strength
+        ({'Brief Reason', 'Tag'}), or None if the password has to go to the LLM.
+        """
+        tag, confidence, reason = self.score(password)
+        decided = tag is not None and confidence >= self.threshold
+        with self._lock:
+            self.counts["local_weak" if decided and tag == 1 else "local_strong" if decided else "llm"] += 1
+        if not decided:
+            return None
+        return {"Brief Reason": reason, "Tag": tag}
+
+    def report(self):
+        """
+        How many passwords were decided locally and how many went to the LLM.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        counts["local_fraction"] = round((counts["local_weak"] + counts["local_strong"]) / total, 4) if total else 0.0
+        return counts
+
+
+# Example usage
+if __name__ == "__main__":
+    build_frequent_set('sample dataset.csv', 'sample dataset_frequent.frq')
+    classifier = StrengthClassifier('sample dataset_frequent.frq')
+    for password in ("abc123xyz", "DavidLermajr.4894", "Cyl6188872!", "qwerty123", "Gjl$2`Aq1", "aaaaaa"):
+        print(password, classifier.score(password), classifier.classify(password))
+    print(classifier.report())
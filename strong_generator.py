@@ -1,14 +1,27 @@
-import openai
-import json
-from password_recommender import recommend_similar_passwords_from_csv  # Ensure this module is available
+from honeyword_repair import HoneywordRepair, extract_honeywords, has_honeywords
+from honeyword_stream import HoneywordStream
+from llm_client import get_client
+from mutation_engine import LETTERS_DIGITS_PUNCTUATION, Constraints, MutationEngine
+from password_recommender import PasswordRecommender  # Ensure this module is available
+
+# Length between 6 and 18, at least two of uppercase/lowercase/digits, not starting with a special symbol
+HONEYWORD_CONSTRAINTS = Constraints(min_length=6, max_length=18, min_classes=2, classes=('upper', 'lower', 'digit'),
+                                    forbidden_first="!@#$%^&*()-_=+[{]}|;:'\",<.>/?")
 
 class StrongPasswordGenerator:
-    def __init__(self, university_name, test_mode=False):
+    def __init__(self, university_name, test_mode=False, recommender=None, index_file='sample dataset_hash.idx',
+                 stream=False, engine=None):
         self.university_name = university_name
         self.test_mode = test_mode  # Controls whether to enable test mode
-        # Set API Key and custom API endpoint
-        openai.api_key = 'XXX'
-        openai.api_base = "XXX"  # your API key
+        # stream parses the honeywords while the reply arrives and stops the request once 20 valid ones are in
+        self.stream = stream
+        self.fallbacks = 0  # Records that ended up in the fallback method
+        # Local mutations for filling up the LLM's honeywords and for the fallback method
+        self.engine = engine or MutationEngine()
+        # Repairs nearly-valid honeywords and asks a follow-up for missing ones before filling up locally
+        self.repair = HoneywordRepair(HONEYWORD_CONSTRAINTS, self.engine.rng)
+        # Share one recommender across generators so the LSH index is loaded once per run
+        self.recommender = recommender or PasswordRecommender(index_file)
         # Save conversation context
         self.messages = [
             {"role": "system", "content": f"Honeywords are decoy passwords used to detect unauthorized access. "
@@ -19,9 +32,7 @@ class StrongPasswordGenerator:
         ]
 
     def generate(self, original_password):
-        recommended_passwords = recommend_similar_passwords_from_csv(
-            original_password, 'sample dataset_hash.csv', num_recommendations=5
-        )
+        recommended_passwords = self.recommender.recommend(original_password, num_recommendations=5)
 
         if not recommended_passwords:
             print("Unable to find enough similar passwords.")
@@ -47,89 +58,73 @@ class StrongPasswordGenerator:
             "Present the result **directly** in JSON format, with two fields: 'honeywords' (list of generated passwords) and 'explanation'."
         )
 
-        honeywords_result = self.send_prompt(final_prompt, max_tokens=500)
-
-        if honeywords_result:
-            try:
-                cleaned_result = honeywords_result.strip().replace("```json", "").replace("```", "")
-                result_dict = json.loads(cleaned_result)
-
-                # Filter valid honeywords and remove duplicates
-                unique_honeywords = []
-                seen_honeywords = set()
-
-                for honeyword in result_dict["honeywords"]:
-                    if honeyword not in seen_honeywords and self.is_valid_honeyword(honeyword):
-                        unique_honeywords.append(honeyword)
-                        seen_honeywords.add(honeyword)
-
-                # Fill in any missing honeywords
-                while len(unique_honeywords) < 20:
-                    additional_honeyword = self.generate_additional_honeyword(original_password)
-                    if additional_honeyword not in seen_honeywords and self.is_valid_honeyword(additional_honeyword):
-                        unique_honeywords.append(additional_honeyword)
-                        seen_honeywords.add(additional_honeyword)
-
-                result_dict["honeywords"] = unique_honeywords[:20]
-                return result_dict
-            except json.JSONDecodeError as e:
-                print(f"Error parsing the JSON result returned by LLM: {str(e)}")
-                return self.generate_with_fallback(original_password)
-        return self.generate_with_fallback(original_password)
+        result_dict = None
+        if self.stream:
+            # Valid honeywords are collected as they arrive; a truncated reply keeps the complete ones
+            stream = HoneywordStream(self.is_valid_honeyword, count=20, exclude=(original_password,))
+            honeywords_result = self.send_prompt(final_prompt, max_tokens=500, on_text=stream.feed)
+            result_dict = stream.result()
+            result_dict["honeywords"] += stream.invalid
+            if not result_dict["honeywords"]:
+                result_dict = None
+        else:
+            honeywords_result = self.send_prompt(final_prompt, max_tokens=500)
+
+        if not honeywords_result:
+            return self.generate_with_fallback(original_password)
+        # Tolerant parsing: code blocks, trailing commas and truncated replies still give their honeywords
+        result_dict = result_dict or extract_honeywords(honeywords_result)
+
+        # Valid honeywords without duplicates, nearly-valid ones repaired, and one follow-up for the missing ones
+        unique_honeywords = self.repair.collect(result_dict, original_password,
+                                                lambda prompt: self.send_prompt(prompt, max_tokens=500))
+        if not unique_honeywords:
+            print(f"No usable honeywords in the result returned by LLM: {honeywords_result}")
+            return self.generate_with_fallback(original_password)
+
+        # Fill in any missing honeywords (bounded: a password no mutation can make valid gets fewer)
+        if len(unique_honeywords) < 20:
+            unique_honeywords += self.engine.mutate(original_password, count=20 - len(unique_honeywords),
+                                                    alphabet=LETTERS_DIGITS_PUNCTUATION,
+                                                    constraints=HONEYWORD_CONSTRAINTS, exclude=unique_honeywords)
+
+        return {"honeywords": unique_honeywords[:20], "explanation": result_dict["explanation"] if result_dict else ""}
 
     def is_valid_honeyword(self, honeyword):
         """
         Check if the honeyword meets length and character type requirements
         """
-        if not (6 <= len(honeyword) <= 18):
-            return False
-        has_upper = any(c.isupper() for c in honeyword)
-        has_lower = any(c.islower() for c in honeyword)
-        has_digit = any(c.isdigit() for c in honeyword)
-        return (has_upper + has_lower + has_digit) >= 2 and not honeyword[0] in "!@#$%^&*()-_=+[{]}|;:'\",<.>/?"
-
-    def send_prompt(self, prompt, max_tokens=200):
-        """
-        Send a prompt to OpenAI's GPT model and return the response.
-        """
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[{"role": "system", "content": "You are a Cyberspace Security Expert."},
-                          {"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=0.6
-            )
-            reply = response['choices'][0]['message']['content'].strip()
-            if self.test_mode:
-                #print(f"LLM reply: {reply}")
-                pass
-            return reply
-        except Exception as e:
-            print(f"Error during GPT call: {e}")
-            return None
+        return HONEYWORD_CONSTRAINTS(honeyword)
 
-    def generate_additional_honeyword(self, original_password):
+    def send_prompt(self, prompt, max_tokens=200, on_text=None):
         """
-        Fallback method to generate honeywords: replace the last 1-3 characters of the original password
-        with random characters.
+        Send a prompt to OpenAI's GPT model and return the response (streamed through on_text if given).
         """
-        import random
-        import string
-
-        num_random_chars = random.randint(1, 3)
-        random_chars = ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=num_random_chars))
-        return original_password[:-num_random_chars] + random_chars
+        messages = [{"role": "system", "content": "You are a Cyberspace Security Expert."},
+                    {"role": "user", "content": prompt}]
+        # The shared client retries rate limits and server errors; None means the call finally failed.
+        # Every prompt of this generator asks for honeywords, so only replies that have some may be cached
+        if on_text is not None:
+            reply = get_client().complete_stream(messages, on_text, max_tokens=max_tokens, temperature=0.6,
+                                                 site='strong', validate=has_honeywords)
+        else:
+            reply = get_client().complete(messages, max_tokens=max_tokens, temperature=0.6, site='strong',
+                                          validate=has_honeywords)
+        if self.test_mode:
+            #print(f"LLM reply: {reply}")
+            pass
+        return reply
 
     def generate_with_fallback(self, original_password):
         """
-        Fallback method when GPT fails to generate honeywords or if an error occurs.
+        Fallback method when GPT fails to generate honeywords or if an error occurs: replace the last 1-3
+        characters of the original password with random characters.
         """
         print("Using fallback method to generate honeywords.")
-        honeywords = []
-        for i in range(20):
-            honeyword = self.generate_additional_honeyword(original_password)
-            honeywords.append(honeyword)
+        self.fallbacks += 1
+        # Valid mutations first; invalid ones only if a valid set of 20 cannot be found
+        honeywords = self.engine.mutate(original_password, count=20, alphabet=LETTERS_DIGITS_PUNCTUATION,
+                                        constraints=HONEYWORD_CONSTRAINTS, strict=False)
         return {"honeywords": honeywords, "explanation": "Fallback method was used to generate honeywords."}
 
 # Example usage
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+from aiohttp import web
+
+# The modules of this repository live at its top level
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client
+from llm_backends import OpenAIBackend
+from mock_llm_server import MockLLMServer
+
+PASSWORDS = ["judith145", "abc123xyz", "monkey12", "sunshine1", "P@ssw0rd!", "Kingulek_1995", "Zulenka_1924",
+             "qwerty99", "dragon2020", "ilovecats", "Tr0ub4dor&3", "correcthorse"]
+
+
+@pytest.fixture
+def password_csv(tmp_path):
+    """A small CSV with a 'Password' column; one value has surrounding whitespace"""
+    path = tmp_path / "passwords.csv"
+    pd.DataFrame({"Password": PASSWORDS[:6] + [" " + PASSWORDS[6] + " "] + PASSWORDS[7:]}).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def index_file(password_csv, tmp_path):
+    """A binary LSH index of password_csv built by password_pre.preprocess_hashes"""
+    from password_pre import preprocess_hashes
+    path = str(tmp_path / "passwords.idx")
+    preprocess_hashes(password_csv, path, workers=1)
+    return path
+
+
+@pytest.fixture
+def records_csv(tmp_path):
+    """Input records for main.process_csv; one has PII and one a quoted field spanning two lines"""
+    path = tmp_path / "records.csv"
+    records = pd.DataFrame({"Password": PASSWORDS, "Username": "Nah", "Birthday": "Nah", "Name": "Nah", "Email": "Nah"})
+    records.loc[2, ["Username", "Birthday", "Name", "Email"]] = ["supercat", "1995/05/02", "Zhang\nSan", "hao123@example.com"]
+    records.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    """
+    mock_llm_server.MockLLMServer on a free local port, served from a background event loop for the whole
+    session; server.url is its OpenAI-compatible base URL.
+    """
+    server = MockLLMServer(latency=0.001, token_latency=0.0, seed=0)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(server.make_app())
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', 0).start())
+    server.url = f"http://127.0.0.1:{runner.addresses[0][1]}/v1"
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+@pytest.fixture
+def llm(mock_server, tmp_path):
+    """
+    The shared LLM client pointed at mock_server, with a fresh response cache and quick retries. The server's
+    failure rates and counters are reset, so a test sets only what it needs (e.g. llm.malformed_rate = 1.0).
+    """
+    mock_server.error_rate = 0.0
+    mock_server.malformed_rate = 0.0
+    mock_server.counts = dict.fromkeys(mock_server.counts, 0)
+    llm_client.configure(backend=OpenAIBackend(api_key="test", api_base=mock_server.url),
+                         cache_file=str(tmp_path / "llm_responses.sqlite"), max_retries=2, base_delay=0.01,
+                         max_delay=0.05)
+    yield mock_server
+    llm_client.configure()
@@ -0,0 +1,41 @@
+import llm_client
+
+SYSTEM = [{"role": "system", "content": "You are a Cyberspace Security Expert."}]
+MESSAGE = "Generate honeywords for the password 'abc123xyz'."
+
+
+def test_failed_send_leaves_the_turns_unchanged(llm):
+    llm.error_rate = 1.0
+    conversation = llm_client.Conversation(SYSTEM)
+    assert conversation.send(MESSAGE) is None
+    assert conversation.turns == []
+    assert conversation.record_usage()["calls"] == 1
+
+    llm.error_rate = 0.0
+    assert conversation.send(MESSAGE) is not None
+    assert [turn["role"] for turn in conversation.turns] == ["user", "assistant"]
+
+
+def test_oldest_exchanges_are_dropped_after_max_turns(llm):
+    conversation = llm_client.Conversation(SYSTEM, max_turns=4)
+    for i in range(5):
+        conversation.send(f"Generate honeywords for the password 'pw{i}abc'.")
+        assert len(conversation.turns) <= 4
+    assert conversation.turns[0]["content"] == "Generate honeywords for the password 'pw3abc'."
+    assert conversation.messages[0] == SYSTEM[0]
+
+
+def test_reset_keeps_the_prefix_and_the_request_size_flat(llm):
+    conversation = llm_client.Conversation(SYSTEM)
+    prompt_tokens = []
+    for _ in range(3):
+        conversation.reset()
+        conversation.send(MESSAGE)
+        usage = conversation.record_usage()
+        assert usage["calls"] == 1 and usage["completion_tokens"] > 0
+        prompt_tokens.append(usage["prompt_tokens"])
+    assert len(set(prompt_tokens)) == 1
+    assert conversation.messages[:1] == SYSTEM and len(conversation.turns) == 2
+
+    conversation.reset()
+    assert conversation.messages == SYSTEM and conversation.record_usage()["calls"] == 0
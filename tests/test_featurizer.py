@@ -0,0 +1,39 @@
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from conftest import PASSWORDS
+from featurizer import HashedNgramFeaturizer, TopNgramFeaturizer, make_featurizer
+
+
+def test_hashed_features_do_not_depend_on_the_batch():
+    featurizer = HashedNgramFeaturizer()
+    batch = featurizer.transform(PASSWORDS)
+    assert batch.shape == (len(PASSWORDS), featurizer.dim)
+    for pwd, row in zip(PASSWORDS, batch):
+        np.testing.assert_array_equal(featurizer.transform_one(pwd), row)
+    np.testing.assert_array_equal(featurizer.transform(PASSWORDS[::-1]), batch[::-1])
+
+
+def test_hashed_features_count_every_ngram():
+    featurizer = HashedNgramFeaturizer(dim=4096, alternate_sign=False)
+    # 9 + 8 + 7 n-grams of lengths 1 to 3; lowercase folds the two spellings together
+    assert featurizer.transform_one("Judith145").sum() == 24
+    np.testing.assert_array_equal(featurizer.transform_one("JUDITH145"), featurizer.transform_one("judith145"))
+    assert featurizer.transform([]).shape == (0, 4096)
+
+
+def test_make_featurizer_round_trips_params():
+    for featurizer in (HashedNgramFeaturizer(dim=64, ngram_range=(2, 4), alternate_sign=False), TopNgramFeaturizer()):
+        rebuilt = make_featurizer(featurizer.params())
+        assert type(rebuilt) is type(featurizer) and rebuilt.params() == featurizer.params()
+        np.testing.assert_array_equal(rebuilt.transform(PASSWORDS), featurizer.transform(PASSWORDS))
+    assert isinstance(make_featurizer(None), HashedNgramFeaturizer)
+
+
+def test_top_ngram_featurizer_matches_single_document_count_vectorizer():
+    featurizer = TopNgramFeaturizer()
+    for pwd in PASSWORDS + ["aa  bb", "a"]:
+        counts = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15).fit_transform([pwd])
+        expected = np.zeros(15, dtype=np.float32)
+        expected[:counts.shape[1]] = counts.toarray()[0]
+        np.testing.assert_array_equal(featurizer.transform_one(pwd), expected)
@@ -0,0 +1,68 @@
+import string
+
+import numpy as np
+import pytest
+
+from honeyword_repair import HoneywordRepair, extract_honeywords, extract_json, has_honeywords
+from mutation_engine import Constraints
+
+WEAK = Constraints(min_length=6, max_length=18, min_classes=2, classes=('upper', 'lower', 'digit'),
+                   forbidden_first=string.digits, allow_symbols=False)
+
+
+@pytest.mark.parametrize("reply, value", [
+    ('{"Tag": 1}', {"Tag": 1}),
+    ('Here you go:\n```json\n{"honeywords": ["abc124xyz", "abd123xyz",], "explanation": "ok"}\n```',
+     {"honeywords": ["abc124xyz", "abd123xyz"], "explanation": "ok"}),
+    ('```json\n[{"id": 0, "Tag": 1}, {"id": 1, "Ta', [{"id": 0, "Tag": 1}, {"id": 1}]),
+    ('{"honeywords": ["judith146", "judith147"', {"honeywords": ["judith146", "judith147"]}),
+    # Brackets in the prose before the value
+    ('Sure [note]: {"honeywords": ["abc124xyz"]}', {"honeywords": ["abc124xyz"]}),
+    ('Sure {see below} [1: {"honeywords": ["abc124xyz", "abc1', {"honeywords": ["abc124xyz"]}),
+    ("Sure! Here are some honeywords.", None),
+    ("", None),
+])
+def test_extract_json(reply, value):
+    assert extract_json(reply) == value
+
+
+def test_extract_honeywords():
+    assert extract_honeywords('["abc124xyz", "abc125xyz"]') == {"honeywords": ["abc124xyz", "abc125xyz"],
+                                                                "explanation": ""}
+    # Not JSON at all, but the complete strings of the array are still picked out
+    assert extract_honeywords('{"honeywords": ["abc124xyz", "abc125xyz"] "explanation": }')["honeywords"] == [
+        "abc124xyz", "abc125xyz"]
+    assert has_honeywords('{"honeywords": ["abc124xyz"]}')
+    assert not has_honeywords('{"honeywords": []}') and not has_honeywords(None)
+
+
+def test_nearly_valid_honeywords_are_repaired():
+    repair = HoneywordRepair(WEAK, np.random.default_rng(0))
+    assert repair.repair("abc_123") == "abc123"
+    assert repair.repair("1abc123xyz") == "abc123xyz"
+    assert repair.repair("abcdefghijklmnopq12") == "abcdefghijklmnopq1"
+    assert repair.repair("x") is None
+
+    repair.repaired = 0
+    selected = repair.select(["abc123xyz", "1abc123xyz", "abc_123", "abc124xyz", "x", 7, "abc124xyz"],
+                             exclude=("abc123xyz",))
+    # The repair of 1abc123xyz is the excluded password
+    assert selected == ["abc123", "abc124xyz"] and repair.repaired == 1
+
+
+def test_missing_honeywords_are_asked_for_once():
+    prompts = []
+
+    def send(prompt):
+        prompts.append(prompt)
+        return '{"honeywords": ["abc124xyz", "abc125xyz", "abc126xyz", "abc124xyz"]}'
+
+    repair = HoneywordRepair(WEAK, np.random.default_rng(0))
+    honeywords = repair.collect({"honeywords": ["abc123xyz", "abc127xyz"]}, "abc123xyz", send, count=6)
+    assert honeywords == ["abc127xyz", "abc124xyz", "abc125xyz", "abc126xyz"]
+    assert len(prompts) == 1 and repair.follow_ups == 1
+    assert "Generate 5 more" in prompts[0] and "1. The length is between 6-18 characters;" in prompts[0]
+
+    # Too few missing to be worth a request
+    assert len(repair.collect({"honeywords": [f"abc{i}xyz" for i in range(18)]}, "abc123xyz", send)) == 18
+    assert len(prompts) == 1
@@ -0,0 +1,57 @@
+import json
+
+import llm_client
+from honeyword_stream import HoneywordStream
+from weak_generator import WeakPasswordGenerator, is_valid_honeyword
+
+HONEYWORDS = [f"abc{i:03d}xyz" for i in range(20)]
+REPLY = "```json\n" + json.dumps({"honeywords": HONEYWORDS, "explanation": "Changed digits."}, indent=2) + "\n```"
+
+
+def feed_in_pieces(stream, text, size):
+    return [stream.feed(text[start:start + size]) for start in range(0, len(text), size)]
+
+
+def test_pieces_of_any_size_give_the_whole_reply():
+    for size in (1, 3, 7, len(REPLY)):
+        stream = HoneywordStream(is_valid_honeyword, count=21)
+        assert not any(feed_in_pieces(stream, REPLY, size))
+        assert stream.result() == {"honeywords": HONEYWORDS, "explanation": "Changed digits."}
+
+
+def test_duplicates_invalid_and_non_string_items_are_dropped():
+    reply = '{\'honeywords\': ["abc123xyz", "abc\\u0031xyz", "short", 42, null, "abc\\u0031xyz", "abc124xyz"]}'
+    stream = HoneywordStream(is_valid_honeyword, exclude=("abc123xyz",))
+    feed_in_pieces(stream, reply, 2)
+    assert stream.honeywords == ["abc1xyz", "abc124xyz"]
+    assert stream.invalid == ["short"] and stream.rejected == 5
+
+
+def test_truncated_reply_keeps_the_complete_honeywords():
+    stream = HoneywordStream(is_valid_honeyword)
+    feed_in_pieces(stream, REPLY[:REPLY.index("abc005xyz") + 5], 4)
+    assert stream.result() == {"honeywords": HONEYWORDS[:5], "explanation": ""}
+
+
+def test_stream_stops_once_enough_honeywords_arrived(llm):
+    messages = [{"role": "user", "content": "Generate honeywords for the password 'monkey12'. Return the result in "
+                                            "JSON format with the fields 'honeywords' and 'explanation'."}]
+    client = llm_client.get_client()
+    stream = HoneywordStream(is_valid_honeyword, count=5, exclude=("monkey12",))
+    text = client.complete_stream(messages, stream.feed)
+    assert stream.complete and len(stream.honeywords) == 5
+    assert client.stats["early_stops"] == 1
+    assert text.count('"') < len(client.complete(messages))
+
+
+def test_streaming_generator_collects_twenty_honeywords(llm):
+    generator = WeakPasswordGenerator("XYZ University", stream=True)
+    result = generator.generate("abc123xyz")
+    assert len(set(result["honeywords"])) == 20 and generator.fallbacks == 0
+    assert llm_client.get_client().stats["early_stops"] == 1
+
+    # A reply cut short by max_tokens keeps its honeywords; only the missing ones are asked for or mutated
+    generator.conversation.max_tokens = 40
+    result = generator.generate("abc123xyz")
+    assert len(set(result["honeywords"])) == 20 and generator.fallbacks == 0
+    assert llm.counts["truncated"] >= 1
@@ -0,0 +1,75 @@
+import os
+
+from conftest import PASSWORDS
+from index_segments import SegmentedIndex, append_passwords, compact_index, delete_passwords
+from neighbor_pre import precompute_neighbors
+from password_recommender import PasswordRecommender
+
+
+def all_passwords(index):
+    return sorted(pwd for segment_id, source in index.sources() for pwd in source.passwords(range(len(source)))
+                  if not index.is_deleted(pwd, segment_id))
+
+
+def test_appended_segment_is_visible_after_refresh(index_file):
+    reader = SegmentedIndex(index_file)
+    assert append_passwords(index_file, ["judith146", " ", ""]) == 1
+    assert "judith146" not in all_passwords(reader)
+    reader.refresh()
+    assert all_passwords(reader) == sorted(PASSWORDS + ["judith146"])
+    assert append_passwords(index_file, [""]) is None
+
+
+def test_deleted_password_is_hidden_and_can_be_added_again(index_file):
+    delete_passwords(index_file, ["monkey12"])
+    assert "monkey12" not in all_passwords(SegmentedIndex(index_file))
+    append_passwords(index_file, ["monkey12"])
+    assert "monkey12" in all_passwords(SegmentedIndex(index_file))
+
+
+def test_compaction_merges_segments_and_tombstones(index_file):
+    append_passwords(index_file, ["judith146"])
+    delete_passwords(index_file, ["abc123xyz"])
+    compact_index(index_file)
+
+    index = SegmentedIndex(index_file)
+    assert not index.has_updates()
+    assert all_passwords(index) == sorted(set(PASSWORDS + ["judith146"]) - {"abc123xyz"})
+    assert os.listdir(index_file + ".segments") == ["manifest.json"]
+
+
+def test_long_lived_reader_sees_segments_appended_after_compaction(index_file):
+    append_passwords(index_file, ["judith146"])
+    reader = SegmentedIndex(index_file)
+    compact_index(index_file)
+    # Segment ids are not reused, so the reader cannot mistake the new segment for its stale one
+    assert append_passwords(index_file, ["judith147x"]) == 2
+    reader.refresh()
+    assert all_passwords(reader) == all_passwords(SegmentedIndex(index_file))
+    assert "judith147x" in all_passwords(reader)
+
+
+def test_recommender_merges_segments_and_tombstones(index_file):
+    recommender = PasswordRecommender(index_file, max_hamming_dist=10, num_recommendations=len(PASSWORDS))
+    assert "judith146" not in recommender.recommend("judith145")
+    append_passwords(index_file, ["judith146"])
+    delete_passwords(index_file, ["sunshine1"])
+    recommender.refresh()
+    recommendations = recommender.recommend("judith145")
+    assert recommendations[0] == "judith146" and "sunshine1" not in recommendations
+
+
+def test_deleted_password_stays_hidden_after_compaction_with_a_neighbor_table(index_file, tmp_path):
+    neighbor_file = str(tmp_path / "passwords.nbr")
+    precompute_neighbors(index_file, neighbor_file, k=len(PASSWORDS) - 1, max_hamming_dist=10, workers=1)
+    recommender = PasswordRecommender(index_file, max_hamming_dist=10, neighbor_file=neighbor_file)
+    assert "Zulenka_1924" in recommender.recommend("Kingulek_1995")
+
+    delete_passwords(index_file, ["Zulenka_1924"])
+    recommender.refresh()
+    assert "Zulenka_1924" not in recommender.recommend("Kingulek_1995")
+
+    compact_index(index_file)
+    recommender.refresh()
+    assert "Zulenka_1924" not in recommender.recommend("Kingulek_1995")
+    assert recommender.neighbor_table is None
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+import llm_client
+from honeyword_repair import has_honeywords
+from llm_cache import ResponseCache, cache_key
+from password_recommender import PasswordRecommender
+from pii_generator import PIIGenerator
+from strong_generator import StrongPasswordGenerator
+from weak_generator import WeakPasswordGenerator
+from weakness_evaluation import evaluate_password_strength
+
+MESSAGES = [{"role": "system", "content": "You are a Cyberspace Security Expert."},
+            {"role": "user", "content": "Evaluate the password 'abc' for weakness. Return the result in JSON format "
+                                        "with two fields: 'Brief Reason' and 'Tag' (1 for weak, 2 for strong)."}]
+
+
+def test_response_cache_round_trip_and_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    key = cache_key("model", MESSAGES, 0, 100)
+    assert cache.get(key, "classification") is None
+    cache.put(key, "classification", "reply")
+    assert cache.get(key, "classification") == "reply"
+    assert cache.stats()["classification"]["hits"] == 1
+
+    expired = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=-1)
+    assert expired.get(key, "classification") is None
+
+
+def test_valid_classification_is_served_from_cache(llm):
+    first = evaluate_password_strength("abc")
+    second = evaluate_password_strength("abc")
+    assert first == second and first["Tag"] == 1
+    assert llm.counts["requests"] == 1
+
+
+def test_malformed_reply_is_not_cached(llm):
+    llm.malformed_rate = 1.0
+    assert evaluate_password_strength("abc") is None
+    assert evaluate_password_strength("abc") is None
+    # Both calls reached the model; nothing was replayed from the cache
+    assert llm.counts["requests"] == 2
+    assert llm_client.get_client().cache.stats()["classification"]["hits"] == 0
+
+
+def test_cached_reply_rejected_by_validate_is_a_miss(llm):
+    client = llm_client.get_client()
+    client.cache.put(cache_key(client.model, MESSAGES, 0, 100), "classification", "not json")
+    reply = client.complete(MESSAGES, max_tokens=100, temperature=0, site="classification",
+                            validate=lambda reply: reply.startswith("{"))
+    assert reply.startswith("{")
+    assert llm.counts["requests"] == 1
+
+
+def test_nothing_is_stored_without_validate(llm):
+    client = llm_client.get_client()
+    client.complete(MESSAGES, max_tokens=100, temperature=0, site="classification")
+    client.complete(MESSAGES, max_tokens=100, temperature=0, site="classification")
+    assert llm.counts["requests"] == 2
+
+
+
+@pytest.fixture
+def generators(llm, index_file):
+    """One generator of every LLM strategy, with all their call sites cached"""
+    llm_client.get_client().cache_sites.update({"weak", "pii", "strong"})
+    return {
+        "weak": lambda: WeakPasswordGenerator("XYZ University").generate("abc123xyz"),
+        "weak single-shot": lambda: WeakPasswordGenerator("XYZ University", single_shot=True).generate("abc123xyz"),
+        "weak streamed": lambda: WeakPasswordGenerator("XYZ University", stream=True).generate("abc123xyz"),
+        "weak batch": lambda: WeakPasswordGenerator("XYZ University").generate_batch(["abc123xyz", "monkey12"]),
+        "pii": lambda: PIIGenerator().generate("zs123a", "supercat", "1999-05-02", "zhangsan", "hao123@example.com"),
+        "strong": lambda: StrongPasswordGenerator("XYZ University", recommender=PasswordRecommender(index_file))
+        .generate("DavidLermajr.4894"),
+    }
+
+
+@pytest.mark.parametrize("strategy", ["weak", "weak single-shot", "weak streamed", "weak batch", "pii", "strong"])
+def test_repeated_generation_is_served_from_cache(llm, generators, strategy):
+    generators[strategy]()
+    requests = llm.counts["requests"]
+    assert requests > 0
+    result = generators[strategy]()
+    assert llm.counts["requests"] == requests
+    assert all(len(item["honeywords"]) == 20 for item in (result if isinstance(result, list) else [result]))
+
+
+def test_only_replies_with_honeywords_are_cached(llm, generators):
+    llm.malformed_rate = 1.0
+    for _ in range(3):
+        generators["strong"]()
+    with sqlite3.connect(llm_client.get_client().cache.path) as connection:
+        stored = [reply for reply, in connection.execute("SELECT reply FROM responses")]
+    assert all(has_honeywords(reply) for reply in stored)
+    assert not has_honeywords("Sure! Here are some honeywords.")
+    assert has_honeywords('```json\n{"honeywords": ["Abc123xyz", "abc124')
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+import llm_client
+from llm_backends import OpenAIBackend
+from llm_client import LLMClient, RateLimiter, is_retryable, track_usage
+
+
+def classification_messages(password):
+    return [{"role": "system", "content": "You are a Cyberspace Security Expert."},
+            {"role": "user", "content": f"Evaluate the password '{password}' for weakness. Return the result in JSON "
+                                        f"format with two fields: 'Brief Reason' and 'Tag' (1 for weak, 2 for strong)."}]
+
+
+class ConcurrencyProbe(OpenAIBackend):
+    """OpenAIBackend that records how many requests it had open at once"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.open_requests = 0
+        self.max_open_requests = 0
+
+    async def acomplete(self, *args):
+        self.open_requests += 1
+        self.max_open_requests = max(self.max_open_requests, self.open_requests)
+        try:
+            return await super().acomplete(*args)
+        finally:
+            self.open_requests -= 1
+
+
+def test_retryable_errors():
+    assert is_retryable(openai.error.RateLimitError("slow down"))
+    assert is_retryable(openai.error.APIError("server error", http_status=502))
+    assert not is_retryable(openai.error.APIError("bad gateway config", http_status=400))
+    assert not is_retryable(openai.error.InvalidRequestError("bad request", param=None))
+    assert not is_retryable(ValueError("bug"))
+
+
+def test_backoff_is_jittered_capped_and_honours_retry_after(mock_server):
+    client = LLMClient(backend=OpenAIBackend(api_key="test", api_base=mock_server.url), cache_file=None,
+                       base_delay=1.0, max_delay=4.0)
+    try:
+        delays = [client.backoff_delay(attempt) for attempt in range(10) for _ in range(20)]
+        assert 0 <= min(delays) and max(delays) <= 4.0
+        error = openai.error.RateLimitError("slow down", headers={"retry-after": "7"})
+        assert client.backoff_delay(0, error) == 7.0
+    finally:
+        client.close()
+
+
+def test_rate_limiter_waits_for_the_bucket_to_refill():
+    async def take():
+        limiter = RateLimiter(per_minute=600)
+        assert await limiter.acquire(600) == 0.0
+        start = time.monotonic()
+        await limiter.acquire(3)
+        return time.monotonic() - start
+
+    # 600 per minute refills 10 units per second
+    assert 0.25 <= asyncio.run(take()) < 1.0
+
+
+def test_failed_requests_are_retried_until_they_succeed(llm):
+    llm_client.configure(backend=OpenAIBackend(api_key="test", api_base=llm.url), cache_file=None, max_retries=20,
+                         base_delay=0.001, max_delay=0.01)
+    llm.error_rate = 0.5
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(lambda i: llm_client.get_client().complete(classification_messages(f"pw{i}")),
+                                range(20)))
+    stats = llm_client.get_client().stats
+    assert all(reply and '"Tag"' in reply for reply in replies)
+    assert stats["requests"] == llm.counts["requests"] == 20 + stats["retries"]
+    assert stats["retries"] == llm.counts["rate_limited"] + llm.counts["server_errors"] > 0
+
+
+def test_exhausted_retries_return_none(llm):
+    llm.error_rate = 1.0
+    client = llm_client.get_client()
+    assert client.complete(classification_messages("abc")) is None
+    assert llm.counts["requests"] == 3 and client.stats["failures"] == 1
+
+
+def test_in_flight_requests_are_bounded(llm):
+    backend = ConcurrencyProbe(api_key="test", api_base=llm.url)
+    llm_client.configure(backend=backend, cache_file=None, max_in_flight=3)
+    llm.latency = 0.02
+    try:
+        with ThreadPoolExecutor(12) as pool:
+            list(pool.map(lambda i: llm_client.get_client().complete(classification_messages(f"pw{i}")), range(24)))
+    finally:
+        llm.latency = 0.001
+    assert backend.max_open_requests == 3
+
+
+def test_usage_is_reported_per_call_and_per_block(llm):
+    client = llm_client.get_client()
+    usage = {}
+    with track_usage() as totals:
+        client.complete(classification_messages("abc"), usage=usage)
+        client.complete(classification_messages("abcd"))
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+    assert totals["calls"] == 2 and totals["prompt_tokens"] > usage["prompt_tokens"]
+    assert client.stats["prompt_tokens"] == totals["prompt_tokens"]
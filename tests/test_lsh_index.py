@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PASSWORDS
+from featurizer import HashedNgramFeaturizer
+from lsh_benchmark import run_benchmark
+from lsh_index import _BYTE_POPCOUNT, BucketIndex, LSHIndex, hamming_scan, is_index_file, pack_bits, popcount
+from password_pre import LSH, preprocess_hashes
+from password_recommender import LSH as RecommenderLSH
+from password_recommender import recommend_similar_passwords_from_csv, recommend_similar_passwords_from_index
+
+
+def test_index_round_trips_passwords_and_codes(index_file):
+    index = LSHIndex(index_file)
+    assert len(index) == len(PASSWORDS)
+    assert index.passwords(range(len(index))) == PASSWORDS
+    assert index.num_hashes == 10 and index.seed == 42 and index.num_tables == 1
+
+    featurizer = HashedNgramFeaturizer()
+    bits = LSH(10, featurizer.dim, seed=42).hash_batch(featurizer.transform(PASSWORDS))
+    np.testing.assert_array_equal(index.codes_by_row(0, np.arange(len(PASSWORDS))), pack_bits(bits))
+
+
+def test_index_stores_utf8_passwords(tmp_path):
+    passwords = ["pässwörd", "密码123", "emoji🔑key"]
+    pd.DataFrame({"Password": passwords}).to_csv(tmp_path / "utf8.csv", index=False)
+    preprocess_hashes(str(tmp_path / "utf8.csv"), str(tmp_path / "utf8.idx"), workers=1)
+    assert LSHIndex(str(tmp_path / "utf8.idx")).passwords(range(3)) == passwords
+
+
+def test_binary_output_is_independent_of_chunking(password_csv, tmp_path):
+    single = tmp_path / "single.idx"
+    parallel = tmp_path / "parallel.idx"
+    preprocess_hashes(password_csv, str(single), workers=1, chunksize=100)
+    preprocess_hashes(password_csv, str(parallel), workers=2, chunksize=5)
+    assert single.read_bytes() == parallel.read_bytes()
+
+
+def test_is_index_file(index_file, password_csv, tmp_path):
+    assert is_index_file(index_file)
+    assert not is_index_file(password_csv)
+    assert not is_index_file(str(tmp_path / "missing.idx"))
+
+
+def test_index_and_csv_queries_agree(password_csv, index_file, tmp_path):
+    hash_csv = str(tmp_path / "passwords_hash.csv")
+    preprocess_hashes(password_csv, hash_csv, workers=1)
+    for pwd in ["judith146", "Kingulek_1996", "abc"]:
+        assert (recommend_similar_passwords_from_index(pwd, index_file, max_hamming_dist=4)
+                == recommend_similar_passwords_from_csv(pwd, hash_csv, max_hamming_dist=4))
+
+
+def brute_force_distances(codes, target_code):
+    return np.array([bin(int(code) ^ int(target_code)).count('1') for code in codes])
+
+
+def test_bucket_lookup_finds_exactly_the_hamming_ball():
+    rng = np.random.RandomState(0)
+    codes = rng.randint(0, 1 << 12, size=2000).astype(np.uint64)
+    buckets = BucketIndex.from_codes(codes, num_hashes=12)
+    for target_code in codes[:20]:
+        distances = brute_force_distances(codes, target_code)
+        for radius in (0, 1, 2, 3):
+            rows = buckets.lookup(target_code, max_hamming_dist=radius)
+            assert sorted(rows.tolist()) == np.nonzero(distances <= radius)[0].tolist()
+            # Nearest buckets come first
+            assert np.all(np.diff(distances[rows]) >= 0)
+
+
+def test_bucket_lookup_caps_candidates_nearest_first():
+    rng = np.random.RandomState(1)
+    codes = rng.randint(0, 1 << 8, size=500).astype(np.uint64)
+    buckets = BucketIndex.from_codes(codes, num_hashes=8)
+    everything = buckets.lookup(codes[0], max_hamming_dist=3)
+    for cap in (1, 7, 50, len(everything), len(everything) + 10):
+        np.testing.assert_array_equal(buckets.lookup(codes[0], max_hamming_dist=3, max_candidates=cap),
+                                      everything[:cap])
+
+
+def test_dense_bucket_table_matches_binary_search(index_file):
+    table = LSHIndex(index_file).tables[0]
+    assert table.buckets is not None
+    searched = BucketIndex(table.codes, table.rows, table.num_hashes)
+    for target_code in table.sorted_codes:
+        for radius in (0, 2):
+            np.testing.assert_array_equal(table.lookup(target_code, radius), searched.lookup(target_code, radius))
+
+
+def test_csv_candidates_use_the_hamming_ball():
+    lsh = RecommenderLSH(num_hashes=4, input_dim=8)
+    hash_data = pd.DataFrame({"Password": ["a", "b", "c"], "Hash": [[0, 0, 0, 0], [1, 0, 0, 0], [1, 1, 1, 0]]})
+    assert lsh.get_candidates_from_hashes([0, 0, 0, 0], hash_data, max_hamming_dist=1) == ["a", "b"]
+    assert lsh.get_candidates_from_hashes([0, 0, 0, 0], hash_data.iloc[:0]) == []
+
+
+def test_hamming_scan_matches_brute_force_on_multi_word_codes():
+    rng = np.random.RandomState(2)
+    bits = rng.randint(0, 2, size=(3000, 100))
+    codes = pack_bits(bits)
+    target = bits[0] ^ (rng.rand(100) < 0.05)
+    distances = (bits != target).sum(axis=1)
+
+    positions, found = hamming_scan(codes, pack_bits(target)[0], max_hamming_dist=40, block_rows=256, workers=3)
+    assert sorted(positions.tolist()) == np.nonzero(distances <= 40)[0].tolist()
+    np.testing.assert_array_equal(found, distances[positions])
+    assert np.all(np.diff(found) >= 0)
+
+    positions, found = hamming_scan(codes, pack_bits(target)[0], k=10, block_rows=256)
+    np.testing.assert_array_equal(found, np.sort(distances)[:10])
+
+
+def test_popcount_table_fallback_matches_bit_count():
+    words = np.random.RandomState(3).randint(0, 2 ** 63, size=1000, dtype=np.int64).astype(np.uint64) * np.uint64(3)
+    expected = [bin(int(word)).count('1') for word in words]
+    assert popcount(words).tolist() == expected
+    assert _BYTE_POPCOUNT[words.view(np.uint8)].reshape(-1, 8).sum(axis=1).tolist() == expected
+
+
+def test_scan_and_bucket_modes_return_the_same_candidates(index_file):
+    index = LSHIndex(index_file)
+    for target_code in index.codes_by_row(0, np.arange(len(index)))[:, None, :]:
+        bucket = index.candidates(target_code, max_hamming_dist=3, mode='bucket')
+        scan = index.candidates(target_code, max_hamming_dist=3, mode='scan')
+        assert sorted(bucket.tolist()) == sorted(scan.tolist())
+    with pytest.raises(ValueError):
+        index.candidates(target_code, mode='nearest')
+
+
+def test_multi_table_index_extends_the_single_table_one(password_csv, index_file, tmp_path):
+    multi_file = str(tmp_path / "multi.idx")
+    preprocess_hashes(password_csv, multi_file, num_tables=3, workers=1)
+    single, multi = LSHIndex(index_file), LSHIndex(multi_file)
+    assert multi.num_tables == 3 and multi.seeds == [42, 43, 44]
+    rows = np.arange(len(single))
+    # Table 0 keeps the base seed, so it holds the same codes as a single-table index
+    np.testing.assert_array_equal(multi.codes_by_row(0, rows), single.codes_by_row(0, rows))
+
+    for row in rows:
+        target_codes = np.stack([multi.codes_by_row(t, [row]) for t in range(3)])
+        found = multi.candidates(target_codes, max_hamming_dist=1)
+        assert len(set(found.tolist())) == len(found)
+        assert set(single.candidates(target_codes[:1], max_hamming_dist=1).tolist()) <= set(found.tolist())
+
+
+def test_multi_table_hashing_needs_binary_output(password_csv, tmp_path):
+    with pytest.raises(ValueError):
+        preprocess_hashes(password_csv, str(tmp_path / "multi.csv"), num_tables=2)
+
+
+def test_benchmark_reports_full_recall_for_an_exhaustive_radius(password_csv):
+    report = run_benchmark(password_csv, [(1, 4, 4), (2, 8, 1)], num_queries=5)
+    assert report[["tables", "bits", "radius"]].values.tolist() == [[1, 4, 4], [2, 8, 1]]
+    # A radius of all 4 bits reaches every stored password, so the ranking equals the exact one
+    assert report["recall@5"][0] == 1.0
@@ -0,0 +1,67 @@
+import json
+
+import pandas as pd
+
+from conftest import PASSWORDS
+from main import process_csv
+
+
+def read_output(output_file):
+    result = pd.read_csv(output_file)
+    honeywords = result[[f"Honeyword_{i}" for i in range(1, 22)]]
+    return result, honeywords
+
+
+def test_parallel_run_keeps_the_input_order(llm, records_csv, index_file, tmp_path):
+    process_csv(records_csv, str(tmp_path / "serial.csv"), index_file=index_file)
+    process_csv(records_csv, str(tmp_path / "parallel.csv"), index_file=index_file, workers=4)
+    serial, _ = read_output(tmp_path / "serial.csv")
+    parallel, honeywords = read_output(tmp_path / "parallel.csv")
+
+    assert parallel["Password"].tolist() == PASSWORDS
+    assert parallel["Name"][2] == "Zhang\nSan"
+    assert (honeywords["Honeyword_1"] == parallel["Password"]).all() and honeywords.notna().all().all()
+    assert parallel["Strategy"].tolist() == serial["Strategy"].tolist()
+    assert parallel["Strategy"][2] == "PII-based"
+    assert set(parallel["Strategy"]) == {"Weak password-based", "Strong password-based", "PII-based"}
+
+
+def test_streaming_run_resumes_after_the_last_checkpoint(llm, records_csv, index_file, tmp_path):
+    output_file = tmp_path / "streamed.csv"
+    process_csv(records_csv, str(output_file), index_file=index_file, chunksize=2)
+    complete, _ = read_output(output_file)
+    assert complete["Password"].tolist() == PASSWORDS
+
+    # Simulate a crash after 5 records (past the record with a two-line field) and half a row more
+    journal = (tmp_path / "streamed.csv.progress").read_text().splitlines()
+    (tmp_path / "streamed.csv.progress").write_text("\n".join(journal[:5]) + "\n")
+    with open(output_file, 'r+b') as out:
+        out.truncate(json.loads(journal[4])["offset"])
+        out.seek(0, 2)
+        out.write(b"torn,row")
+
+    process_csv(records_csv, str(output_file), index_file=index_file, chunksize=2)
+    resumed, honeywords = read_output(output_file)
+    assert resumed["Password"].tolist() == PASSWORDS
+    assert resumed.iloc[:5].equals(complete.iloc[:5])
+    assert (honeywords["Honeyword_1"] == resumed["Password"]).all() and honeywords.notna().all().all()
+    assert json.loads((tmp_path / "streamed.csv.progress").read_text().splitlines()[-1])["done"]
+
+
+def test_blank_and_numeric_passwords_do_not_abort_the_run(llm, records_csv, index_file, tmp_path):
+    input_file = tmp_path / "blank.csv"
+    input_file.write_text(open(records_csv).read().replace("judith145,", ",").replace("abc123xyz,", "12345678,"))
+    for options in ({}, {"chunksize": 3, "batch_size": 4}):
+        process_csv(str(input_file), str(tmp_path / "out.csv"), index_file=index_file, **options)
+        result, honeywords = read_output(tmp_path / "out.csv")
+        assert len(result) == len(PASSWORDS) and honeywords.iloc[:, 1:].notna().all().all()
+
+
+def test_batched_units_give_the_same_labels_as_single_records(llm, records_csv, index_file, tmp_path):
+    process_csv(records_csv, str(tmp_path / "single.csv"), index_file=index_file)
+    process_csv(records_csv, str(tmp_path / "batched.csv"), index_file=index_file, batch_size=5, workers=2)
+    single, _ = read_output(tmp_path / "single.csv")
+    batched, honeywords = read_output(tmp_path / "batched.csv")
+    assert batched["Password"].tolist() == PASSWORDS
+    assert batched["Strategy"].tolist() == single["Strategy"].tolist()
+    assert honeywords.notna().all().all()
@@ -0,0 +1,63 @@
+import json
+import random
+import urllib.request
+
+import llm_backends
+import llm_client
+from llm_backends import OpenAIBackend, default_backend
+from mock_llm_server import make_reply
+
+CLASSIFY = ("Evaluate the password '{}' for weakness. Return the result in JSON format with two fields: "
+            "'Brief Reason' and 'Tag' (1 for weak, 2 for strong).")
+GENERATE = ("Generate honeywords for the password '{}'. Return the result in JSON format with the fields "
+            "'honeywords' and 'explanation'.")
+
+
+def ask(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_replies_follow_the_requested_format():
+    rng = random.Random(0)
+    assert json.loads(make_reply(ask(CLASSIFY.format("abc")), rng))["Tag"] == 1
+    assert json.loads(make_reply(ask(CLASSIFY.format("Xy1!abcdefgh")), rng))["Tag"] == 2
+
+    reply = make_reply(ask(GENERATE.format("monkey12")), rng)
+    honeywords = json.loads(reply.strip("`").removeprefix("json"))["honeywords"]
+    assert len(set(honeywords)) == 20 and "monkey12" not in honeywords
+    assert all(6 <= len(honeyword) <= 18 for honeyword in honeywords)
+
+
+def test_stats_endpoint_counts_injected_errors(llm):
+    llm.error_rate = 1.0
+    assert llm_client.get_client().complete(ask(CLASSIFY.format("abc"))) is None
+    with urllib.request.urlopen(llm.url.removesuffix("/v1") + "/stats") as response:
+        stats = json.load(response)
+    assert stats["requests"] == 3 and stats["rate_limited"] + stats["server_errors"] == 3
+
+
+def test_long_replies_are_cut_at_max_tokens(llm):
+    reply = llm_client.get_client().complete(ask(GENERATE.format("monkey12")), max_tokens=10)
+    assert len(reply) == 40 and llm.counts["truncated"] == 1
+
+
+def test_streamed_reply_matches_the_complete_one(llm):
+    client = llm_client.get_client()
+    pieces, usage = [], {}
+    streamed = client.complete_stream(ask(CLASSIFY.format("abc")), pieces.append, usage=usage)
+    assert streamed == client.complete(ask(CLASSIFY.format("abc")))
+    assert "".join(pieces) == streamed and len(pieces) > 1
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+
+
+def test_default_backend_follows_the_environment(monkeypatch):
+    monkeypatch.delenv("LLM_LOCAL_MODEL", raising=False)
+    monkeypatch.setenv("OPENAI_API_BASE", "http://127.0.0.1:9/v1")
+    monkeypatch.setenv("LLM_MODEL", "mock")
+    backend = default_backend()
+    assert isinstance(backend, OpenAIBackend) and backend.model == "mock"
+    assert backend.api_base == "http://127.0.0.1:9/v1"
+
+    monkeypatch.setenv("LLM_LOCAL_MODEL", "model.gguf")
+    monkeypatch.setattr(llm_backends, "LocalModelBackend", lambda path: ("local", path))
+    assert default_backend() == ("local", "model.gguf")
@@ -0,0 +1,71 @@
+import numpy as np
+
+from mutation_engine import (LETTERS_DIGITS, LETTERS_DIGITS_PUNCTUATION, Constraints, MutationEngine, decode, encode,
+                             spawn_seed)
+from strong_generator import HONEYWORD_CONSTRAINTS, StrongPasswordGenerator
+
+STRONG = Constraints(min_length=6, max_length=18, min_classes=2, classes=('upper', 'lower', 'digit'),
+                     forbidden_first="!@#$%^&*")
+
+
+def test_encode_decode_round_trip():
+    words = ["abc", "", "Zé密_!", "longer password"]
+    codes, lengths = encode(words, width=20)
+    assert codes.shape == (4, 20) and lengths.tolist() == [3, 0, 5, 15]
+    assert decode(codes).tolist() == words
+
+
+def test_constraints_match_a_per_character_check():
+    def reference(word):
+        classes = (any(c.isupper() for c in word) + any(c.islower() for c in word) + any(c.isdigit() for c in word))
+        return 6 <= len(word) <= 18 and classes >= 2 and word[0] not in "!@#$%^&*"
+
+    words = ["abcdef", "abcde1", "Abcdef", "!Abcde1", "Ab1", "A" * 18 + "b", "123456", "12345a", "ab cd1"]
+    codes, lengths = encode(words)
+    assert STRONG.valid_mask(codes, lengths).tolist() == [reference(word) for word in words]
+    assert Constraints(allow_symbols=False)("ab cd1") is False
+    assert STRONG.describe().startswith("1. The length is between 6-18 characters; 2. Contains at least two types")
+
+
+def test_mutations_are_unique_valid_and_exclude_the_bases():
+    engine = MutationEngine(seed=0)
+    honeywords = engine.mutate("DavidLermajr.4894", alphabet=LETTERS_DIGITS_PUNCTUATION, constraints=STRONG,
+                               exclude=["DavidLermajr.4895"])
+    assert len(set(honeywords)) == 20
+    assert all(STRONG(honeyword) for honeyword in honeywords)
+    assert "DavidLermajr.4894" not in honeywords and "DavidLermajr.4895" not in honeywords
+    assert all(honeyword.startswith("DavidLermajr.") for honeyword in honeywords)
+
+
+def test_unsatisfiable_requests_stop_at_the_candidate_budget():
+    engine = MutationEngine(seed=0, budget=10)
+    # No tail mutation of a two-character password reaches six characters
+    assert engine.mutate("ab", constraints=STRONG) == []
+    spares = engine.mutate("ab", constraints=STRONG, strict=False)
+    assert 0 < len(spares) <= 20 and "ab" not in spares
+    # Only 62 * 62 two-character strings exist, fewer than the 5000 asked for
+    assert len(engine.mutate("ab", count=5000, cut=(2, 2), alphabet=LETTERS_DIGITS)) < 5000
+
+
+def test_many_groups_in_one_pass():
+    engine = MutationEngine(seed=1)
+    results = engine.mutate_many(["monkey12", [], ["sun", "shine"]], count=5, add=(2, 2),
+                                 excludes=[("monkey13",), (), ()])
+    assert [len(result) for result in results] == [5, 0, 5]
+    assert "monkey13" not in results[0]
+
+
+def test_seeded_engines_are_reproducible():
+    assert MutationEngine(seed=3).mutate("monkey12") == MutationEngine(seed=3).mutate("monkey12")
+    sequence = np.random.SeedSequence(3)
+    first, second = spawn_seed(sequence), spawn_seed(sequence)
+    assert MutationEngine(first).mutate("monkey12") != MutationEngine(second).mutate("monkey12")
+    assert spawn_seed(None) is None
+
+
+def test_strong_fallback_terminates_for_short_passwords(index_file):
+    generator = StrongPasswordGenerator("XYZ University", index_file=index_file, engine=MutationEngine(seed=0))
+    result = generator.generate_with_fallback("ab")
+    assert 0 < len(result["honeywords"]) <= 20
+    result = generator.generate_with_fallback("Kingulek_1995")
+    assert len(set(result["honeywords"])) == 20 and all(map(HONEYWORD_CONSTRAINTS, result["honeywords"]))
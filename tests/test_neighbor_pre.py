@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from conftest import PASSWORDS
+from lsh_index import LSHIndex
+from neighbor_pre import NeighborTable, precompute_neighbors
+from password_pre import preprocess_hashes
+from password_recommender import PasswordRecommender
+
+
+@pytest.fixture
+def neighbor_file(index_file, tmp_path):
+    path = str(tmp_path / "passwords.nbr")
+    precompute_neighbors(index_file, path, k=5, max_hamming_dist=3, workers=1)
+    return path
+
+
+def test_precomputed_neighbors_match_online_queries(index_file, neighbor_file):
+    table = NeighborTable(neighbor_file, LSHIndex(index_file))
+    recommender = PasswordRecommender(index_file, max_hamming_dist=3)
+    for pwd in PASSWORDS:
+        assert table.lookup(pwd) == recommender.recommend(pwd)
+        assert table.lookup(pwd, 2) == recommender.recommend(pwd, 2)
+    assert table.lookup("not in the corpus") is None
+
+
+def test_parallel_precomputation_writes_the_same_table(index_file, neighbor_file, tmp_path):
+    parallel_file = tmp_path / "parallel.nbr"
+    precompute_neighbors(index_file, str(parallel_file), k=5, max_hamming_dist=3, workers=2)
+    assert parallel_file.read_bytes() == open(neighbor_file, 'rb').read()
+
+
+def test_recommender_answers_corpus_passwords_from_the_table(index_file, neighbor_file):
+    recommender = PasswordRecommender(index_file, max_hamming_dist=3, neighbor_file=neighbor_file)
+    recommender.recommend("judith145")
+    recommender.recommend("judith146")
+    # More recommendations than were precomputed fall back to an LSH query
+    recommender.recommend("judith145", 6)
+    stats = recommender.cache_stats()
+    assert stats["precomputed"] == 1 and stats["misses"] == 2
+
+
+def test_table_is_rejected_for_a_different_index(neighbor_file, tmp_path):
+    pd.DataFrame({"Password": PASSWORDS[:5]}).to_csv(tmp_path / "other.csv", index=False)
+    preprocess_hashes(str(tmp_path / "other.csv"), str(tmp_path / "other.idx"), workers=1)
+    with pytest.raises(ValueError):
+        NeighborTable(neighbor_file, LSHIndex(str(tmp_path / "other.idx")))
@@ -0,0 +1,38 @@
+import ast
+
+import numpy as np
+import pandas as pd
+
+from conftest import PASSWORDS
+from featurizer import HashedNgramFeaturizer
+from password_pre import LSH, format_hashes, preprocess_hashes, process_password
+
+
+def test_hash_batch_matches_per_password_hashing():
+    featurizer = HashedNgramFeaturizer()
+    lsh = LSH(num_hashes=10, input_dim=featurizer.dim, seed=42)
+    bits = lsh.hash_batch(featurizer.transform(PASSWORDS))
+    for pwd, row in zip(PASSWORDS, bits):
+        hashed_results = []
+        process_password(pwd, hashed_results, num_hashes=10, seed=42)
+        assert hashed_results == [(pwd, [int(bit) for bit in row])]
+
+
+def test_format_hashes_renders_list_literals():
+    rng = np.random.RandomState(0)
+    for num_hashes in (4, 16, 24):
+        bits = rng.randint(0, 2, size=(50, num_hashes)).astype(np.uint8)
+        assert [ast.literal_eval(text) for text in format_hashes(bits)] == bits.tolist()
+
+
+def test_chunked_parallel_output_matches_single_process(password_csv, tmp_path):
+    single = tmp_path / "single.csv"
+    parallel = tmp_path / "parallel.csv"
+    preprocess_hashes(password_csv, str(single), workers=1, chunksize=100)
+    preprocess_hashes(password_csv, str(parallel), workers=2, chunksize=5)
+
+    hashed = pd.read_csv(single)
+    # Input order is kept and values are stripped
+    assert hashed["Password"].tolist() == PASSWORDS
+    assert pd.read_csv(parallel).equals(hashed)
+
@@ -0,0 +1,69 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from conftest import PASSWORDS
+from password_recommender import (PasswordRecommender, batch_similarity, calculate_final_similarity,
+                                  recommend_similar_passwords_from_index, top_k_indices)
+
+QUERIES = ["judith146", "Kingulek_1996", "abc123xy", "sunshine2"]
+
+
+def test_recommender_matches_one_shot_queries(index_file):
+    recommender = PasswordRecommender(index_file, max_hamming_dist=3)
+    for query in QUERIES:
+        assert recommender.recommend(query) == recommend_similar_passwords_from_index(query, index_file,
+                                                                                      max_hamming_dist=3)
+
+
+def test_repeated_queries_are_served_from_the_lru_cache(index_file):
+    recommender = PasswordRecommender(index_file, max_hamming_dist=3, cache_size=2)
+    first = recommender.recommend(QUERIES[0])
+    first.append("mutated by the caller")
+    assert recommender.recommend(QUERIES[0]) == first[:-1]
+    assert recommender.cache_stats()["hits"] == 1
+
+    # Two newer queries evict the oldest one
+    recommender.recommend(QUERIES[1])
+    recommender.recommend(QUERIES[2])
+    recommender.recommend(QUERIES[0])
+    stats = recommender.cache_stats()
+    assert stats["size"] == 2 and stats["hits"] == 1 and stats["misses"] == 4
+
+
+def test_recommender_is_shared_between_threads(index_file):
+    recommender = PasswordRecommender(index_file, max_hamming_dist=3)
+    expected = [recommender.recommend(query) for query in QUERIES]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(recommender.recommend, QUERIES * 25))
+    assert results == expected * 25
+    assert recommender.cache_stats()["hits"] == 100
+
+
+def test_target_is_never_recommended_to_itself(index_file):
+    recommender = PasswordRecommender(index_file, max_hamming_dist=10, num_recommendations=len(PASSWORDS))
+    recommendations = recommender.recommend("judith145")
+    assert "judith145" not in recommendations
+    assert sorted(recommendations) == sorted(set(PASSWORDS) - {"judith145"})
+
+
+def test_batch_similarity_matches_the_scalar_score():
+    rng = random.Random(0)
+    alphabet = "aab12_!Zé密"
+    candidates = ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 12))) for _ in range(300)]
+    for target in ["aab12", "Zé密_!!", "bb"]:
+        scores = batch_similarity(target, candidates, workers=2)
+        expected = [calculate_final_similarity(target, pwd, (0.6, 0.2, 0.2)) for pwd in candidates]
+        np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-12)
+    assert len(batch_similarity("abc", [])) == 0
+
+
+def test_top_k_indices_matches_a_stable_sort():
+    rng = np.random.RandomState(4)
+    for _ in range(50):
+        # Few distinct values, so ties at the cut-off are common
+        scores = rng.randint(0, 5, size=rng.randint(1, 40)) / 4
+        for k in (1, 3, 10, 50):
+            expected = sorted(range(len(scores)), key=lambda i: -scores[i])[:k]
+            assert top_k_indices(scores, k).tolist() == expected
@@ -0,0 +1,55 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from conftest import PASSWORDS
+from main import HoneywordsMain, process_csv
+from mutation_engine import MutationEngine
+from pcfg_generator import PCFGGenerator, PCFGModel, segments, train_pcfg
+
+
+def structure(password):
+    return [(cls, len(text)) for cls, text in segments(password)]
+
+
+def test_segments():
+    assert segments("judith145!") == [(0, "judith"), (1, "145"), (2, "!")]
+    assert segments("P@ssw0rd!") == [(0, "P"), (2, "@"), (0, "ssw"), (1, "0"), (0, "rd"), (2, "!")]
+    assert segments("") == []
+
+
+def test_trained_tables_sample_the_corpus_segments(password_csv, tmp_path):
+    train_pcfg(password_csv, str(tmp_path / "model.tbl"))
+    model = PCFGModel(str(tmp_path / "model.tbl"))
+    assert model.header["passwords"] == len(PASSWORDS)
+
+    rng = np.random.default_rng(0)
+    letters = Counter("".join(map(chr, row)) for row in model.sample(0, 6, 3000, rng).tolist())
+    assert set(letters) == {"judith", "monkey", "dragon", "qwerty"}
+    # Single digits of the corpus: 1, 0, 4, 3 and 0 again, so 0 is drawn twice as often as the others
+    digits = Counter(chr(row[0]) for row in model.sample(1, 1, 3000, rng).tolist())
+    assert set(digits) == {"0", "1", "3", "4"} and 1050 < digits["0"] < 1350
+    # A group that never occurred is drawn from the characters of its class
+    assert all(chr(c) in "0123456789" for c in model.sample(1, 7, 10, rng).ravel().tolist())
+
+
+def test_generated_honeywords_keep_the_structure(password_csv, tmp_path):
+    train_pcfg(password_csv, str(tmp_path / "model.tbl"))
+    generator = PCFGGenerator(str(tmp_path / "model.tbl"), MutationEngine(seed=0))
+    honeywords = generator.generate("judith145")["honeywords"]
+    assert len(set(honeywords)) == 20 and "judith145" not in honeywords
+    resampled = {honeyword for honeyword in honeywords if structure(honeyword) == structure("judith145")}
+    assert {"monkey145", "dragon145"} <= resampled
+
+
+def test_pcfg_records_make_no_llm_requests(llm, records_csv, index_file, tmp_path):
+    train_pcfg(records_csv, str(tmp_path / "model.tbl"))
+    process_csv(records_csv, str(tmp_path / "out.csv"), index_file=index_file, pcfg_file=str(tmp_path / "model.tbl"),
+                pcfg_labels=(1, 2))
+    requests = llm.counts["requests"]
+    result = pd.read_csv(tmp_path / "out.csv")
+    assert set(result["Strategy"]) <= {HoneywordsMain.PCFG_STRATEGY, "PII-based"}
+    assert (result["Strategy"] == HoneywordsMain.PCFG_STRATEGY).sum() == len(PASSWORDS) - 1
+    # Only classification and the PII record reach the model
+    assert requests <= len(PASSWORDS) + 2 * 2
@@ -0,0 +1,31 @@
+from pii_generator import PIIGenerator
+from prompt_benchmark import is_valid_pii_honeyword, run_benchmark
+from weak_generator import WeakPasswordGenerator
+
+
+def test_single_shot_sends_one_request_per_record(llm):
+    for single_shot, calls in ((False, 2), (True, 1)):
+        weak_generator = WeakPasswordGenerator("XYZ University", single_shot=single_shot)
+        assert len(weak_generator.generate("abc123xyz")["honeywords"]) == 20
+        assert weak_generator.record_usage()["calls"] == calls
+
+        pii_generator = PIIGenerator(single_shot=single_shot)
+        assert len(pii_generator.generate("zhang0406", "zhangs", "1990-04-06", "Zhang San", "zs@x.com")["honeywords"]) == 20
+        assert pii_generator.record_usage()["calls"] == calls
+
+
+def test_benchmark_compares_both_modes(llm, records_csv):
+    report = run_benchmark(records_csv, num_records=3).set_index(["generator", "mode"])
+    assert report.loc[("weak", "two-turn"), "requests_per_record"] == 2
+    assert report.loc[("weak", "single-shot"), "requests_per_record"] == 1
+    assert report.loc[("pii", "single-shot"), "records"] == 1
+    assert (report["fallback_rate"] == 0).all()
+    prompt_tokens = report["prompt_tokens_per_record"]
+    assert prompt_tokens[("weak", "single-shot")] < prompt_tokens[("weak", "two-turn")]
+
+
+def test_pii_honeyword_constraints():
+    assert is_valid_pii_honeyword("Zhang0406")
+    assert not is_valid_pii_honeyword("zhang")       # Too short
+    assert not is_valid_pii_honeyword("zhangsanxx")  # One character class
+    assert not is_valid_pii_honeyword("0406Zhang")   # Starts with a digit
@@ -0,0 +1,77 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shuffle import shuffle_global, shuffle_rows, shuffle_traditional, sweetword_columns
+
+WIDTH = 11
+COLUMNS = [f"Honeyword_{i}" for i in range(1, WIDTH + 1)]
+
+
+@pytest.fixture
+def honeywords_csv(tmp_path):
+    """Output of main.process_csv for 60 records; Honeyword_1 is the true password, some rows are not full"""
+    rows = []
+    for record in range(60):
+        filled = WIDTH - record % 4
+        rows.append([f"pw{record}"] + [f"r{record}w{i}" if i < filled else "" for i in range(WIDTH)] + ["Weak"])
+    path = tmp_path / "honeywords.csv"
+    pd.DataFrame(rows, columns=["Password"] + COLUMNS + ["Strategy"]).to_csv(path, index=False)
+    return str(path)
+
+
+def read(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def test_sweetword_columns_are_in_numeric_order():
+    assert sweetword_columns(["Password", "Honeyword_10", "Honeyword_2", "Strategy", "Honeyword_1"]) == [
+        "Honeyword_1", "Honeyword_2", "Honeyword_10"]
+
+
+def test_rows_are_permuted_with_the_true_password_index():
+    rng = np.random.default_rng(0)
+    sweetwords = np.array([["a", "b", "c", ""]] * 3000, dtype=object)
+    shuffled, index = shuffle_rows(sweetwords, rng)
+    assert (shuffled[np.arange(3000), index - 1] == "a").all()
+    assert (shuffled[:, 3] == "").all()
+    assert all(sorted(row) == ["", "a", "b", "c"] for row in shuffled.tolist())
+    # Every position is about equally likely
+    assert all(900 < count < 1100 for count in Counter(index.tolist()).values())
+
+
+def test_traditional_shuffle_keeps_every_record_and_indexes_its_password(honeywords_csv, tmp_path):
+    shuffle_traditional(honeywords_csv, str(tmp_path / "out.csv"), chunksize=7, seed=0)
+    original, shuffled = read(honeywords_csv), read(tmp_path / "out.csv")
+    assert shuffled["Password"].tolist() == original["Password"].tolist()
+    assert (shuffled["Strategy"] == "Weak").all()
+    for (_, before), (_, after) in zip(original.iterrows(), shuffled.iterrows()):
+        assert sorted(after[COLUMNS]) == sorted(before[COLUMNS])
+        assert after[COLUMNS[int(after["index"]) - 1]] == before["Honeyword_1"]
+    assert shuffled["Honeyword_1"].tolist() != original["Honeyword_1"].tolist()
+
+
+def test_global_shuffle_deals_all_sweetwords_back_out(honeywords_csv, tmp_path):
+    # Several buckets and chunks, so every part of the external shuffle runs
+    shuffle_global(honeywords_csv, str(tmp_path / "out.csv"), str(tmp_path / "index.csv"), chunksize=7,
+                   max_bucket_bytes=2000, seed=0)
+    original, shuffled, index = read(honeywords_csv), read(tmp_path / "out.csv"), pd.read_csv(tmp_path / "index.csv")
+    # The temporary buckets are gone
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["honeywords.csv", "index.csv", "out.csv"]
+
+    assert Counter(shuffled[COLUMNS].to_numpy().ravel()) == Counter(original[COLUMNS].to_numpy().ravel())
+    assert ((shuffled[COLUMNS] != "").sum(axis=1) == (original[COLUMNS] != "").sum(axis=1)).all()
+    assert index["User"].tolist() == list(range(1, 61))
+    for user, row, column in index.itertuples(index=False):
+        assert shuffled.at[row - 1, COLUMNS[column - 1]] == original.at[user - 1, "Honeyword_1"]
+    # Sweetwords are mixed between records
+    assert sum(cell.startswith("r0w") for cell in shuffled.loc[0, COLUMNS]) < WIDTH
+
+
+def test_seeded_shuffles_are_reproducible(honeywords_csv, tmp_path):
+    for name in ("a", "b"):
+        shuffle_global(honeywords_csv, str(tmp_path / f"{name}.csv"), str(tmp_path / f"{name}_index.csv"), seed=3)
+    assert (tmp_path / "a.csv").read_bytes() == (tmp_path / "b.csv").read_bytes()
+    assert (tmp_path / "a_index.csv").read_bytes() == (tmp_path / "b_index.csv").read_bytes()
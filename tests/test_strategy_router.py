@@ -0,0 +1,95 @@
+import pytest
+
+from strategy_router import StrategyRouter
+
+USAGE = {"calls": 2, "prompt_tokens": 200, "completion_tokens": 100, "cached_prompt_tokens": 0}
+
+
+def test_cost_bills_cached_prompt_tokens_at_their_price():
+    router = StrategyRouter(prices={"prompt": 1.0, "cached_prompt": 0.5, "completion": 2.0})
+    assert router.cost({"prompt_tokens": 1000000, "cached_prompt_tokens": 400000,
+                        "completion_tokens": 1000000}) == pytest.approx(0.6 + 0.2 + 2.0)
+
+
+def test_token_budget_is_a_hard_limit():
+    router = StrategyRouter(token_budget=1000)
+    served = 0
+    for _ in range(20):
+        ticket = router.acquire("Weak password-based")
+        if ticket is None:
+            continue
+        served += 1
+        router.release(ticket, USAGE)
+    stats = router.stats["Weak password-based"]
+    assert router.spent_tokens <= 1000
+    assert stats.records == served and stats.degraded == 20 - served
+
+
+def test_probes_are_not_counted_as_degraded():
+    # Every record is over the latency limit once min_samples records were measured
+    router = StrategyRouter(max_record_latency=0.0, min_samples=1, probe_every=5)
+    served = 0
+    for _ in range(40):
+        ticket = router.acquire("Strong password-based")
+        if ticket is None:
+            continue
+        served += 1
+        router.release(ticket, USAGE)
+    stats = router.stats["Strong password-based"].summary()
+    assert served > 1  # The first record and the probes
+    assert stats["records"] == served
+    assert stats["records"] + stats["degraded"] == 40
+
+
+def test_batch_release_shares_usage_and_counts_errors():
+    router = StrategyRouter()
+    ticket = router.acquire("Weak password-based", records=4)
+    router.release(ticket, USAGE, errors=1)
+    stats = router.stats["Weak password-based"]
+    assert stats.records == 4 and stats.calls == 2 and stats.tokens == 300
+    assert stats.error_rate() == 0.25
+    assert router._reserved_tokens == 0
+
+
+def test_local_strategies_are_never_refused():
+    router = StrategyRouter(token_budget=0)
+    assert router.acquire("Weak password-based") is None
+    ticket = router.acquire("PCFG-based", local=True)
+    assert ticket is not None
+    router.release(ticket)
+    assert router.report()["strategies"]["PCFG-based"]["records"] == 1
+
+
+def run(router, records, slow=False, errors=0):
+    """Push records through the router; admitted ones take 1 s if slow. Returns how many were refused"""
+    refused = 0
+    for _ in range(records):
+        ticket = router.acquire("Weak password-based")
+        if ticket is None:
+            refused += 1
+            continue
+        if slow:
+            ticket["start"] -= 1.0
+        router.release(ticket, USAGE, errors=errors)
+    return refused
+
+
+def test_recovered_provider_is_admitted_again_after_one_probe():
+    router = StrategyRouter(max_record_latency=0.5, min_samples=10, probe_every=20)
+    assert run(router, 50, slow=True) > 0
+    # The first probe after the recovery readmits the strategy
+    assert run(router, 1000) < 20
+    assert run(router, 100) == 0
+
+
+def test_provider_that_stays_slow_stays_refused():
+    router = StrategyRouter(max_record_latency=0.5, min_samples=10, probe_every=20)
+    run(router, 10, slow=True)
+    assert run(router, 200, slow=True) == 190  # Every 20th record is a probe
+
+
+def test_error_rate_recovers_too():
+    router = StrategyRouter(min_samples=10, probe_every=20)
+    run(router, 10, errors=1)
+    assert router.acquire("Weak password-based") is None
+    assert run(router, 1000) < 20
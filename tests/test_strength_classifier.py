@@ -0,0 +1,54 @@
+import math
+
+import pandas as pd
+import pytest
+
+from strength_classifier import FrequentPasswordSet, StrengthClassifier, build_frequent_set, pattern_coverage
+
+
+@pytest.mark.parametrize("password, tag", [
+    ("abc12", 1),                 # Fewer than 8 characters
+    ("passwordpassword", 1),      # Only letters
+    ("1234567890", 1),            # Only digits
+    ("qwertyuiop1", 1),           # Keyboard walk
+    ("judith145", 1),             # Word and digits
+    ("DavidLermajr.4894", 2),     # All four character classes
+    ("Gjl$2`Aq1", 2),
+    ("correcthorse12!A", 2),
+])
+def test_clear_cut_passwords_are_decided_locally(password, tag):
+    assert StrengthClassifier().classify(password)["Tag"] == tag
+
+
+def test_ambiguous_passwords_go_to_the_llm():
+    classifier = StrengthClassifier()
+    assert classifier.classify("mypassword123") is None
+    assert StrengthClassifier(threshold=1.0).classify("judith145") is None
+    classifier.classify("abc12")
+    assert classifier.report() == {"local_weak": 1, "local_strong": 0, "llm": 1, "local_fraction": 0.5}
+
+
+def test_non_string_passwords_are_classified_as_text():
+    classifier = StrengthClassifier()
+    assert classifier.classify(math.nan)["Tag"] == 1
+    assert classifier.classify(12345678)["Tag"] == 1
+    assert classifier.score(12345678) == classifier.score("12345678")
+
+
+def test_pattern_coverage():
+    assert pattern_coverage("aaaabcd") == 1.0
+    assert pattern_coverage("x7Kp2") == 0.0
+    assert pattern_coverage("") == 0.0
+
+
+def test_frequent_set_from_csv_and_wordlist(tmp_path):
+    pd.DataFrame({"Password": ["mypassword123", "MyPassword123", "Unique#Pass99"]}).to_csv(tmp_path / "p.csv", index=False)
+    build_frequent_set(str(tmp_path / "p.csv"), str(tmp_path / "csv.frq"))
+    frequent = FrequentPasswordSet(str(tmp_path / "csv.frq"))
+    assert "MYPASSWORD123" in frequent and "Unique#Pass99" not in frequent
+
+    (tmp_path / "words.txt").write_text("Unique#Pass99\nmypassword123\n")
+    build_frequent_set(str(tmp_path / "words.txt"), str(tmp_path / "words.frq"), top_n=1)
+    classifier = StrengthClassifier(str(tmp_path / "words.frq"))
+    assert classifier.classify("Unique#Pass99") == {"Brief Reason": "Frequent password", "Tag": 1}
+    assert classifier.classify("mypassword123") is None
@@ -0,0 +1,23 @@
+from weak_generator import WeakPasswordGenerator, is_valid_honeyword
+
+WEAK_PASSWORDS = ["abc123xyz", "monkey12", "qwerty99"]
+
+
+def test_batch_gives_every_password_twenty_valid_honeywords(llm):
+    generator = WeakPasswordGenerator("XYZ University")
+    results = generator.generate_batch(WEAK_PASSWORDS, batch_size=2, max_rounds=3)
+    assert generator.fallbacks == 0
+    assert llm.counts["requests"] == 2
+    for password, result in zip(WEAK_PASSWORDS, results):
+        assert len(set(result["honeywords"])) == 20 and password not in result["honeywords"]
+        assert all(is_valid_honeyword(honeyword) for honeyword in result["honeywords"])
+
+
+def test_batch_falls_back_after_max_rounds(llm):
+    llm.error_rate = 1.0
+    generator = WeakPasswordGenerator("XYZ University")
+    results = generator.generate_batch(WEAK_PASSWORDS[:2], batch_size=5, max_rounds=2)
+    # Two rounds of one request, each tried 1 + max_retries times
+    assert llm.counts["requests"] == 2 * 3
+    assert generator.fallbacks == 2
+    assert all(len(result["honeywords"]) == 20 for result in results)
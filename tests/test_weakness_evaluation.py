@@ -0,0 +1,23 @@
+from conftest import PASSWORDS
+from weakness_evaluation import evaluate_password_strength, evaluate_password_strength_batch
+
+
+def test_batch_answers_match_single_evaluations(llm):
+    results = evaluate_password_strength_batch(PASSWORDS, batch_size=5)
+    assert llm.counts["requests"] == 3
+    assert [result["Tag"] for result in results] == [evaluate_password_strength(pwd)["Tag"] for pwd in PASSWORDS]
+
+
+def test_every_retry_round_reaches_the_model(llm):
+    # A malformed reply to a one-password batch never contains its Tag, so every round fails
+    llm.malformed_rate = 1.0
+    assert evaluate_password_strength_batch(["abc"], max_rounds=3) == [None]
+    assert llm.counts["requests"] == 3
+
+
+def test_answered_batch_is_served_from_cache(llm):
+    passwords = ["abc", "Xy1!abcdefgh", "password"]
+    first = evaluate_password_strength_batch(passwords)
+    second = evaluate_password_strength_batch(passwords)
+    assert first == second and all(result is not None for result in first)
+    assert llm.counts["requests"] == 1
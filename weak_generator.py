@@ -1,54 +1,79 @@
-import openai
 import json
-import random
 import string
+from honeyword_repair import HoneywordRepair, extract_honeywords, has_honeywords
+from honeyword_stream import HoneywordStream
+from llm_client import Conversation, get_client, parse_json_items
+from mutation_engine import LETTERS_DIGITS, Constraints, MutationEngine
 
-# Set API Key and custom API endpoint
-openai.api_key = 'XXX'
-openai.api_base = "XXX"  #your API key
+# Constraints of the weak-password prompt: 6-18 characters, only letters and digits, at least two of
+# uppercase/lowercase/digits, not starting with a digit
+HONEYWORD_CONSTRAINTS = Constraints(min_length=6, max_length=18, min_classes=2, classes=('upper', 'lower', 'digit'),
+                                    forbidden_first=string.digits, allow_symbols=False)
+
+
+def is_valid_honeyword(honeyword):
+    return HONEYWORD_CONSTRAINTS(honeyword)
+
+
+def _has_item_honeywords(answer):
+    return answer is not None and isinstance(answer.get("honeywords"), list) and bool(answer["honeywords"])
 
 
 class WeakPasswordGenerator:
-    def __init__(self, university):
-        # Save conversation context
-        self.messages = [
+    def __init__(self, university, single_shot=False, stream=False, engine=None):
+        # single_shot folds the strategy and the constraints into one request instead of two turns
+        self.single_shot = single_shot
+        # stream parses the honeywords while the reply arrives and stops the request once 20 valid ones are in
+        self.stream = stream
+        self.fallbacks = 0  # Records that ended up in the backup method
+        # Local mutations for the backup method and for topping up short replies
+        self.engine = engine or MutationEngine()
+        # Repairs nearly-valid honeywords and asks a follow-up for missing ones before any local top-up
+        self.repair = HoneywordRepair(HONEYWORD_CONSTRAINTS, self.engine.rng)
+        # Fixed conversation prefix every record starts from; each record only adds its own turns
+        prefix = [
             {"role": "system", "content": f"Honeywords are decoy passwords used to detect unauthorized access. "
                                           f"Please generate honeywords similar to the target password to safeguard the database security for {university}. "},
             {"role": "user",
              "content": "Common weak password patterns often include repeated characters, sequential numbers, or simple letter-number combinations."}
         ]
+        self.conversation = Conversation(prefix, site='weak', max_tokens=300, temperature=0.6)
+
+    @property
+    def messages(self):
+        return self.conversation.messages
 
-    def send_message_to_gpt(self, message):
+    def reset_conversation(self):
         """
-        Send a message to GPT and receive a reply, keeping the conversation context.
+        Drop the turns of the previous record so one generator instance can be reused for many records.
         """
-        self.messages.append({"role": "user", "content": message})
-
-        try:
-            # Call GPT API
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=self.messages,
-                max_tokens=300,  # Limit the number of generated tokens
-                temperature=0.6
-            )
+        self.conversation.reset()
 
-            reply = response['choices'][0]['message']['content'].strip()
-            self.messages.append({"role": "assistant", "content": reply})
-
-            return reply
+    def send_message_to_gpt(self, message, validate=has_honeywords):
+        """
+        Send a message to GPT and receive a reply, keeping the conversation context of the current record.
+        validate decides whether the reply may be cached; by default it has to contain honeywords.
+        """
+        # Calls go through the shared client, which retries rate limits and server errors
+        return self.conversation.send(message, validate=validate)
 
-        except Exception as e:
-            print(f"Error calling GPT API: {str(e)}")
-            return None
+    def record_usage(self):
+        """
+        Calls and tokens spent on the last record.
+        """
+        return self.conversation.record_usage()
 
     def generate(self, password):
         """
         Accept a password and generate honeywords with a similar structure.
         """
+        self.reset_conversation()
+
         # Step 1: Send instruction to mimic the structure of the password
         init_instruction = f"Generate honeywords that are structurally similar to the password '{password}', which is a weak password. These honeywords should follow common weak password patterns, such as simple character and number sequences, and slight rearrangements."
-        self.send_message_to_gpt(init_instruction)
+        if not self.single_shot:
+            # Any reply to the strategy turn is usable context
+            self.send_message_to_gpt(init_instruction, validate=bool)
 
         # Step 2: Provide the final instruction with constraints and ask for the result in JSON format
         final_instruction = (f"Ensure that the newly generated honeywords meet the following conditions: "
@@ -58,36 +83,114 @@ class WeakPasswordGenerator:
                              f"4. Cannot contain special symbols other than letters and numbers. "
                              f"Generate 20 different honeywords from the given content, ensuring they are similar to the target password. Present the result **directly** in JSON format, with two fields: 'honeywords' (list of generated passwords) and 'explanation'.")
 
-        # Generate honeywords using GPT
+        if self.single_shot:
+            final_instruction = init_instruction + " " + final_instruction
+
+        if self.stream:
+            return self.generate_streaming(password, final_instruction)
+
+        # Generate honeywords using GPT (in single-shot mode both instructions go in this one request)
         honeywords_response = self.send_message_to_gpt(final_instruction)
 
-        # Clean the returned data, removing Markdown code block markers
-        if honeywords_response:
-            honeywords_response = honeywords_response.replace("```json", "").replace("```", "").strip()
+        # Tolerant parsing: code blocks, trailing commas and truncated replies still give their honeywords
+        return self.finish(password, honeywords_response, extract_honeywords(honeywords_response))
+
+    def generate_streaming(self, password, instruction):
+        """
+        Send the final instruction as a streamed request and keep every valid honeyword that arrives, so a reply
+        cut short by max_tokens still counts; invalid ones are kept for repair.
+        """
+        stream = HoneywordStream(is_valid_honeyword, count=20, exclude=(password,))
+        reply = self.conversation.send(instruction, on_text=stream.feed, validate=has_honeywords)
+        result = stream.result()
+        result["honeywords"] += stream.invalid
+        return self.finish(password, reply, result if result["honeywords"] else extract_honeywords(reply))
 
-        # Try to parse the returned JSON data
-        try:
-            honeywords_result = json.loads(honeywords_response)
-            return honeywords_result
-        except json.JSONDecodeError:
-            print(f"Returned data is not valid JSON: {honeywords_response}")
+    def finish(self, password, reply, result):
+        """
+        Final result of a record from the honeywords of its reply: invalid ones repaired where a few edits
+        suffice, missing ones asked for in one follow-up turn and, if still short, topped up with local mutations.
+        The backup method is used if none are usable or the call failed.
+        """
+        # A failed call is not followed up; the provider is already struggling
+        send = self.send_message_to_gpt if reply is not None else None
+        honeywords = self.repair.collect(result, password, send)
+        if not honeywords:
+            print(f"Returned data has no usable honeywords: {reply}")
             print("Using backup method to generate honeywords.")
-            # Use backup method to generate honeywords if GPT response is invalid
             return self.generate_honeywords_with_backup_method(password)
 
+        if len(honeywords) < 20:
+            honeywords += self.engine.mutate(password, count=20 - len(honeywords), alphabet=LETTERS_DIGITS,
+                                             constraints=HONEYWORD_CONSTRAINTS, strict=False, exclude=honeywords)
+        return {"honeywords": honeywords, "explanation": result["explanation"] if result else ""}
+
+    def generate_batch(self, passwords, batch_size=5, max_rounds=3):
+        """
+        Generate honeywords for several weak passwords with batch_size passwords per request.
+        Returns one result per password; passwords whose item is missing or malformed in a reply are sent
+        again in the next round (bypassing the response cache), and those still failing after max_rounds use
+        the backup method.
+        """
+        results = [None] * len(passwords)
+        pending = list(range(len(passwords)))
+        for round_number in range(max_rounds):
+            if not pending:
+                break
+            failed = []
+            for start in range(0, len(pending), batch_size):
+                ids = pending[start:start + batch_size]
+                items = json.dumps([{"id": i, "password": passwords[i]} for i in ids], ensure_ascii=False)
+                instruction = (f"Generate honeywords that are structurally similar to each of the following weak passwords: {items}. "
+                               f"These honeywords should follow common weak password patterns, such as simple character and number sequences, and slight rearrangements. "
+                               f"Ensure that the newly generated honeywords meet the following conditions: "
+                               f"1. The length is between 6-18 characters; "
+                               f"2. Contains at least two types of characters: uppercase letters, lowercase letters, and numbers; "
+                               f"3. The new password cannot start with a number; "
+                               f"4. Cannot contain special symbols other than letters and numbers. "
+                               f"Generate 20 different honeywords for every password, ensuring they are similar to that password. "
+                               f"Present the result **directly** as a JSON array with one object per password, with three fields: "
+                               f"'id' (the id given above), 'honeywords' (list of generated passwords) and 'explanation'.")
+
+                # One stateless request per batch: the fixed prefix plus this batch's instruction
+                reply = get_client().complete(
+                    list(self.conversation.prefix) + [{"role": "user", "content": instruction}],
+                    max_tokens=250 * len(ids) + 50,
+                    temperature=0.6,
+                    site='weak',
+                    refresh=round_number > 0,
+                    validate=lambda reply, ids=ids: all(_has_item_honeywords(parse_json_items(reply).get(i))
+                                                        for i in ids)
+                )
+                answers = parse_json_items(reply)
+                for i in ids:
+                    answer = answers.get(i)
+                    honeywords = answer.get("honeywords") if answer is not None else None
+                    # Invalid honeywords are repaired; a batch item is not followed up, its gaps are topped up locally
+                    honeywords = self.repair.select(honeywords, exclude=(passwords[i],)) if isinstance(honeywords, list) else []
+                    if honeywords:
+                        if len(honeywords) < 20:
+                            honeywords += self.engine.mutate(passwords[i], count=20 - len(honeywords),
+                                                             alphabet=LETTERS_DIGITS, constraints=HONEYWORD_CONSTRAINTS,
+                                                             strict=False, exclude=honeywords)
+                        results[i] = {"honeywords": honeywords, "explanation": answer.get("explanation", "")}
+                    else:
+                        failed.append(i)
+            pending = failed
+
+        for i in pending:
+            print(f"No valid honeywords returned for '{passwords[i]}', using backup method to generate honeywords.")
+            results[i] = self.generate_honeywords_with_backup_method(passwords[i])
+        return results
+
     def generate_honeywords_with_backup_method(self, password):
         """
         Backup method: Modify the last 1-3 characters of the original password to ensure generating 20 honeywords.
         """
-        honeywords = []
-        length = len(password)
-        # Generate 20 honeywords
-        for _ in range(20):
-            # Randomly replace the last 1 to 3 characters
-            num_replacements = random.randint(1, 3)  # Choose to replace 1 to 3 characters
-            new_password = password[:-num_replacements] + ''.join(
-                random.choices(string.ascii_letters + string.digits, k=num_replacements))
-            honeywords.append(new_password)
+        self.fallbacks += 1
+        # Randomly replace the last 1 to 3 characters; mutations that meet the prompt's constraints are used first
+        honeywords = self.engine.mutate(password, count=20, cut=(1, 3), alphabet=LETTERS_DIGITS,
+                                        constraints=HONEYWORD_CONSTRAINTS, strict=False)
 
         # Explanation for generated honeywords
         explanation = "These honeywords are generated by modifying the last 1-3 characters of the original password with random letters and numbers."
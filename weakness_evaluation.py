@@ -1,9 +1,28 @@
-import openai
 import json
+from llm_client import get_client, parse_json_items
 
-# Set API Key and custom API endpoint
-openai.api_key = 'XXX'
-openai.api_base = "XXX"  # your API endpoint
+
+def _parse_evaluation(reply):
+    """
+    {'Brief Reason', 'Tag'} of a single evaluation reply (optionally in a Markdown code block).
+    Raises json.JSONDecodeError if it is not JSON.
+    """
+    if reply.startswith("```json"):
+        reply = reply.replace("```json", "").replace("```", "").strip()
+    return json.loads(reply)
+
+
+def _is_valid_evaluation(reply):
+    # Only replies with a usable tag go into the response cache
+    try:
+        result = _parse_evaluation(reply)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(result, dict) and result.get("Tag") in (1, 2, "1", "2")
+
+
+def _valid_answer(answer):
+    return answer is not None and answer.get("Tag") in (1, 2, "1", "2")
 
 
 def evaluate_password_strength(password):
@@ -17,21 +36,22 @@ def evaluate_password_strength(password):
               "Apart from these criteria, you can evaluate on your own knowledge. Return the result in JSON format with two fields: 'Brief Reason' and 'Tag' (1 for weak, 2 for strong).")
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
+        # The shared client retries rate limits and server errors; None means the call finally failed
+        result = get_client().complete(
+            [
                 {"role": "system", "content": "You are a Cyberspace Security Expert."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=100,
-            temperature=0  # Set to 0 to reduce uncertainty
+            temperature=0,  # Set to 0 to reduce uncertainty
+            site='classification',  # Deterministic, so always served from the response cache when possible
+            validate=_is_valid_evaluation
         )
+        if result is None:
+            return None
 
-        result = response['choices'][0]['message']['content'].strip()
         # Clean and parse JSON data
-        if result.startswith("```json"):
-            result = result.replace("```json", "").replace("```", "").strip()
-        result_dict = json.loads(result)
+        result_dict = _parse_evaluation(result)
         return result_dict
 
     except json.JSONDecodeError as e:
@@ -42,6 +62,57 @@ def evaluate_password_strength(password):
         return None
 
 
+def evaluate_password_strength_batch(passwords, batch_size=20, max_rounds=3):
+    """
+    Evaluate many passwords with batch_size passwords per request, sharing the instructions of one prompt.
+    Returns one result per password (same format as evaluate_password_strength, None if it never got a valid
+    answer); items missing or malformed in a reply are sent again in the next round, the others are kept.
+    Later rounds bypass the response cache, so every retry reaches the model.
+    """
+    results = [None] * len(passwords)
+    pending = list(range(len(passwords)))
+    for round_number in range(max_rounds):
+        if not pending:
+            break
+        failed = []
+        for start in range(0, len(pending), batch_size):
+            ids = pending[start:start + batch_size]
+            items = json.dumps([{"id": i, "password": passwords[i]} for i in ids], ensure_ascii=False)
+            prompt = ("Evaluate each of the following passwords for weakness. "
+                      "Here are some recommended criteria: "
+                      "1) Weak if it contains fewer than 8 characters, 2) Weak if it only contains letters, "
+                      "3) Strong if it includes uppercase, lowercase, digits, and special characters. "
+                      "Apart from these criteria, you can evaluate on your own knowledge. "
+                      f"Passwords: {items}. "
+                      "Return **only** a JSON array with one object per password, with three fields: 'id' (the id given above), "
+                      "'Brief Reason' and 'Tag' (1 for weak, 2 for strong).")
+
+            reply = get_client().complete(
+                [
+                    {"role": "system", "content": "You are a Cyberspace Security Expert."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=40 * len(ids) + 50,
+                temperature=0,
+                site='classification',
+                refresh=round_number > 0,
+                # Cached only if every password of the batch got a usable answer
+                validate=lambda reply, ids=ids: all(_valid_answer(parse_json_items(reply).get(i)) for i in ids)
+            )
+            answers = parse_json_items(reply)
+            for i in ids:
+                answer = answers.get(i)
+                if _valid_answer(answer):
+                    results[i] = {"Brief Reason": answer.get("Brief Reason", ""), "Tag": int(answer["Tag"])}
+                else:
+                    failed.append(i)
+        pending = failed
+
+    if pending:
+        print(f"No valid evaluation for {len(pending)} of {len(passwords)} passwords")
+    return results
+
+
 # Example usage
 if __name__ == "__main__":
     #password = "abc123xyz"